@@ -1,15 +1,239 @@
+import calendar
+from datetime import date, datetime, time, timedelta
+
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from . import dashboard_cache
 from .models import Account, Transaction
 
 # Register your models here.
 # This makes them accessible in the Django Admin panel (http://localhost:8000/admin)
+#
+# The changelists are written for very large tables: every query they run
+# is answered from an index, whatever the number of rows.
+# - No exact COUNT(*): EstimatedCountPaginator estimates instead and only
+#   links to the first MAX_PAGES pages. Narrow the list down to go further.
+# - Related objects shown in the list come in the same query (list_select_related).
+# - Dates are browsed with PeriodFilter (years -> months -> days, each a
+#   range on the timestamp index) instead of date_hierarchy, whose drill
+#   down runs SELECT DISTINCT over the whole table.
+# - Searches are exact or prefix matches on indexed columns, never LIKE '%...%'.
+# - Filters are served by an index too (txn_type_ts_idx for the transaction type).
+# - Lists can only be sorted by indexed columns.
+
+MAX_PAGES = 200
+COUNT_LIMIT = 10000  # Filtered lists count at most this many rows
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never counts a whole table.
+    - Without filters the count is the database's estimate of the table size
+      (pg_class.reltuples on PostgreSQL, the id span elsewhere).
+    - With filters it counts up to COUNT_LIMIT rows and stops there.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where:
+            return queryset.order_by()[:COUNT_LIMIT].count()
+        estimate = self._table_estimate(queryset)
+        if estimate is None:
+            return queryset.order_by()[:COUNT_LIMIT].count()
+        return estimate
+
+    @staticmethod
+    def _table_estimate(queryset):
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                    [connection.ops.quote_name(queryset.model._meta.db_table)],
+                )
+                row = cursor.fetchone()
+            # -1 until the table was first analyzed
+            return row[0] if row and row[0] >= 0 else None
+        # Two index lookups; counts deleted rows too
+        ids = queryset.order_by('pk').values_list('pk', flat=True)
+        first, last = ids.first(), ids.reverse().first()
+        return 0 if first is None else last - first + 1
+
+    @cached_property
+    def num_pages(self):
+        # Deep pages cost an OFFSET over everything before them
+        return min(super().num_pages, MAX_PAGES)
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False  # A second COUNT(*) of the unfiltered table
+
+
+class InvalidatesDashboards:
+    """
+    Admin edits bypass the ledger, so they drop the cached dashboards of the
+    users they touch themselves. With a shared cache nothing else would.
+    """
+
+    def dashboard_users(self, objs):
+        raise NotImplementedError
+
+    def save_model(self, request, obj, form, change):
+        # An edit can move the object to another user
+        before = self.dashboard_users(self.model._default_manager.filter(pk=obj.pk)) if change else []
+        super().save_model(request, obj, form, change)
+        dashboard_cache.invalidate(*before, *self.dashboard_users([obj]))
+
+    def delete_model(self, request, obj):
+        users = self.dashboard_users([obj])
+        super().delete_model(request, obj)
+        dashboard_cache.invalidate(*users)
+
+    def delete_queryset(self, request, queryset):
+        users = self.dashboard_users(queryset)
+        super().delete_queryset(request, queryset)
+        dashboard_cache.invalidate(*users)
+
+
+class PeriodFilter(admin.SimpleListFilter):
+    """
+    Year -> month -> day navigation on a datetime field, in local time.
+    The choices come from the first and last value (two index lookups) and
+    the calendar, and the filter is a range, so the field's index serves it.
+    """
+    title = 'period'
+    parameter_name = 'period'
+    field_name = 'timestamp'
+
+    def _bounds(self, model):
+        values = model._default_manager.order_by(self.field_name).values_list(self.field_name, flat=True)
+        first, last = values.first(), values.reverse().first()
+        if first is None:
+            return None
+        return timezone.localdate(first), timezone.localdate(last)
+
+    def _selected(self):
+        """
+        (year, month, day) of the selected period, unknown parts None.
+        """
+        value = self.value() or ''
+        try:
+            numbers = [int(part) for part in value.split('-')] if value else []
+            if len(numbers) > 3:
+                raise ValueError
+            date(*numbers, *[1] * (3 - len(numbers)))  # Must be a real date
+        except ValueError:
+            return None, None, None
+        return tuple(numbers) + (None,) * (3 - len(numbers))
+
+    def lookups(self, request, model_admin):
+        bounds = self._bounds(model_admin.model)
+        if bounds is None:
+            return []
+        first, last = bounds
+        year, month, day = self._selected()
+        if year is None:
+            return [(str(y), str(y)) for y in range(last.year, first.year - 1, -1)]
+
+        choices = [(str(year), f'‹ {year}')]
+        if month is None:
+            months = [
+                m for m in range(12, 0, -1)
+                if (first.year, first.month) <= (year, m) <= (last.year, last.month)
+            ]
+            return choices + [(f'{year}-{m:02d}', f'{calendar.month_name[m]} {year}') for m in months]
+
+        choices.append((f'{year}-{month:02d}', f'‹ {calendar.month_name[month]} {year}'))
+        days = [
+            d for d in range(calendar.monthrange(year, month)[1], 0, -1)
+            if first <= date(year, month, d) <= last
+        ]
+        return choices + [(f'{year}-{month:02d}-{d:02d}', f'{calendar.month_abbr[month]} {d}') for d in days]
+
+    def queryset(self, request, queryset):
+        year, month, day = self._selected()
+        if year is None:
+            return queryset
+        if month is None:
+            start, end = date(year, 1, 1), date(year + 1, 1, 1)
+        elif day is None:
+            start = date(year, month, 1)
+            end = start + timedelta(days=calendar.monthrange(year, month)[1])
+        else:
+            start = date(year, month, day)
+            end = start + timedelta(days=1)
+        return queryset.filter(**{
+            f'{self.field_name}__gte': timezone.make_aware(datetime.combine(start, time.min)),
+            f'{self.field_name}__lt': timezone.make_aware(datetime.combine(end, time.min)),
+        })
+
+
+def _prefix_range(field_name, prefix):
+    """
+    `field startswith prefix` written as a range, which any btree index on
+    the field serves (LIKE 'x%' only uses one with special operator classes).
+    """
+    following = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f'{field_name}__gte': prefix, f'{field_name}__lt': following})
+
 
 @admin.register(Account)
-class AccountAdmin(admin.ModelAdmin):
-    list_display = ('user', 'account_number', 'balance', 'account_type')
-    search_fields = ('user__username', 'account_number', 'mobile_number')
+class AccountAdmin(InvalidatesDashboards, ScalableAdmin):
+    list_display = ('user', 'account_number', 'total_balance', 'account_type')
+    list_select_related = ('user',)
+    sortable_by = ('account_number',)
+    raw_id_fields = ('user',)
+    # Digits: account number or mobile number prefix. Anything else: exact username.
+    search_fields = ('account_number', 'mobile_number', 'user__username')
+    search_help_text = 'Account or mobile number (or their first digits), or the exact username.'
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(total=Account.total_balance())
+
+    def dashboard_users(self, accounts):
+        return [account.user_id for account in accounts]
+
+    @admin.display(description='Balance')
+    def total_balance(self, account):
+        return f'{account.total:.2f}'
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(
+                _prefix_range('account_number', term) | _prefix_range('mobile_number', term)
+            ), False
+        return queryset.filter(user__username=term), False
+
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(InvalidatesDashboards, ScalableAdmin):
     list_display = ('account', 'transaction_type', 'amount', 'timestamp')
-    list_filter = ('transaction_type', 'timestamp')
+    list_filter = ('transaction_type', PeriodFilter)
+    list_select_related = ('account__user',)
+    # Newest first, the order of both timestamp indexes
+    ordering = ('-timestamp', '-id')
+    sortable_by = ('timestamp',)
+    search_fields = ('account__account_number',)
+    search_help_text = 'Exact account number.'
+    raw_id_fields = ('account',)
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return queryset.filter(account__account_number=term), False
+
+    def dashboard_users(self, transactions):
+        return list(
+            Account.objects.filter(transactions__in=transactions).values_list('user_id', flat=True).distinct()
+        )
@@ -0,0 +1,161 @@
+import threading
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F
+
+from .models import Account, AccountNumberSequence
+
+# Account number allocator.
+#
+# An account number is 10 digits: a 9 digit serial followed by a Luhn check
+# digit. Serials come from the AccountNumberSequence table in blocks: one
+# UPDATE ... RETURNING (an UPDATE and a SELECT on databases without it)
+# reserves a whole block for this worker, and the numbers inside it are then
+# handed out from memory with no database round trip.
+#
+# The check digit lets forms reject most typos (any single wrong digit and
+# most swapped neighbours) without querying the database.
+
+SEQUENCE_NAME = 'account_number'
+FIRST_SERIAL = 100000000
+LAST_SERIAL = 999999999
+
+
+class AccountNumbersExhausted(Exception):
+    pass
+
+
+def can_return_from_update(connection):
+    """
+    UPDATE ... RETURNING works on PostgreSQL and on SQLite 3.35+ (the same
+    release that added INSERT ... RETURNING). MariaDB only has the INSERT form.
+    """
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.features.can_return_columns_from_insert
+
+
+def luhn_check_digit(digits):
+    """
+    Returns the Luhn check digit for a string of digits.
+    """
+    total = 0
+    for i, digit in enumerate(reversed(digits)):
+        value = int(digit)
+        if i % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return str((10 - total % 10) % 10)
+
+
+def has_valid_check_digit(account_number):
+    return luhn_check_digit(account_number[:-1]) == account_number[-1]
+
+
+def is_well_formed(account_number):
+    """
+    True if the number has the right shape (10 digits) and a correct check
+    digit. While ACCOUNT_NUMBER_LEGACY_LOOKUP is on, a number with a wrong
+    check digit still passes if an older account really has it (one lookup
+    on the unique index); typos of new numbers are rejected either way.
+    """
+    if len(account_number) != 10 or not account_number.isdigit():
+        return False
+    if has_valid_check_digit(account_number):
+        return True
+    if getattr(settings, 'ACCOUNT_NUMBER_LEGACY_LOOKUP', True):
+        # Older accounts have random numbers without a check digit
+        return Account.objects.filter(account_number=account_number).exists()
+    return False
+
+
+def format_account_number(serial):
+    serial = str(serial)
+    return serial + luhn_check_digit(serial)
+
+
+class AccountNumberAllocator:
+    """
+    Per-process allocator. Thread safe.
+    """
+
+    def __init__(self, block_size=None):
+        self._block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0  # Exclusive
+
+    @property
+    def block_size(self):
+        return self._block_size or getattr(settings, 'ACCOUNT_NUMBER_BLOCK_SIZE', 100)
+
+    def _claim(self, size):
+        """
+        Reserves `size` serials in the database and returns the first one.
+        """
+        alias = router.db_for_write(AccountNumberSequence)
+        connection = connections[alias]
+        table = connection.ops.quote_name(AccountNumberSequence._meta.db_table)
+
+        if can_return_from_update(connection):
+            # One round trip: move the sequence forward and read where it ended
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {table} SET next_serial = next_serial + %s WHERE name = %s RETURNING next_serial',
+                    [size, SEQUENCE_NAME],
+                )
+                row = cursor.fetchone()
+            end = row[0] if row else None
+        else:
+            with transaction.atomic(using=alias):
+                updated = AccountNumberSequence.objects.using(alias).filter(name=SEQUENCE_NAME).update(
+                    next_serial=F('next_serial') + size
+                )
+                end = None
+                if updated:
+                    end = AccountNumberSequence.objects.using(alias).get(name=SEQUENCE_NAME).next_serial
+
+        if end is None:
+            # First use on this database: start the sequence and try again
+            AccountNumberSequence.objects.using(alias).get_or_create(
+                name=SEQUENCE_NAME, defaults={'next_serial': FIRST_SERIAL}
+            )
+            return self._claim(size)
+
+        start = end - size
+        if end - 1 > LAST_SERIAL:
+            raise AccountNumbersExhausted('No account numbers left.')
+        return start
+
+    def allocate(self, count):
+        """
+        Returns `count` new account numbers. Bulk callers get them with at
+        most one extra database round trip, whatever the count.
+        """
+        with self._lock:
+            serials = list(range(self._next, min(self._end, self._next + count)))
+            self._next += len(serials)
+            missing = count - len(serials)
+            if missing:
+                size = max(missing, self.block_size)
+                start = self._claim(size)
+                serials += range(start, start + missing)
+                self._next, self._end = start + missing, start + size
+        return [format_account_number(serial) for serial in serials]
+
+    def next_number(self):
+        return self.allocate(1)[0]
+
+    def discard_block(self):
+        """
+        Forgets the rest of the current block, so the next number comes
+        from a freshly claimed one.
+        """
+        with self._lock:
+            self._next = self._end = 0
+
+
+allocator = AccountNumberAllocator()
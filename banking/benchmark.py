@@ -0,0 +1,260 @@
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import Client
+from django.urls import resolve
+
+from . import ledger, shards
+from .models import Account
+
+# Load generator for the banking flows.
+#
+# Every simulated user runs in its own thread with its own test Client (and
+# so its own database connection): register -> login -> a random mix of
+# deposits, withdrawals, transfers, dashboard and history views. Each
+# request is timed and its SQL queries are counted, grouped by URL name.
+#
+# hot_account() measures one thing only: how many transfers per second a
+# single receiving account takes, with or without balance shards.
+
+# Weighted mix of actions after login
+ACTION_WEIGHTS = {
+    'deposit': 30,
+    'transfer': 25,
+    'dashboard': 30,
+    'history': 10,
+    'withdraw': 5,
+}
+
+
+class Recorder:
+    """
+    Collects (latency, query count, ok) samples per URL name. Thread safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def add(self, url_name, seconds, queries, ok):
+        with self._lock:
+            self.samples[url_name].append((seconds, queries, ok))
+
+
+class QueryCounter:
+    """
+    Counts the queries run on this thread's connection (execute_wrapper).
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class SimulatedUser:
+    def __init__(self, index, run_id, recorder, directory, rng):
+        self.client = Client()
+        self.username = f'bench_{run_id}_{index}'
+        self.recorder = recorder
+        self.directory = directory  # Shared list of account numbers to transfer to
+        self.rng = rng
+        self.account_number = None
+
+    def request(self, method, path, data=None, follow=False):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with connections['default'].execute_wrapper(counter):
+            try:
+                response = getattr(self.client, method)(path, data or {}, follow=follow)
+                ok = response.status_code < 400
+            except Exception:
+                response, ok = None, False
+        elapsed = time.perf_counter() - start
+        self.recorder.add(resolve(path).url_name, elapsed, counter.count, ok)
+        return response
+
+    def sign_up(self):
+        password = 'Bench-pass-123'
+        self.request('post', '/register/', {
+            'username': self.username,
+            'first_name': 'Bench',
+            'last_name': 'User',
+            'email': f'{self.username}@example.com',
+            'password': password,
+            'confirm_password': password,
+            'mobile_number': '9999999999',
+            'initial_deposit': '1000',
+            'account_type': 'Savings',
+        })
+        self.request('post', '/login/', {'username': self.username, 'password': password})
+        # Bookkeeping for the transfers, not part of the measured traffic
+        self.account_number = Account.objects.filter(user__username=self.username).values_list(
+            'account_number', flat=True
+        ).first()
+        if self.account_number:
+            self.directory.append(self.account_number)
+
+    def act(self):
+        action = self.rng.choices(list(ACTION_WEIGHTS), weights=list(ACTION_WEIGHTS.values()))[0]
+        amount = f'{self.rng.randint(1, 50)}.00'
+        if action == 'deposit':
+            self.request('post', '/deposit/', {'amount': amount})
+        elif action == 'withdraw':
+            self.request('post', '/withdraw/', {'amount': amount})
+        elif action == 'transfer':
+            others = [number for number in self.directory if number != self.account_number]
+            if others:
+                self.request('post', '/transfer/', {
+                    'recipient_account': self.rng.choice(others),
+                    'amount': amount,
+                })
+        elif action == 'dashboard':
+            self.request('get', '/dashboard/')
+        elif action == 'history':
+            self.request('get', '/history/')
+
+
+def percentile(sorted_values, pct):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(recorder, wall_seconds):
+    """
+    Builds the report: per URL name throughput, latency percentiles (ms)
+    and average SQL queries per request.
+    """
+    report = {}
+    for url_name, samples in sorted(recorder.samples.items()):
+        latencies = sorted(seconds * 1000 for seconds, _, _ in samples)
+        report[url_name] = {
+            'requests': len(samples),
+            'errors': sum(1 for _, _, ok in samples if not ok),
+            'throughput_rps': round(len(samples) / wall_seconds, 2) if wall_seconds else 0,
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'queries_per_request': round(sum(q for _, q, _ in samples) / len(samples), 2),
+        }
+    return report
+
+
+def run(users=20, actions=50, seed=None):
+    """
+    Runs `users` simulated users concurrently, each doing `actions` actions
+    after signing up. Returns (report, wall seconds).
+    """
+    recorder = Recorder()
+    directory = []
+    seed_rng = random.Random(seed)
+    run_id = seed_rng.randrange(10 ** 8)
+
+    def worker(index, rng):
+        try:
+            user = SimulatedUser(index, run_id, recorder, directory, rng)
+            user.sign_up()
+            for _ in range(actions):
+                user.act()
+        finally:
+            connections.close_all()
+
+    threads = [
+        threading.Thread(target=worker, args=(i, random.Random(seed_rng.random())))
+        for i in range(users)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    return summarize(recorder, wall), wall
+
+
+@contextmanager
+def throwaway_database():
+    """
+    Creates a temporary SQLite file database (a file, not memory, so
+    every thread shares it), migrates it, and removes it afterwards.
+    """
+    connection = connections['default']
+    handle, path = tempfile.mkstemp(suffix='.sqlite3', prefix='bench_')
+    os.close(handle)
+    connection.settings_dict.setdefault('TEST', {})['NAME'] = path
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def hot_account(senders=8, transfers=200, shard_count=0):
+    """
+    `senders` threads, each with its own account, transfer 1.00 (no fee) to
+    the same account `transfers` times each. Returns the credits per second
+    and checks that the hot account received every one of them.
+    """
+    run_id = random.randrange(10 ** 8)
+    accounts = [
+        Account.objects.create(
+            user=User.objects.create(username=f'hot_{run_id}_{index}'),
+            mobile_number='9999999999',
+            account_type='Savings',
+            balance=Decimal(transfers),
+        )
+        for index in range(senders + 1)
+    ]
+    hot, sender_accounts = accounts[0], accounts[1:]
+    if shard_count:
+        shards.set_shards(hot, shard_count)
+
+    errors = []
+    start_line = threading.Barrier(senders)
+
+    def worker(sender):
+        try:
+            start_line.wait()
+            for _ in range(transfers):
+                try:
+                    ledger.transfer(sender, hot, Decimal('1.00'), service_fee=Decimal('0.00'))
+                except Exception as e:
+                    errors.append(e)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=(sender,)) for sender in sender_accounts]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    credits = senders * transfers - len(errors)
+    received = shards.totals([hot.id])[hot.id] - hot.balance
+    return {
+        'shards': shard_count,
+        'credits': credits,
+        'errors': len(errors),
+        'seconds': round(wall, 2),
+        'credits_per_second': round(credits / wall, 1) if wall else 0,
+        'consistent': received == credits,
+    }
@@ -0,0 +1,162 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Account, BalanceCheckpoint, CheckpointRun, Transaction
+
+# Balance checkpoints.
+#
+# A checkpoint is the balance of one account at the end of one (local) day.
+# They are built incrementally from the Transaction table: every run only
+# looks at transactions with an id above the watermark (the last transaction
+# already folded in) and moves the watermark forward chunk by chunk.
+#
+# balance_as_of() starts from the nearest checkpoint and only replays the
+# transactions after it, plus the small tail above the watermark.
+
+
+def day_end(day):
+    """
+    The first moment after `day` in local time (midnight of the next day).
+    """
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def watermark():
+    """
+    Id of the last transaction included in the checkpoints (0 if none).
+    """
+    last = CheckpointRun.objects.aggregate(last=Max('last_transaction_id'))['last']
+    return last or 0
+
+
+def balance_as_of(account, when):
+    """
+    Balance of `account` at the moment `when` (transactions strictly before it).
+    """
+    local_day = timezone.localdate(when)
+    while True:
+        last_folded = watermark()
+        checkpoint = account.checkpoints.filter(day__lt=local_day).order_by('-day').first()
+        # fold_chunk() commits checkpoints and watermark together. If one
+        # committed between these reads, the checkpoint may already hold
+        # rows above last_folded (counted twice): read both again.
+        if watermark() == last_folded:
+            break
+    balance = checkpoint.balance if checkpoint else Decimal('0')
+
+    # Transactions after the checkpoint that the checkpoints already know about...
+    covered = account.transactions.filter(timestamp__lt=when, id__lte=last_folded)
+    if checkpoint:
+        covered = covered.filter(timestamp__gte=day_end(checkpoint.day))
+    # ...plus the ones the builder hasn't reached yet, whatever their date.
+    uncovered = account.transactions.filter(timestamp__lt=when, id__gt=last_folded)
+
+    for queryset in (covered, uncovered):
+        balance += queryset.aggregate(total=Sum(Transaction.signed_amount(), default=0))['total']
+    return balance
+
+
+# ==========================================
+# BUILDING CHECKPOINTS
+# ==========================================
+
+def start_run():
+    """
+    Returns the run to work on: an unfinished one (resume) or a new one
+    covering everything since the last run. None if there is nothing new.
+    """
+    run = CheckpointRun.objects.filter(finished_at__isnull=True).order_by('id').first()
+    if run:
+        return run
+
+    start = watermark()
+    end = Transaction.objects.aggregate(last=Max('id'))['last'] or 0
+    if end <= start:
+        return None
+    return CheckpointRun.objects.create(
+        from_transaction_id=start, to_transaction_id=end, last_transaction_id=start
+    )
+
+
+def _merge(old, new, base):
+    """
+    Folds new daily deltas into an account's existing checkpoints.
+    - old: {day: balance} existing checkpoints (from some day onwards).
+    - new: {day: delta} new transactions per day.
+    - base: balance before the first day in `old`/`new`.
+    Returns {day: balance} for every day that has to be written.
+    """
+    first_new_day = min(new)
+    result = {}
+    running_old = base
+    new_total = Decimal('0')
+    for day in sorted(set(old) | set(new)):
+        running_old = old.get(day, running_old)
+        new_total += new.get(day, 0)
+        if day >= first_new_day:
+            result[day] = running_old + new_total
+    return result
+
+
+@transaction.atomic
+def fold_chunk(run, chunk_size):
+    """
+    Folds the next `chunk_size` transaction ids of the run into the
+    checkpoints and records the progress in the same database transaction.
+    Returns the number of checkpoints written.
+    """
+    start = run.last_transaction_id
+    end = min(start + chunk_size, run.to_transaction_id)
+
+    rows = (
+        Transaction.objects.filter(id__gt=start, id__lte=end)
+        .annotate(day=TruncDate('timestamp'))
+        .values('account_id', 'day')
+        .annotate(delta=Sum(Transaction.signed_amount()))
+        .order_by()
+    )
+    deltas = {}
+    for row in rows:
+        deltas.setdefault(row['account_id'], {})[row['day']] = row['delta']
+
+    checkpoints = []
+    if deltas:
+        first_day = min(min(days) for days in deltas.values())
+        existing = {}
+        for cp in BalanceCheckpoint.objects.filter(account_id__in=deltas, day__gte=first_day):
+            existing.setdefault(cp.account_id, {})[cp.day] = cp.balance
+        base_balance = BalanceCheckpoint.objects.filter(
+            account_id=OuterRef('pk'), day__lt=first_day
+        ).order_by('-day').values('balance')[:1]
+        bases = dict(
+            Account.objects.filter(id__in=deltas)
+            .annotate(base=Subquery(base_balance))
+            .values_list('id', 'base')
+        )
+
+        for account_id, new in deltas.items():
+            if account_id not in bases:
+                continue  # Account deleted meanwhile
+            merged = _merge(existing.get(account_id, {}), new, bases[account_id] or Decimal('0'))
+            checkpoints += [
+                BalanceCheckpoint(account_id=account_id, day=day, balance=balance)
+                for day, balance in merged.items()
+            ]
+        BalanceCheckpoint.objects.bulk_create(
+            checkpoints,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['account', 'day'],
+            update_fields=['balance'],
+        )
+
+    run.last_transaction_id = end
+    if end >= run.to_transaction_id:
+        run.finished_at = timezone.now()
+    run.save(update_fields=['last_transaction_id', 'finished_at'])
+    return len(checkpoints)
@@ -0,0 +1,178 @@
+import csv
+import hashlib
+import json
+import os
+
+import django
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from . import directory
+from .allocator import allocator
+from .forms import CustomerImportForm
+from .models import Account, CustomerImport, Transaction
+
+# Bulk customer import (manage.py import_customers).
+#
+# Reads a CSV (with a header row) or JSON Lines file of customers and creates
+# User + Account pairs and opening-balance deposits, a batch at a time:
+# - every line is validated with CustomerImportForm, bad lines are reported
+#   and skipped, the rest of the batch still goes in;
+# - passwords are hashed in a process pool (PBKDF2 is the slow part, one
+#   CPU core per hash);
+# - account numbers come from the allocator in one block per batch;
+# - users, accounts and deposits are written with bulk_create, in one
+#   database transaction per batch together with the progress (CustomerImport).
+#
+# Columns: username, first_name, last_name, email, password, mobile_number,
+# account_type (Savings/Fixed), opening_balance.
+
+BATCH_SIZE = 1000
+
+
+def file_fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def start_import(path):
+    """
+    Returns the CustomerImport of this file: the one from an earlier
+    (interrupted or finished) run of the same content, or a new one.
+    """
+    job, _ = CustomerImport.objects.get_or_create(
+        fingerprint=file_fingerprint(path),
+        defaults={'source': os.path.basename(path)[:255]},
+    )
+    return job
+
+
+def read_records(path, after_line=0):
+    """
+    Yields (line number, record dict or None, error or None) for every
+    customer after `after_line`. Blank lines are skipped.
+    """
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if path.endswith(('.jsonl', '.ndjson')):
+            for line_no, line in enumerate(f, start=1):
+                if line_no <= after_line or not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, None, f'Invalid JSON: {e.msg}.'
+                    continue
+                if not isinstance(record, dict):
+                    yield line_no, None, 'Expected a JSON object.'
+                    continue
+                yield line_no, record, None
+        else:
+            reader = csv.DictReader(f)
+            for record in reader:
+                if reader.line_num <= after_line or not any((value or '').strip() for value in record.values()):
+                    continue
+                yield reader.line_num, record, None
+
+
+def clean_batch(batch, seen_usernames):
+    """
+    Validates a batch of read_records() output.
+    - seen_usernames: usernames already taken earlier in this run (updated).
+    Returns (valid [(line, cleaned data)], errors [(line, message)]).
+    """
+    valid, errors = [], []
+    for line_no, record, error in batch:
+        if error:
+            errors.append((line_no, error))
+            continue
+        form = CustomerImportForm({key: str(value) for key, value in record.items() if value is not None})
+        if not form.is_valid():
+            errors.append((line_no, '; '.join(
+                f'{field}: {" ".join(messages)}' for field, messages in form.errors.items()
+            )))
+            continue
+        username = form.cleaned_data['username']
+        if username in seen_usernames:
+            errors.append((line_no, f'username: "{username}" appears earlier in the file.'))
+            continue
+        seen_usernames.add(username)
+        valid.append((line_no, form.cleaned_data))
+
+    # One query for the whole batch instead of one per customer
+    taken = set(User.objects.filter(
+        username__in=[data['username'] for _, data in valid]
+    ).values_list('username', flat=True))
+    if taken:
+        errors += [(line_no, f'username: "{data["username"]}" already exists.')
+                   for line_no, data in valid if data['username'] in taken]
+        valid = [(line_no, data) for line_no, data in valid if data['username'] not in taken]
+        errors.sort()
+    return valid, errors
+
+
+def account_numbers(count):
+    """
+    `count` fresh account numbers, skipping any that an older (random)
+    account number already uses.
+    """
+    numbers = allocator.allocate(count)
+    while True:
+        clashes = set(Account.objects.filter(account_number__in=numbers).values_list('account_number', flat=True))
+        if not clashes:
+            return numbers
+        allocator.discard_block()
+        numbers = [number for number in numbers if number not in clashes] + allocator.allocate(len(clashes))
+
+
+@transaction.atomic
+def write_batch(job, valid, password_hashes, last_line, failed):
+    """
+    Creates the users, accounts and opening deposits of a validated batch and
+    records the progress, all in one database transaction.
+    """
+    if valid:
+        now = timezone.now()
+        users = User.objects.bulk_create([
+            User(
+                username=data['username'],
+                first_name=data['first_name'],
+                last_name=data['last_name'],
+                email=data['email'],
+                password=password_hash,
+                date_joined=now,
+            )
+            for (_, data), password_hash in zip(valid, password_hashes)
+        ])
+        accounts = Account.objects.bulk_create([
+            Account(
+                user=user,
+                account_number=number,
+                mobile_number=data['mobile_number'],
+                balance=data['opening_balance'],
+                account_type=data['account_type'],
+            )
+            for user, number, (_, data) in zip(users, account_numbers(len(users)), valid)
+        ])
+        Transaction.objects.bulk_create([
+            Transaction(account=account, amount=account.balance, transaction_type='Deposit')
+            for account in accounts
+            if account.balance > 0
+        ])
+        directory.accounts_imported()
+
+    job.last_line = last_line
+    job.imported += len(valid)
+    job.failed += failed
+    job.save(update_fields=['last_line', 'imported', 'failed'])
+
+
+def init_worker():
+    """
+    Process pool initializer: makes Django usable in the worker (needed
+    where processes are spawned rather than forked).
+    """
+    django.setup()
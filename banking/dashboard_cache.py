@@ -0,0 +1,111 @@
+import hashlib
+from decimal import Decimal
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import OuterRef, Subquery
+
+from .models import Account, Transaction
+
+# Dashboard read model.
+#
+# Most dashboard views happen between two writes, so the balance and the
+# recent transactions are kept in the cache per user. Every write to an
+# account calls invalidate(), which drops the entry.
+#
+# With a shared cache (REDIS_URL) that is enough, and a repeat view costs no
+# query. With a local memory cache, other workers' and management commands'
+# invalidate() never reach this process, so each entry is stored with the
+# account's version (its newest transaction id and the fields shown) and
+# checked with one indexed query on every read.
+#
+# Each entry carries an ETag so an unchanged dashboard can be answered with
+# 304 Not Modified.
+
+RECENT_TRANSACTIONS = 5
+CENTS = Decimal('0.01')
+DASHBOARD_TTL = 60 * 60  # Seconds. Invalidation does the real work, this frees memory.
+
+
+def cache_key(user_id):
+    return f'banking:dashboard:{user_id}'
+
+
+def _cache_is_local():
+    """
+    True if the cache lives in this process, out of reach of other processes' invalidate().
+    """
+    return isinstance(caches['default'], LocMemCache)
+
+
+def version(user_id):
+    """
+    What the dashboard of a user depends on, from the primary. Every balance
+    change writes a transaction, so a new one means a new version.
+    """
+    newest = Transaction.objects.filter(account=OuterRef('pk')).order_by('-id').values('id')[:1]
+    return (
+        Account.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id)
+        .annotate(newest=Subquery(newest))
+        .values_list('id', 'account_type', 'balance_shards', 'newest').get()
+    )
+
+
+def build(user_id):
+    """
+    Loads the dashboard data from the database.
+    Always from the primary: a lagging replica must never end up in the cache.
+    """
+    account = (
+        Account.objects.using(DEFAULT_DB_ALIAS)
+        .annotate(total_balance=Account.total_balance()).get(user_id=user_id)
+    )
+    transactions = list(
+        account.transactions.order_by('-timestamp', '-id')
+        .values('id', 'transaction_type', 'amount', 'timestamp')[:RECENT_TRANSACTIONS]
+    )
+    data = {
+        'account': {
+            'id': account.id,
+            'account_number': account.account_number,
+            'account_type': account.account_type,
+            'balance': account.total_balance.quantize(CENTS),  # SQLite drops the scale of expressions
+        },
+        'transactions': transactions,
+    }
+    fingerprint = repr((data['account'], [t['id'] for t in transactions]))
+    data['etag'] = '"%s"' % hashlib.md5(fingerprint.encode()).hexdigest()
+    return data
+
+
+def get_dashboard(user_id):
+    """
+    Cached dashboard data for a user: {'account', 'transactions', 'etag'}.
+    Rebuilt when the account changed since it was cached.
+    """
+    key = cache_key(user_id)
+    local = _cache_is_local()
+    cached = cache.get(key)
+    if cached is not None and (not local or cached[0] == version(user_id)):
+        return cached[1]
+
+    current = version(user_id)
+    data = build(user_id)
+    cache.set(key, (current, data), DASHBOARD_TTL)
+    # A write committing since version() may have invalidated before the set
+    # above, which would keep the old data in a shared cache. Locally the
+    # next read's version check catches it anyway.
+    if not local and version(user_id) != current:
+        cache.delete(key)
+    return data
+
+
+def invalidate(*user_ids):
+    """
+    Drops the cached dashboards of these users once the current database
+    transaction commits (right away outside a transaction). Deleting before
+    the commit would let another request cache the old balance again.
+    """
+    keys = [cache_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
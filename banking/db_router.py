@@ -0,0 +1,85 @@
+import functools
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Primary / replica database routing.
+#
+# Writes always go to the primary ('default'). Reads go to the 'replica'
+# alias only inside views marked with @read_only_view, and only when:
+# - a 'replica' database is configured,
+# - the primary has no open transaction (reads inside a write transaction
+#   must see that transaction's own changes),
+# - the user hasn't written anything in the last REPLICA_PIN_SECONDS (so
+#   they see their own deposit right after the redirect, not the replica's
+#   slightly older copy). ReplicaPinMiddleware sets that cookie.
+
+REPLICA_DB_ALIAS = 'replica'
+PIN_COOKIE = 'primary_pin'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_available():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Related lookups stay on the database their object came from
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if not _use_replica.get() or not replica_available():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary (see sync_replica), never migrated itself
+        return db != REPLICA_DB_ALIAS
+
+
+def read_only_view(view):
+    """
+    Decorator for views that only read: their queries may use the replica.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.COOKIES.get(PIN_COOKIE):
+            return view(request, *args, **kwargs)
+        token = _use_replica.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
+
+
+class ReplicaPinMiddleware:
+    """
+    After a write request (POST etc.), keeps the user on the primary for
+    REPLICA_PIN_SECONDS so their next pages include what they just did.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and replica_available():
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
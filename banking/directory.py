@@ -0,0 +1,262 @@
+import bisect
+import threading
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Account
+
+# Recipient directory.
+#
+# resolve() maps an account number to the account id and the holder's masked
+# name. Entries are cached per number: the transfer form resolves the
+# recipient once, the view reuses the result, and regular payees usually
+# don't need a database query at all.
+#
+# search() serves the payee autocomplete from a sorted list of account
+# numbers that every worker keeps in memory. Account creations and deletions
+# are published as numbered entries in the cache (a small change log). A
+# worker applies the entries it hasn't seen yet, at most once per
+# INDEX_CHECK_SECONDS, and reloads the list from the database on first use
+# or when it fell too far behind. The change log only reaches other workers
+# through a shared cache (REDIS_URL), so each check also reads the accounts
+# created after the newest one the worker knows (an id range, one index
+# lookup), and the whole list is reloaded every INDEX_RELOAD_SECONDS to drop
+# accounts closed by other processes.
+#
+# Searching needs MIN_PREFIX of the 10 digits and is rate limited per user
+# (SEARCHES_PER_MINUTE), so the directory can't be walked to list customers.
+# Like the velocity counters, the limit lives in the cache: per worker
+# without a shared one.
+
+Recipient = namedtuple('Recipient', ['id', 'account_number', 'holder'])
+
+ENTRY_TTL = 60 * 60  # Seconds. Creations and deletions update entries, this is a safety net.
+CHANGE_TTL = 60 * 60
+MAX_CHANGES = 1000  # A worker further behind than this reloads instead
+INDEX_CHECK_SECONDS = 1
+INDEX_RELOAD_SECONDS = 5 * 60
+MIN_PREFIX = 8  # The last digit is a check digit: at most 10 accounts share 8 digits
+MAX_RESULTS = 10
+SEARCHES_PER_MINUTE = 20
+
+VERSION_KEY = 'banking:directory:version'
+
+
+def _entry_key(account_number):
+    return f'banking:directory:account:{account_number}'
+
+
+def _change_key(version):
+    return f'banking:directory:change:{version}'
+
+
+def mask_name(first_name, last_name, username=''):
+    """
+    'Jane Doe' -> 'J*** D***'. Enough to recognise a payee, not to learn their name.
+    """
+    parts = [part for part in (first_name, last_name) if part] or [username]
+    return ' '.join(part[0].upper() + '***' for part in parts if part)
+
+
+def resolve(account_number):
+    """
+    Returns the Recipient for an account number, or None if there is no such account.
+    """
+    entry = cache.get(_entry_key(account_number))
+    if entry is None:
+        row = (
+            Account.objects.filter(account_number=account_number, closed_at__isnull=True)
+            .values_list('id', 'user__first_name', 'user__last_name', 'user__username')
+            .first()
+        )
+        if row is None:
+            return None
+        entry = (row[0], mask_name(*row[1:]))
+        cache.set(_entry_key(account_number), entry, ENTRY_TTL)
+    return Recipient(entry[0], account_number, entry[1])
+
+
+# ==========================================
+# CHANGES
+# ==========================================
+
+def _start_log():
+    # The log restarts at the current time in ms if its counter was lost,
+    # so a worker never mistakes new entries for ones it already applied.
+    cache.add(VERSION_KEY, int(time.time() * 1000), None)
+
+
+def _publish(change):
+    _start_log()
+    version = cache.incr(VERSION_KEY)
+    cache.set(_change_key(version), change, CHANGE_TTL)
+
+
+def account_added(account):
+    """
+    Call after creating an account (published when the transaction commits).
+    """
+    holder = mask_name(account.user.first_name, account.user.last_name, account.user.username)
+
+    def publish():
+        cache.set(_entry_key(account.account_number), (account.id, holder), ENTRY_TTL)
+        _publish(('add', account.account_number, account.id, holder))
+    transaction.on_commit(publish)
+
+
+def account_removed(account_number):
+    """
+    Call after closing or deleting an account (published when the transaction commits).
+    """
+    def publish():
+        cache.delete(_entry_key(account_number))
+        _publish(('remove', account_number))
+    transaction.on_commit(publish)
+
+
+def accounts_imported():
+    """
+    Call after creating many accounts at once: workers reload their index
+    instead of reading one change per account.
+    """
+    transaction.on_commit(lambda: _publish(('reload',)))
+
+
+# ==========================================
+# AUTOCOMPLETE INDEX
+# ==========================================
+
+class DirectoryIndex:
+    """
+    Sorted in-memory list of account numbers for prefix search. Thread safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._numbers = []
+        self._holders = {}
+        self._version = None  # Last change applied, None until loaded
+        self._max_id = 0  # Newest account seen in the database
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+
+    def _reload(self):
+        # Read the version first: changes made during the load are applied again, never missed
+        _start_log()
+        version = cache.get(VERSION_KEY)
+        rows = Account.objects.filter(closed_at__isnull=True).values_list(
+            'id', 'account_number', 'user__first_name', 'user__last_name', 'user__username'
+        ).iterator(chunk_size=5000)
+        self._holders = {}
+        self._max_id = 0
+        for account_id, number, *names in rows:
+            self._holders[number] = mask_name(*names)
+            self._max_id = max(self._max_id, account_id)
+        self._numbers = sorted(self._holders)
+        self._version = version
+        self._loaded_at = time.monotonic()
+
+    def _catch_up(self):
+        """
+        Adds the accounts created since the newest one in the index, by any
+        process: the change log never reaches workers with a local cache.
+        """
+        rows = Account.objects.filter(id__gt=self._max_id).order_by('id').values_list(
+            'id', 'closed_at', 'account_number', 'user__first_name', 'user__last_name', 'user__username'
+        )
+        for account_id, closed_at, number, *names in rows:
+            if closed_at is None:
+                self._apply(('add', number, account_id, mask_name(*names)))
+            self._max_id = account_id
+
+    def _apply(self, change):
+        action, number = change[0], change[1]
+        if action == 'add':
+            if number not in self._holders:
+                bisect.insort(self._numbers, number)
+            self._holders[number] = change[3]
+        elif number in self._holders:
+            del self._holders[number]
+            del self._numbers[bisect.bisect_left(self._numbers, number)]
+
+    def _apply_log(self):
+        """
+        Applies the changes published since the last one applied. Returns
+        False when the index has to be reloaded instead.
+        """
+        current = cache.get(VERSION_KEY)
+        if current == self._version:
+            return True
+        if current is None or current < self._version or current - self._version > MAX_CHANGES:
+            return False
+        keys = [_change_key(version) for version in range(self._version + 1, current + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return False  # Some changes expired
+        if any(change[0] == 'reload' for change in changes.values()):
+            return False
+        for key in keys:
+            self._apply(changes[key])
+        self._version = current
+        return True
+
+    def refresh(self):
+        """
+        Brings the index up to date (at most once per INDEX_CHECK_SECONDS).
+        """
+        if self._version is not None and time.monotonic() - self._checked_at < INDEX_CHECK_SECONDS:
+            return
+        with self._lock:
+            if self._version is not None and time.monotonic() - self._checked_at < INDEX_CHECK_SECONDS:
+                return
+            self._checked_at = time.monotonic()
+            if (
+                self._version is None
+                or time.monotonic() - self._loaded_at >= INDEX_RELOAD_SECONDS
+                or not self._apply_log()
+            ):
+                self._reload()
+            else:
+                self._catch_up()
+
+    def search(self, prefix, limit=MAX_RESULTS):
+        """
+        Returns up to `limit` (account_number, holder) pairs starting with `prefix`.
+        """
+        self.refresh()
+        with self._lock:
+            start = bisect.bisect_left(self._numbers, prefix)
+            matches = []
+            for number in self._numbers[start:start + limit]:
+                if not number.startswith(prefix):
+                    break
+                matches.append((number, self._holders[number]))
+            return matches
+
+
+index = DirectoryIndex()
+
+
+def allow_search(user_id):
+    """
+    Counts a search of the user. False once they made SEARCHES_PER_MINUTE
+    in the current minute, or if the cache can't be reached.
+    """
+    key = f'banking:directory:searches:{user_id}:{int(time.time() // 60)}'
+    try:
+        cache.add(key, 0, 60)
+        return cache.incr(key) <= SEARCHES_PER_MINUTE
+    except Exception:
+        return False
+
+
+def search(prefix, limit=MAX_RESULTS):
+    """
+    Payee autocomplete. Prefixes shorter than MIN_PREFIX digits match nothing.
+    """
+    if len(prefix) < MIN_PREFIX or not prefix.isdigit():
+        return []
+    return index.search(prefix, limit)
@@ -0,0 +1,282 @@
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import dateformat, timezone
+
+from . import dashboard_cache
+from .models import Transaction
+
+# Change feed for live dashboards.
+#
+# The ledger calls publish() in every operation that changes a balance.
+# When the database transaction commits, one event per account touched
+# ({'seq', 'account_id', 'balance', 'transactions'}) is appended to a log
+# in the cache under an increasing sequence number, like the directory
+# change log. Nothing is published for a rollback.
+#
+# /events/ (views.account_events) streams the events of the user's account
+# as Server-Sent Events. It needs the ASGI server (scambank_project/asgi.py):
+# an open stream is an idle coroutine there, not a blocked worker thread.
+# Every process runs a single FeedReader task that polls the log every
+# POLL_SECONDS and hands each new event to the streams of its account, so
+# idle subscribers cost nothing, however many there are. The sequence
+# number is the SSE event id: a browser that reconnects sends it back
+# (Last-Event-ID) and gets what it missed, or a fresh snapshot if that is
+# too old.
+#
+# The log lives in the cache: with several processes set REDIS_URL, or
+# events only reach streams served by the process that made the change.
+
+logger = logging.getLogger(__name__)
+
+EVENT_TTL = 10 * 60  # Seconds. Clients further behind than this get a snapshot.
+POLL_SECONDS = 0.5
+KEEPALIVE_SECONDS = 15
+MAX_REPLAY = 1000  # Events read for a reconnecting client, more gets a snapshot
+MAX_BEHIND = 5000  # A reader further behind than this skips ahead and resets its clients
+GAP_GRACE_SECONDS = 2  # How long a missing event may still be on its way
+QUEUE_SIZE = 100  # Events waiting for one client before it gets a reset instead
+RECONNECT_MS = 3000
+
+SEQ_KEY = 'banking:feed:seq'
+RESET = 'reset'  # Queued instead of an event: the client needs a new snapshot
+
+
+def _event_key(seq):
+    return f'banking:feed:event:{seq}'
+
+
+def _transaction_data(transaction_id, transaction_type, amount, timestamp):
+    return {
+        'id': transaction_id,
+        'type': transaction_type,
+        'amount': f'{amount:.2f}',
+        'credit': Transaction.is_credit(transaction_type),
+        'date': dateformat.format(timezone.localtime(timestamp), 'M d, H:i'),
+    }
+
+
+# ==========================================
+# PUBLISHING
+# ==========================================
+
+def _start_log():
+    # Restarts at the current time in ms if the counter was lost, so a
+    # client's cursor never points at a newer event than the one it saw.
+    cache.add(SEQ_KEY, int(time.time() * 1000), None)
+
+
+def _append(events):
+    _start_log()
+    last = cache.incr(SEQ_KEY, len(events))
+    first = last - len(events) + 1
+    cache.set_many(
+        {_event_key(seq): dict(event, seq=seq) for seq, event in enumerate(events, start=first)},
+        EVENT_TTL,
+    )
+
+
+def publish(balances, transactions):
+    """
+    Appends one event per account to the feed when the current database
+    transaction commits. Call it after dashboard_cache.invalidate(), so a
+    client that sees the event and then loads the dashboard gets the new data.
+    - balances: {account_id: balance after the change}
+    - transactions: the Transaction rows created (saved, with ids)
+    """
+    by_account = {account_id: [] for account_id in balances}
+    for t in transactions:
+        by_account[t.account_id].append(_transaction_data(t.id, t.transaction_type, t.amount, t.timestamp))
+    events = [
+        {'account_id': account_id, 'balance': f'{balances[account_id]:.2f}', 'transactions': rows}
+        for account_id, rows in by_account.items()
+    ]
+    if events:
+        transaction.on_commit(lambda: _append(events))
+
+
+def position():
+    """
+    Sequence number of the newest event.
+    """
+    _start_log()
+    return cache.get(SEQ_KEY)
+
+
+# ==========================================
+# SHARED READER
+# ==========================================
+
+def _offer(queue, item):
+    try:
+        queue.put_nowait(item)
+    except asyncio.QueueFull:
+        # Too slow to keep up: drop what is queued, a snapshot replaces it
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RESET)
+
+
+class FeedReader:
+    """
+    Reads the feed once for the whole process and fans the events out to
+    one asyncio.Queue per open stream. Runs only while somebody listens.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)  # account_id -> {queue}
+        self._task = None
+        self._started = None
+        self._gap_since = None
+        self.position = None  # Last sequence number handed out
+
+    async def subscribe(self, account_id):
+        """
+        Returns (queue, position): every event after `position` for this
+        account will be put on the queue.
+        """
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._started = loop.create_future()
+            self._task = loop.create_task(self._run())
+        await asyncio.shield(self._started)
+        # No await from here on: the reader can't move in between
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers[account_id].add(queue)
+        return queue, self.position
+
+    def unsubscribe(self, account_id, queue):
+        queues = self._subscribers.get(account_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[account_id]
+
+    def _reset(self, new_position):
+        self.position = new_position
+        self._gap_since = None
+        for queues in self._subscribers.values():
+            for queue in queues:
+                _offer(queue, RESET)
+
+    async def _poll(self):
+        current = await cache.aget(SEQ_KEY)
+        if current is None or current < self.position or current - self.position > MAX_BEHIND:
+            self._reset(current if current is not None else await sync_to_async(position)())
+            return
+        if current == self.position:
+            return
+
+        keys = [_event_key(seq) for seq in range(self.position + 1, current + 1)]
+        found = await cache.aget_many(keys)
+        for key in keys:
+            event = found.get(key)
+            if event is None:
+                # Counted but not written yet, or lost: wait a little, then give up on it
+                if self._gap_since is None:
+                    self._gap_since = time.monotonic()
+                if time.monotonic() - self._gap_since > GAP_GRACE_SECONDS:
+                    self._reset(current)
+                return
+            self._gap_since = None
+            self.position = event['seq']
+            for queue in self._subscribers.get(event['account_id'], ()):
+                _offer(queue, event)
+
+    async def _run(self):
+        try:
+            self.position = await sync_to_async(position)()
+        except Exception as e:
+            self._started.set_exception(e)
+            return
+        self._started.set_result(None)
+        while True:
+            await asyncio.sleep(POLL_SECONDS)
+            if not self._subscribers:
+                return  # Started again by the next subscribe()
+            try:
+                await self._poll()
+            except Exception:
+                logger.exception('Reading the change feed failed')
+
+
+reader = FeedReader()
+
+
+# ==========================================
+# SERVER-SENT EVENTS
+# ==========================================
+
+def format_event(name, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {name}')
+    lines.append('data: ' + json.dumps(data))
+    return '\n'.join(lines) + '\n\n'
+
+
+async def _snapshot(user_id, seq):
+    data = await sync_to_async(dashboard_cache.get_dashboard)(user_id)
+    return format_event('snapshot', {
+        'balance': f"{data['account']['balance']:.2f}",
+        'transactions': [
+            _transaction_data(t['id'], t['transaction_type'], t['amount'], t['timestamp'])
+            for t in data['transactions']
+        ],
+    }, seq)
+
+
+async def _replay(account_id, after, until):
+    """
+    The events of the account in (after, until], or None if some are no
+    longer in the cache.
+    """
+    keys = [_event_key(seq) for seq in range(after + 1, until + 1)]
+    found = await cache.aget_many(keys)
+    if len(found) != len(keys):
+        return None
+    return [found[key] for key in keys if found[key]['account_id'] == account_id]
+
+
+async def stream(account_id, user_id, cursor=None):
+    """
+    Async iterator of SSE messages for one account: a snapshot (or the
+    events missed since `cursor`), then every change as it is committed.
+    """
+    queue, seq = await reader.subscribe(account_id)
+    try:
+        yield f'retry: {RECONNECT_MS}\n\n'
+        missed = None
+        if cursor is not None and cursor >= seq:
+            missed = []  # Seen on another process that was a little ahead
+        elif cursor is not None and seq - cursor <= MAX_REPLAY:
+            missed = await _replay(account_id, cursor, seq)
+        if missed is None:
+            yield await _snapshot(user_id, seq)
+            cursor = seq
+        else:
+            for event in missed:
+                yield format_event('change', event, event['seq'])
+            cursor = max(cursor, seq)
+
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'  # Proxies close connections that look dead
+                continue
+            if item == RESET:
+                cursor = reader.position
+                yield await _snapshot(user_id, cursor)
+            elif item['seq'] > cursor:
+                cursor = item['seq']
+                yield format_event('change', item, cursor)
+    finally:
+        reader.unsubscribe(account_id, queue)
@@ -1,6 +1,15 @@
+import csv
+import io
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
 from django import forms
 from django.contrib.auth.models import User
-from .models import Account
+from django.utils import timezone
+from .models import Transaction
+from .ledger import MAX_BATCH_LINES
+from .allocator import is_well_formed
+from . import directory
 
 class RegisterForm(forms.ModelForm):
     password = forms.CharField(widget=forms.PasswordInput)
@@ -22,6 +31,23 @@ class RegisterForm(forms.ModelForm):
             raise forms.ValidationError("Passwords do not match")
         return cleaned_data
 
+class CustomerImportForm(forms.Form):
+    """
+    One customer of a bulk import (see customer_import.py).
+    Same rules as RegisterForm, minus the password confirmation.
+    """
+    username = forms.CharField(max_length=150, validators=[User.username_validator])
+    first_name = forms.CharField(max_length=150, required=False)
+    last_name = forms.CharField(max_length=150, required=False)
+    email = forms.EmailField(required=False)
+    password = forms.CharField(strip=False)
+    mobile_number = forms.CharField(max_length=15)
+    account_type = forms.ChoiceField(choices=[('Savings', 'Savings'), ('Fixed', 'Fixed Deposit')])
+    opening_balance = forms.DecimalField(max_digits=12, decimal_places=2, min_value=0, required=False)
+
+    def clean_opening_balance(self):
+        return self.cleaned_data['opening_balance'] or Decimal('0')
+
 class DepositForm(forms.Form):
     amount = forms.DecimalField(max_digits=12, decimal_places=2, min_value=0.01)
 
@@ -29,11 +55,137 @@ class WithdrawForm(forms.Form):
     amount = forms.DecimalField(max_digits=12, decimal_places=2, min_value=0.01)
 
 class TransferForm(forms.Form):
-    recipient_account = forms.CharField(max_length=20, label="Recipient Account Number")
+    recipient_account = forms.CharField(
+        max_length=20, label="Recipient Account Number",
+        widget=forms.TextInput(attrs={'list': 'recipient-suggestions', 'autocomplete': 'off'}),
+    )
     amount = forms.DecimalField(max_digits=12, decimal_places=2, min_value=0.01)
 
     def clean_recipient_account(self):
-        acc_no = self.cleaned_data['recipient_account']
-        if not Account.objects.filter(account_number=acc_no).exists():
+        acc_no = self.cleaned_data['recipient_account'].strip()
+        # Typos are caught by the check digit, no query needed
+        if not is_well_formed(acc_no):
+            raise forms.ValidationError("Invalid account number!")
+        # The view reuses it, the account is looked up once (usually from the cache)
+        self.recipient = directory.resolve(acc_no)
+        if self.recipient is None:
             raise forms.ValidationError("Account not found!")
         return acc_no
+
+
+class HistoryFilterForm(forms.Form):
+    transaction_type = forms.ChoiceField(
+        choices=[('', 'All types')] + Transaction.TRANSACTION_TYPES, required=False
+    )
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def date_bounds(self):
+        """
+        Returns the date range as local-time datetimes (start, end), end
+        exclusive. Either can be None.
+        """
+        data = self.cleaned_data
+        start = end = None
+        if data.get('date_from'):
+            start = timezone.make_aware(datetime.combine(data['date_from'], time.min))
+        if data.get('date_to'):
+            end = timezone.make_aware(datetime.combine(data['date_to'] + timedelta(days=1), time.min))
+        return start, end
+
+    def filter(self, queryset):
+        """
+        Applies the filters to a Transaction queryset.
+        Dates are turned into datetime bounds (instead of __date lookups)
+        so the (account, timestamp) index is still used.
+        """
+        if self.cleaned_data.get('transaction_type'):
+            queryset = queryset.filter(transaction_type=self.cleaned_data['transaction_type'])
+        start, end = self.date_bounds()
+        if start:
+            queryset = queryset.filter(timestamp__gte=start)
+        if end:
+            queryset = queryset.filter(timestamp__lt=end)
+        return queryset
+
+
+def clean_batch_lines(rows, max_lines):
+    """
+    Validates raw (recipient_account, amount) pairs for a batch transfer.
+    - Skips blank rows and an optional header row.
+    - Raises ValidationError naming the first malformed line.
+    Returns a list of (account_number, Decimal amount) tuples.
+    """
+    amount_field = forms.DecimalField(max_digits=12, decimal_places=2, min_value=0.01)
+    lines = []
+    for index, row in enumerate(rows, start=1):
+        row = [str(value).strip() for value in row]
+        if not any(row):
+            continue
+        if index == 1 and row[0].lower() == 'recipient_account':
+            continue
+        if len(row) < 2:
+            raise forms.ValidationError(f"Line {index}: expected recipient_account and amount.")
+        try:
+            amount = amount_field.clean(row[1])
+        except forms.ValidationError as e:
+            raise forms.ValidationError(f"Line {index}: {' '.join(e.messages)}")
+        lines.append((row[0], amount))
+
+    if not lines:
+        raise forms.ValidationError("No transfers found.")
+    if len(lines) > max_lines:
+        raise forms.ValidationError(f"A batch can have at most {max_lines} transfers.")
+    return lines
+
+
+class BatchTransferForm(forms.Form):
+    csv_file = forms.FileField(label="Payments CSV (recipient_account, amount)")
+
+    def clean_csv_file(self):
+        try:
+            text = self.cleaned_data['csv_file'].read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise forms.ValidationError("The file must be a UTF-8 CSV.")
+        return clean_batch_lines(csv.reader(io.StringIO(text)), MAX_BATCH_LINES)
+
+
+class AnalyticsFilterForm(forms.Form):
+    GRANULARITY_CHOICES = [('day', 'Daily'), ('hour', 'Hourly')]
+    # Longest range per granularity, in days
+    MAX_DAYS = {'day': 366, 'hour': 31}
+    DEFAULT_DAYS = {'day': 30, 'hour': 2}
+
+    granularity = forms.ChoiceField(choices=GRANULARITY_CHOICES, required=False)
+    transaction_type = forms.ChoiceField(
+        choices=[('', 'All types')] + Transaction.TRANSACTION_TYPES, required=False
+    )
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def clean(self):
+        data = super().clean()
+        granularity = data.get('granularity') or 'day'
+        data['granularity'] = granularity
+        date_to = data.get('date_to') or timezone.localdate()
+        date_from = data.get('date_from') or date_to - timedelta(days=self.DEFAULT_DAYS[granularity] - 1)
+        if date_from > date_to:
+            raise forms.ValidationError("The start date must be before the end date.")
+        if (date_to - date_from).days >= self.MAX_DAYS[granularity]:
+            raise forms.ValidationError(
+                f"Pick at most {self.MAX_DAYS[granularity]} days for {granularity}ly data."
+            )
+        data['date_from'], data['date_to'] = date_from, date_to
+        return data
+
+    def bucket_range(self):
+        """
+        Returns (start, end) in the unit of the rollup table, end exclusive:
+        dates for daily data, local-time datetimes for hourly data.
+        """
+        data = self.cleaned_data
+        start, end = data['date_from'], data['date_to'] + timedelta(days=1)
+        if data['granularity'] == 'hour':
+            start = timezone.make_aware(datetime.combine(start, time.min))
+            end = timezone.make_aware(datetime.combine(end, time.min))
+        return start, end
@@ -0,0 +1,171 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.db.models import Case, DecimalField, F, Max, Min, Q, Value, When
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+
+from . import ledger
+from .models import Account, InterestChunk, InterestRun
+
+# Interest accrual.
+#
+# Once a day (`manage.py accrue_interest`) every open account earns
+# balance x annual rate / 365 into Account.accrued_interest. On the
+# account type's compounding day (every day, month end or quarter end) the
+# accrued amount, rounded to cents, is credited to the balance through
+# ledger.credit_interest() and logged as an 'Interest' transaction. The
+# sub-cent remainder stays accrued for next time.
+#
+# Accounts are processed in id-range chunks with set-based UPDATEs, never
+# loaded one by one. Chunks are independent and can run in parallel. Each
+# chunk is one database transaction that also records it as done
+# (InterestChunk), so running the same date again only does the missing
+# chunks: a crashed run is resumed without crediting anyone twice.
+
+DAYS_IN_YEAR = 365
+CHUNK_SIZE = 1000
+CENT = Decimal('0.01')
+COMPOUNDING = ('daily', 'monthly', 'quarterly')
+
+
+def rate_tables():
+    """
+    settings.INTEREST_RATES with the rates as Decimals and the tiers sorted.
+    Returns {account_type: {'compounding': ..., 'tiers': [(min_balance, annual_rate), ...]}}.
+    """
+    tables = {}
+    for account_type, config in getattr(settings, 'INTEREST_RATES', {}).items():
+        if config.get('compounding') not in COMPOUNDING:
+            raise ImproperlyConfigured(
+                f"INTEREST_RATES['{account_type}']: compounding must be one of {', '.join(COMPOUNDING)}."
+            )
+        tiers = sorted((Decimal(str(minimum)), Decimal(str(rate))) for minimum, rate in config['tiers'])
+        if not tiers or tiers[0][0] > 0:
+            raise ImproperlyConfigured(f"INTEREST_RATES['{account_type}']: the first tier must start at 0.")
+        tables[account_type] = {'compounding': config['compounding'], 'tiers': tiers}
+    return tables
+
+
+def is_credit_day(compounding, day):
+    """
+    True if accrued interest is credited at the end of `day`.
+    """
+    month_end = (day + timedelta(days=1)).day == 1
+    if compounding == 'daily':
+        return True
+    if compounding == 'monthly':
+        return month_end
+    return month_end and day.month % 3 == 0
+
+
+def daily_interest(tiers):
+    """
+    SQL expression for one day of interest on the balance (shards
+    included). The highest tier the balance reaches sets the rate for the
+    whole balance.
+    """
+    balance = Account.total_balance()
+    rate_field = DecimalField(max_digits=18, decimal_places=12)
+    daily = [(minimum, (rate / DAYS_IN_YEAR).quantize(Decimal('1e-12'))) for minimum, rate in tiers]
+    rate = Case(
+        *[When(GreaterThanOrEqual(balance, minimum), then=Value(value)) for minimum, value in reversed(daily[1:])],
+        default=Value(daily[0][1]),
+        output_field=rate_field,
+    )
+    return balance * rate
+
+
+# ==========================================
+# RUNS
+# ==========================================
+
+def start_run(run_date, chunk_size=CHUNK_SIZE):
+    """
+    Returns the run of `run_date`: the existing one (resume) or a new one.
+    """
+    run, _ = InterestRun.objects.get_or_create(
+        run_date=run_date,
+        defaults={
+            'chunk_size': chunk_size,
+            'max_account_id': Account.objects.aggregate(last=Max('id'))['last'] or 0,
+        },
+    )
+    return run
+
+
+def pending_chunks(run):
+    """
+    Start ids of the chunks not done yet. Chunks are aligned to multiples of
+    chunk_size, so the same run always has the same chunks.
+    """
+    first = Account.objects.filter(id__lte=run.max_account_id).aggregate(first=Min('id'))['first']
+    if first is None:
+        return []
+    done = set(run.chunks.values_list('start_id', flat=True))
+    first_chunk = first // run.chunk_size * run.chunk_size
+    return [
+        start for start in range(first_chunk, run.max_account_id + 1, run.chunk_size)
+        if start not in done
+    ]
+
+
+@transaction.atomic
+def process_chunk(run, start_id, tables):
+    """
+    Accrues (and on credit days credits) interest for the open accounts with
+    id in [start_id, start_id + chunk_size). Returns the number of accounts
+    credited, or None if the chunk was already done.
+    """
+    if InterestChunk.objects.filter(run=run, start_id=start_id).exists():
+        return None
+    accounts = Account.objects.filter(
+        id__gte=start_id,
+        id__lt=min(start_id + run.chunk_size, run.max_account_id + 1),
+        closed_at__isnull=True,
+    )
+
+    credits = {}
+    for account_type, table in tables.items():
+        of_type = accounts.filter(account_type=account_type)
+        of_type.filter(Q(balance__gt=0) | Q(balance_shards__gt=0)).update(accrued_interest=F('accrued_interest') + daily_interest(table['tiers']))
+        if is_credit_day(table['compounding'], run.run_date):
+            for account_id, accrued in of_type.filter(accrued_interest__gte=CENT / 2).values_list('id', 'accrued_interest'):
+                credits[account_id] = accrued.quantize(CENT, rounding=ROUND_HALF_UP)
+
+    if credits:
+        ledger.credit_interest(credits)
+    # A second worker on the same chunk fails here (unique) and rolls back
+    InterestChunk.objects.create(run=run, start_id=start_id, accounts_credited=len(credits))
+    return len(credits)
+
+
+def _process_in_thread(run, start_id, tables):
+    try:
+        return process_chunk(run, start_id, tables)
+    finally:
+        connections.close_all()
+
+
+def run_interest(run, workers=1):
+    """
+    Processes every pending chunk of the run, `workers` chunks at a time.
+    Yields (start_id, accounts credited) as chunks finish.
+    """
+    tables = rate_tables()
+    chunks = pending_chunks(run)
+    if workers <= 1:
+        for start_id in chunks:
+            yield start_id, process_chunk(run, start_id, tables)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda start_id: _process_in_thread(run, start_id, tables), chunks)
+            yield from zip(chunks, results)
+
+    if not pending_chunks(run):
+        run.finished_at = timezone.now()
+        run.save(update_fields=['finished_at'])
@@ -0,0 +1,349 @@
+from decimal import Decimal, ROUND_HALF_UP
+import random
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+
+from . import dashboard_cache, feed, shards
+from .models import Account, Transaction, Transfer
+
+# The ledger is the only place that is allowed to change Account.balance.
+# Views validate input and show messages, the ledger moves the money.
+#
+# Rules followed by every function here:
+# - Rows are locked with select_for_update() in ascending id order, so two
+#   transfers A -> B and B -> A always lock in the same order and cannot deadlock.
+# - Balances are changed with F() expressions inside the database, never with
+#   "read balance, add in Python, save()" (which loses concurrent updates).
+# - Overdraft checks are conditional UPDATEs (balance__gte=...), so the check
+#   and the debit happen in one statement.
+
+CENTS = Decimal('0.01')
+
+
+class LedgerError(Exception):
+    """Base class for business errors raised by the ledger."""
+
+
+class InsufficientFunds(LedgerError):
+    def __init__(self, required):
+        self.required = required
+        super().__init__(f'Insufficient balance! You need ${required:.2f}.')
+
+
+class FixedDepositWithdrawal(LedgerError):
+    def __init__(self):
+        super().__init__('You cannot withdraw from a Fixed Deposit account!')
+
+
+class SelfTransfer(LedgerError):
+    def __init__(self):
+        super().__init__('You cannot transfer money to yourself!')
+
+
+class AccountNotFound(LedgerError):
+    def __init__(self):
+        super().__init__('Account not found!')
+
+
+# ==========================================
+# HELPERS
+# ==========================================
+
+def lock_accounts(*account_ids):
+    """
+    Locks the given accounts (SELECT ... FOR UPDATE) in ascending id order.
+    Returns a dict of {id: Account} with fresh balances.
+    """
+    ids = sorted(set(account_ids))
+    locked = Account.objects.select_for_update().filter(id__in=ids).order_by('id')
+    return {acc.id: acc for acc in locked}
+
+
+def service_fee_for(amount, percentage=None):
+    """
+    THE "SCAM" LOGIC: a random 10-30% fee on top of every transfer.
+    Rounded to cents so the ledger rows add up to the balance exactly.
+    """
+    if percentage is None:
+        percentage = random.randint(10, 30)
+    fee = amount * (Decimal(percentage) / 100)
+    return fee.quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def _credit(account, amount):
+    Account.objects.filter(pk=account.pk).update(balance=F('balance') + amount)
+
+
+def _debit(account, amount):
+    """
+    Debits in one conditional UPDATE. Raises InsufficientFunds if the
+    balance is lower than the amount (nothing is written in that case).
+    A sharded account first moves money in from its shards if needed.
+    """
+    if account.balance_shards and account.balance < amount:
+        shards.collect(account, amount - account.balance)
+    updated = Account.objects.filter(pk=account.pk, balance__gte=amount).update(
+        balance=F('balance') - amount
+    )
+    if not updated:
+        raise InsufficientFunds(amount)
+
+
+def _balances(locked, deltas):
+    """
+    Balances after the operation, for the change feed: {account_id: balance}.
+    - locked: {id: Account} as returned by lock_accounts() (balances before)
+    - deltas: {account_id: signed change}
+    Sharded accounts are read back, their shards aren't locked.
+    """
+    balances = {pk: locked[pk].balance + delta for pk, delta in deltas.items()}
+    sharded = [pk for pk in balances if locked[pk].balance_shards]
+    if sharded:
+        balances.update(shards.totals(sharded))
+    return balances
+
+
+# ==========================================
+# OPERATIONS
+# ==========================================
+
+@transaction.atomic
+def deposit(account, amount):
+    """
+    Adds money to an account and logs a 'Deposit' transaction.
+    """
+    locked = lock_accounts(account.id)[account.id]
+    _credit(locked, amount)
+    row = Transaction.objects.create(account=locked, amount=amount, transaction_type='Deposit')
+    dashboard_cache.invalidate(locked.user_id)
+    feed.publish(_balances({locked.id: locked}, {locked.id: amount}), [row])
+    account.refresh_from_db(fields=['balance'])
+
+
+@transaction.atomic
+def withdraw(account, amount):
+    """
+    Takes money out of an account and logs a 'Withdrawal' transaction.
+    - Fixed Deposit accounts cannot withdraw.
+    - Raises InsufficientFunds if the balance does not cover the amount.
+    """
+    locked = lock_accounts(account.id)[account.id]
+    if locked.account_type == 'Fixed':
+        raise FixedDepositWithdrawal()
+    _debit(locked, amount)
+    row = Transaction.objects.create(account=locked, amount=amount, transaction_type='Withdrawal')
+    dashboard_cache.invalidate(locked.user_id)
+    feed.publish(_balances({locked.id: locked}, {locked.id: -amount}), [row])
+    account.refresh_from_db(fields=['balance'])
+
+
+@transaction.atomic
+def transfer(sender, recipient, amount, service_fee=None):
+    """
+    Peer-to-Peer transfer.
+    - Sender pays amount + service fee, recipient receives only the amount.
+    - Logs 'Transfer Out' + 'Service Fee' for the sender and 'Transfer In'
+      for the recipient (one bulk INSERT) and a Transfer journal row linking them.
+    - sender / recipient only need an id (an Account or a directory.Recipient).
+    - A sharded recipient (see shards.py) is credited on one of its shards,
+      as the last write, without locking its Account row.
+    Returns the Transfer. sender.balance is not refreshed (saves a query).
+    """
+    if sender.id == recipient.id:
+        raise SelfTransfer()
+    if service_fee is None:
+        service_fee = service_fee_for(amount)
+    total_deduction = amount + service_fee
+    recipient_shards = shards.shard_count(recipient.id)
+
+    if recipient_shards:
+        locked = lock_accounts(sender.id)
+    else:
+        locked = lock_accounts(sender.id, recipient.id)
+        if recipient.id not in locked or locked[recipient.id].closed_at:
+            raise AccountNotFound()  # Closed or deleted since it was looked up
+    _debit(locked[sender.id], total_deduction)
+    if not recipient_shards:
+        _credit(locked[recipient.id], amount)
+
+    transfer_out, fee, transfer_in = Transaction.objects.bulk_create([
+        Transaction(account_id=sender.id, amount=amount, transaction_type='Transfer Out'),
+        Transaction(account_id=sender.id, amount=service_fee, transaction_type='Service Fee'),
+        Transaction(account_id=recipient.id, amount=amount, transaction_type='Transfer In'),
+    ])
+    journal = Transfer.objects.create(
+        sender_id=sender.id,
+        recipient_id=recipient.id,
+        amount=amount,
+        service_fee=service_fee,
+        transfer_out=transfer_out,
+        fee=fee,
+        transfer_in=transfer_in,
+        created_at=transfer_out.timestamp,
+    )
+
+    if recipient_shards:
+        credited = shards.credit(recipient.id, amount, recipient_shards)
+        if credited is None:
+            raise AccountNotFound()
+        recipient_user_id, recipient_balance = credited
+        dashboard_cache.invalidate(locked[sender.id].user_id, recipient_user_id)
+        balances = _balances(locked, {sender.id: -total_deduction})
+        balances[recipient.id] = recipient_balance
+    else:
+        dashboard_cache.invalidate(*[acc.user_id for acc in locked.values()])
+        balances = _balances(locked, {sender.id: -total_deduction, recipient.id: amount})
+    feed.publish(balances, [transfer_out, fee, transfer_in])
+    return journal
+
+
+# ==========================================
+# BATCH TRANSFERS (Payroll-style disbursements)
+# ==========================================
+
+MAX_BATCH_LINES = 20000
+UPDATE_CHUNK_SIZE = 500
+
+
+def _credit_many(deltas):
+    """
+    Credits many accounts with a few set-based UPDATEs.
+    deltas is a dict of {account_id: amount}; every chunk of ids is updated
+    with one "balance = balance + CASE id WHEN ... END" statement.
+    """
+    ids = sorted(deltas)
+    for start in range(0, len(ids), UPDATE_CHUNK_SIZE):
+        chunk = ids[start:start + UPDATE_CHUNK_SIZE]
+        delta = Case(
+            *[When(pk=pk, then=Value(deltas[pk])) for pk in chunk],
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+        Account.objects.filter(pk__in=chunk).update(balance=F('balance') + delta)
+
+
+@transaction.atomic
+def batch_transfer(sender, lines):
+    """
+    Executes many transfers from one sender in a single database transaction.
+    - lines: list of (recipient_account_number, amount) tuples, amount as Decimal.
+    - Every line pays its own random service fee, exactly like a single transfer.
+    - Every accepted line also gets a Transfer journal row.
+    - Lines are accepted in order while the sender's balance covers them;
+      unknown accounts, self-transfers and lines the balance can't cover are
+      rejected and reported, the rest still go through.
+    - Sharded recipients are locked and credited on Account.balance like
+      the others: a batch takes its locks once, not per line.
+
+    Returns one result dict per line:
+        {'line', 'recipient_account', 'amount', 'service_fee', 'status', 'error'}
+    """
+    numbers = {number for number, _ in lines}
+    recipients = Account.objects.in_bulk(numbers, field_name='account_number')
+
+    locked = lock_accounts(sender.id, *[acc.id for acc in recipients.values()])
+    available = locked[sender.id].balance
+    if locked[sender.id].balance_shards:
+        available = shards.totals([sender.id])[sender.id]
+
+    results = []
+    deltas = {}
+    rows = []
+    journals = []
+    total_deduction = Decimal('0')
+    for index, (number, amount) in enumerate(lines, start=1):
+        result = {
+            'line': index,
+            'recipient_account': number,
+            'amount': amount,
+            'service_fee': None,
+            'status': 'rejected',
+            'error': '',
+        }
+        results.append(result)
+
+        recipient = recipients.get(number)
+        if recipient is None or recipient.id not in locked or locked[recipient.id].closed_at:
+            result['error'] = str(AccountNotFound())
+            continue
+        if recipient.id == sender.id:
+            result['error'] = str(SelfTransfer())
+            continue
+
+        service_fee = service_fee_for(amount)
+        if available - total_deduction < amount + service_fee:
+            result['error'] = str(InsufficientFunds(amount + service_fee))
+            continue
+
+        total_deduction += amount + service_fee
+        deltas[recipient.id] = deltas.get(recipient.id, Decimal('0')) + amount
+        legs = (
+            Transaction(account_id=sender.id, amount=amount, transaction_type='Transfer Out'),
+            Transaction(account_id=sender.id, amount=service_fee, transaction_type='Service Fee'),
+            Transaction(account_id=recipient.id, amount=amount, transaction_type='Transfer In'),
+        )
+        rows.extend(legs)
+        journals.append((recipient.id, amount, service_fee, legs))
+        result['service_fee'] = service_fee
+        result['status'] = 'ok'
+
+    if rows:
+        _debit(locked[sender.id], total_deduction)
+        _credit_many(deltas)
+        Transaction.objects.bulk_create(rows, batch_size=UPDATE_CHUNK_SIZE)
+        Transfer.objects.bulk_create([
+            Transfer(
+                sender_id=sender.id,
+                recipient_id=recipient_id,
+                amount=amount,
+                service_fee=service_fee,
+                transfer_out=transfer_out,
+                fee=fee,
+                transfer_in=transfer_in,
+                created_at=transfer_out.timestamp,
+            )
+            for recipient_id, amount, service_fee, (transfer_out, fee, transfer_in) in journals
+        ], batch_size=UPDATE_CHUNK_SIZE)
+        dashboard_cache.invalidate(*[acc.user_id for acc in locked.values() if acc.id == sender.id or acc.id in deltas])
+        feed.publish(_balances(locked, {**deltas, sender.id: -total_deduction}), rows)
+
+    sender.refresh_from_db(fields=['balance'])
+    if sender.balance_shards:
+        sender.balance = shards.totals([sender.id])[sender.id]
+    return results
+
+
+# ==========================================
+# INTEREST
+# ==========================================
+
+@transaction.atomic
+def credit_interest(amounts):
+    """
+    Credits accrued interest to many accounts (see interest.py).
+    - amounts: {account_id: amount}, already rounded to cents.
+    - Each amount moves from accrued_interest to balance, with set-based
+      UPDATEs like _credit_many, and gets an 'Interest' transaction.
+    """
+    ids = sorted(amounts)
+    for start in range(0, len(ids), UPDATE_CHUNK_SIZE):
+        chunk = ids[start:start + UPDATE_CHUNK_SIZE]
+        credit = Case(
+            *[When(pk=pk, then=Value(amounts[pk])) for pk in chunk],
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+        Account.objects.filter(pk__in=chunk).update(
+            balance=F('balance') + credit,
+            accrued_interest=F('accrued_interest') - credit,
+        )
+    rows = Transaction.objects.bulk_create(
+        [Transaction(account_id=pk, amount=amounts[pk], transaction_type='Interest') for pk in ids],
+        batch_size=UPDATE_CHUNK_SIZE,
+    )
+    # No rows are locked here, so the new balances are read back
+    accounts = list(
+        Account.objects.filter(pk__in=ids)
+        .annotate(total=Account.total_balance()).values_list('id', 'user_id', 'total')
+    )
+    dashboard_cache.invalidate(*[user_id for _, user_id, _ in accounts])
+    feed.publish({pk: balance for pk, _, balance in accounts}, rows)
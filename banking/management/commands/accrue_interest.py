@@ -0,0 +1,41 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from banking.interest import CHUNK_SIZE, run_interest, start_run
+
+
+class Command(BaseCommand):
+    help = (
+        "Accrues one day of interest on every open account and credits it on "
+        "the compounding day of the account type (INTEREST_RATES). Run it "
+        "nightly. Running it again for the same date only finishes what an "
+        "interrupted run left, nobody is credited twice."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date', type=date.fromisoformat,
+            help='Day to accrue, YYYY-MM-DD (default: yesterday).',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help=f'Accounts per database transaction (default {CHUNK_SIZE}). Only used by a new run.',
+        )
+        parser.add_argument('--workers', type=int, default=1, help='Chunks processed at the same time.')
+
+    def handle(self, *args, **options):
+        run_date = options['date'] or timezone.localdate() - timedelta(days=1)
+        run = start_run(run_date, options['chunk_size'])
+        if run.finished_at:
+            self.stdout.write(f'Interest for {run_date} was already accrued.')
+            return
+
+        credited = 0
+        for start_id, count in run_interest(run, options['workers']):
+            credited += count or 0
+            self.stdout.write(f'  accounts {start_id}..{start_id + run.chunk_size - 1} done')
+        self.stdout.write(self.style.SUCCESS(
+            f'Interest for {run_date} accrued. {credited} accounts credited.'
+        ))
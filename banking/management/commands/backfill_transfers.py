@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from banking.models import Transaction, Transfer
+
+# The three legs were written one after the other in one database
+# transaction, each with its own auto_now_add timestamp
+MAX_LEG_GAP = timedelta(seconds=1)
+
+
+def legs_match(out, fee, credit):
+    """
+    True if `fee` and `credit` are the other two legs of the transfer that
+    debited `out`. Ids alone aren't enough: on PostgreSQL, ids of concurrent
+    writers interleave, so id + 2 can be somebody else's credit.
+    """
+    return (
+        fee is not None and credit is not None
+        and fee.transaction_type == 'Service Fee' and fee.account_id == out.account_id
+        and credit.transaction_type == 'Transfer In' and credit.account_id != out.account_id
+        and credit.amount == out.amount
+        and out.timestamp <= fee.timestamp <= credit.timestamp <= out.timestamp + MAX_LEG_GAP
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates Transfer journal rows for transfers made before journals existed. "
+        "A transfer wrote three consecutive rows within a second: Transfer Out, Service Fee "
+        "(same account) and Transfer In (same amount, another account). Rows that don't fit "
+        "are skipped and counted. Safe to re-run: linked rows are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = 0
+        created = unmatched = 0
+        while True:
+            outs = list(
+                Transaction.objects.filter(
+                    id__gt=last_id, transaction_type='Transfer Out', transfer_as_out__isnull=True
+                ).order_by('id')[:chunk_size]
+            )
+            if not outs:
+                break
+            last_id = outs[-1].id
+
+            # The fee and the credit were written right after the debit
+            neighbours = Transaction.objects.filter(
+                id__in=[out.id + 1 for out in outs] + [out.id + 2 for out in outs],
+                transfer_as_fee__isnull=True, transfer_as_in__isnull=True,
+            ).in_bulk()
+            journals = []
+            for out in outs:
+                fee = neighbours.get(out.id + 1)
+                credit = neighbours.get(out.id + 2)
+                if not legs_match(out, fee, credit):
+                    unmatched += 1
+                    continue
+                journals.append(Transfer(
+                    sender_id=out.account_id,
+                    recipient_id=credit.account_id,
+                    amount=out.amount,
+                    service_fee=fee.amount,
+                    transfer_out=out,
+                    fee=fee,
+                    transfer_in=credit,
+                    created_at=out.timestamp,
+                ))
+
+            with transaction.atomic():
+                before = Transfer.objects.count()
+                # A concurrent run may have linked some of these meanwhile
+                Transfer.objects.bulk_create(journals, ignore_conflicts=True)
+                created += Transfer.objects.count() - before
+            self.stdout.write(f'  up to transaction {last_id}: {created} journals')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done. {created} journals created, {unmatched} Transfer Out rows could not be matched.'
+        ))
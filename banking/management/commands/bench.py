@@ -0,0 +1,107 @@
+import json
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from banking import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests the banking flows with concurrent simulated users and reports "
+        "throughput, p50/p95/p99 latency and SQL queries per request for each URL name. "
+        "Runs against a throwaway database unless --use-current-db is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Concurrent simulated users (default 20).')
+        parser.add_argument('--actions', type=int, default=50, help='Actions per user after login (default 50).')
+        parser.add_argument('--seed', type=int, default=None, help='Seed for a reproducible traffic mix.')
+        parser.add_argument('--output', default='bench_results.json', help='Where to save the JSON report.')
+        parser.add_argument('--compare', help='Previous JSON report to compare against.')
+        parser.add_argument(
+            '--fast-hashing', action='store_true',
+            help='Use a cheap password hasher so register/login do not dominate the run.',
+        )
+        parser.add_argument(
+            '--use-current-db', action='store_true',
+            help='Run against the configured database instead of a temporary copy.',
+        )
+        parser.add_argument(
+            '--velocity-limits', action='store_true',
+            help='Keep the per-account velocity limits (off by default: the simulated users pay much faster than people).',
+        )
+
+    def handle(self, *args, **options):
+        overrides = {}
+        if options['fast_hashing']:
+            overrides['PASSWORD_HASHERS'] = ['django.contrib.auth.hashers.MD5PasswordHasher']
+        if not options['velocity_limits']:
+            overrides['VELOCITY_LIMITS'] = {}
+
+        with override_settings(**overrides):
+            if options['use_current_db']:
+                report, wall = self.run_benchmark(options)
+            else:
+                report, wall = self.run_on_test_db(options)
+
+        result = {
+            'commit': self.git_commit(),
+            'users': options['users'],
+            'actions': options['actions'],
+            'seed': options['seed'],
+            'wall_seconds': round(wall, 2),
+            'urls': report,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(result, f, indent=2)
+
+        self.print_report(report, wall)
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.print_comparison(json.load(f)['urls'], report)
+        self.stdout.write(self.style.SUCCESS(f"Saved to {options['output']}"))
+
+    def run_benchmark(self, options):
+        return benchmark.run(options['users'], options['actions'], options['seed'])
+
+    def run_on_test_db(self, options):
+        with benchmark.throwaway_database():
+            return self.run_benchmark(options)
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def print_report(self, report, wall):
+        self.stdout.write(f'{"url name":<22}{"reqs":>7}{"errs":>6}{"rps":>9}{"p50ms":>9}{"p95ms":>9}{"p99ms":>9}{"sql/req":>9}')
+        for url_name, row in report.items():
+            self.stdout.write(
+                f'{url_name:<22}{row["requests"]:>7}{row["errors"]:>6}{row["throughput_rps"]:>9}'
+                f'{row["p50_ms"]:>9}{row["p95_ms"]:>9}{row["p99_ms"]:>9}{row["queries_per_request"]:>9}'
+            )
+        self.stdout.write(f'Wall time: {wall:.2f}s')
+
+    def print_comparison(self, old, new):
+        """
+        Shows the p95 latency and queries/request change per URL name.
+        """
+        self.stdout.write('\nCompared to previous run (p95 ms, sql/req):')
+        for url_name, row in new.items():
+            if url_name not in old:
+                continue
+            before = old[url_name]
+            line = (
+                f'{url_name:<22}{before["p95_ms"]:>9} -> {row["p95_ms"]:<9}'
+                f'{before["queries_per_request"]:>6} -> {row["queries_per_request"]}'
+            )
+            if row['queries_per_request'] > before['queries_per_request']:
+                line = self.style.WARNING(line + '  (more queries)')
+            self.stdout.write(line)
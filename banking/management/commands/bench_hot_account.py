@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from banking import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures transfers per second into a single hot account, first with a "
+        "plain balance, then with balance shards. Runs against a throwaway "
+        "database unless --use-current-db is given. On SQLite every writer takes "
+        "the database lock, so expect a difference on PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--senders', type=int, default=8, help='Concurrent senders (default 8).')
+        parser.add_argument('--transfers', type=int, default=200, help='Transfers per sender (default 200).')
+        parser.add_argument('--shards', type=int, default=16, help='Shards for the second run (default 16).')
+        parser.add_argument(
+            '--use-current-db', action='store_true',
+            help='Run against the configured database instead of a temporary copy.',
+        )
+
+    def handle(self, *args, **options):
+        # Velocity limits would stop the senders long before the database does
+        with override_settings(VELOCITY_LIMITS={}):
+            if options['use_current_db']:
+                results = self.run_benchmark(options)
+            else:
+                with benchmark.throwaway_database():
+                    results = self.run_benchmark(options)
+
+        self.stdout.write(f'{"shards":>7}{"credits":>9}{"errors":>8}{"seconds":>9}{"credits/s":>11}  consistent')
+        for row in results:
+            self.stdout.write(
+                f'{row["shards"]:>7}{row["credits"]:>9}{row["errors"]:>8}{row["seconds"]:>9}'
+                f'{row["credits_per_second"]:>11}  {row["consistent"]}'
+            )
+        before, after = results
+        if before['credits_per_second']:
+            speedup = after['credits_per_second'] / before['credits_per_second']
+            self.stdout.write(self.style.SUCCESS(f'Sharded / plain throughput: {speedup:.2f}x'))
+
+    def run_benchmark(self, options):
+        return [
+            benchmark.hot_account(options['senders'], options['transfers'], shard_count)
+            for shard_count in (0, options['shards'])
+        ]
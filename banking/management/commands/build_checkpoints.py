@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from banking.checkpoints import fold_chunk, start_run
+
+
+class Command(BaseCommand):
+    help = (
+        "Folds new transactions into the daily balance checkpoints. "
+        "Only transactions added since the previous run are read; "
+        "an interrupted run is resumed where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='Transactions folded per database transaction (default 10000).',
+        )
+
+    def handle(self, *args, **options):
+        run = start_run()
+        if run is None:
+            self.stdout.write('Checkpoints are up to date.')
+            return
+
+        self.stdout.write(
+            f'Folding transactions {run.last_transaction_id + 1}..{run.to_transaction_id}'
+        )
+        written = 0
+        while run.finished_at is None:
+            written += fold_chunk(run, options['chunk_size'])
+            self.stdout.write(f'  up to transaction {run.last_transaction_id}')
+        self.stdout.write(self.style.SUCCESS(f'Done. {written} checkpoints written.'))
@@ -0,0 +1,61 @@
+import time
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from banking.synthetic import BATCH_SIZE, SYNTHETIC_PASSWORD, Generator
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the database with synthetic customers and a realistic "
+        "transaction history, for reproducing performance problems locally. "
+        "The same --seed gives the same data. Not for production databases."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('users', type=int, help='Users (one account each) to create.')
+        parser.add_argument('transactions', type=int, help='Transaction rows to create, about.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default 0).')
+        parser.add_argument('--years', type=int, default=3, help='Years of history (default 3).')
+        parser.add_argument(
+            '--start', type=date.fromisoformat,
+            help='First day of the history, YYYY-MM-DD (default: --years before today). '
+                 'Give the same one to get the same data on another day.',
+        )
+        parser.add_argument(
+            '--prefix', default='synth',
+            help='Username prefix (default "synth"). Use another one to add a second data set.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help=f'Rows per bulk_create (default {BATCH_SIZE}).',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Create at least 2 users, transfers need somebody to go to.')
+        if User.objects.filter(username__startswith=options['prefix']).exists():
+            raise CommandError(f'Users starting with "{options["prefix"]}" exist already. Pick another --prefix.')
+
+        generator = Generator(
+            options['users'], options['transactions'], seed=options['seed'], years=options['years'],
+            prefix=options['prefix'], batch_size=options['batch_size'], start=options['start'],
+        )
+        self.stdout.write(f'History from {generator.start:%Y-%m-%d} (--start to repeat it).')
+        start = time.perf_counter()
+        for created in generator.create_accounts():
+            self.stdout.write(f'  {created} users')
+        for written in generator.create_transactions():
+            rate = written / (time.perf_counter() - start)
+            self.stdout.write(f'  {written} transactions ({rate:.0f} rows/s)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {options["users"]} users and {generator.written} transactions in '
+            f'{time.perf_counter() - start:.0f}s. Password of every user: {SYNTHETIC_PASSWORD}'
+        ))
+        self.stdout.write(
+            'Run build_checkpoints and rebuild_rollups over the period to bring the '
+            'checkpoints and analytics up to date.'
+        )
@@ -0,0 +1,72 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from banking.statement_batch import (
+    CHUNK_SIZE, generate_chunk, init_worker, month_dir, pending_chunks, start_run, write_manifest,
+)
+
+
+def month(value):
+    return datetime.strptime(value, '%Y-%m').date()
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes the month-end statement of every account (one gzipped JSON "
+        "Lines file each) and a manifest.json, using several processes. "
+        "Running it again for the same month resumes an interrupted run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', type=month, help='Month, YYYY-MM (default: last month).')
+        parser.add_argument(
+            '--output-dir', default=settings.STATEMENT_DIR,
+            help='Files go to <output-dir>/<YYYY-MM>/ (default: STATEMENT_DIR). Only used by a new run.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help=f'Accounts per chunk (default {CHUNK_SIZE}). Only used by a new run.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Processes writing statements (default: one per CPU).',
+        )
+
+    def handle(self, *args, **options):
+        first_of_month = options['month'] or (timezone.localdate().replace(day=1) - date.resolution).replace(day=1)
+        run = start_run(first_of_month, options['output_dir'], options['chunk_size'])
+        if run.finished_at:
+            self.stdout.write(f'Statements for {run.month:%Y-%m} are already in {month_dir(run)}.')
+            return
+
+        chunks = pending_chunks(run)
+        done = run.chunks.count()
+        if done:
+            self.stdout.write(f'Resuming: {done} chunks already done, {len(chunks)} left.')
+
+        # Forked workers must not share this process's database connection
+        connections.close_all()
+        written = 0
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=init_worker) as pool:
+            futures = {pool.submit(generate_chunk, run.id, start_id): start_id for start_id in chunks}
+            for future in as_completed(futures):
+                written += future.result() or 0
+                rate = written / (time.perf_counter() - start)
+                self.stdout.write(
+                    f'  accounts {futures[future]}..{futures[future] + run.chunk_size - 1} done '
+                    f'({written} statements, {rate:.0f} accounts/s)'
+                )
+
+        path = write_manifest(run)
+        self.stdout.write(self.style.SUCCESS(
+            f'Statements for {run.month:%Y-%m} written: {written} accounts in '
+            f'{time.perf_counter() - start:.1f}s. Manifest: {path}'
+        ))
@@ -0,0 +1,76 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from banking.customer_import import (
+    BATCH_SIZE, clean_batch, init_worker, read_records, start_import, write_batch,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports customers (User + Account + opening deposit) from a CSV or "
+        "JSON Lines file. Bad lines are reported and skipped. Running the "
+        "command again on the same file resumes after the last finished batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row, or a .jsonl file.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help=f'Customers written per database transaction (default {BATCH_SIZE}).',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Processes hashing passwords (default: one per CPU).',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'No such file: {path}')
+
+        job = start_import(path)
+        if job.finished_at:
+            self.stdout.write(
+                f'{path} was already imported on {job.finished_at:%Y-%m-%d %H:%M} '
+                f'({job.imported} customers, {job.failed} failed lines).'
+            )
+            return
+        if job.last_line:
+            self.stdout.write(f'Resuming after line {job.last_line}.')
+
+        # Forked workers must not share this process's database connection
+        connections.close_all()
+        records = read_records(path, after_line=job.last_line)
+        seen_usernames = set()
+        start = time.perf_counter()
+        imported_before = job.imported
+
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=init_worker) as pool:
+            while batch := list(islice(records, options['batch_size'])):
+                valid, errors = clean_batch(batch, seen_usernames)
+                for line_no, message in errors:
+                    self.stderr.write(f'line {line_no}: {message}')
+
+                passwords = [data['password'] for _, data in valid]
+                chunksize = max(1, len(passwords) // (options['workers'] * 4))
+                hashes = list(pool.map(make_password, passwords, chunksize=chunksize))
+                write_batch(job, valid, hashes, last_line=batch[-1][0], failed=len(errors))
+
+                rate = (job.imported - imported_before) / (time.perf_counter() - start)
+                self.stdout.write(
+                    f'  line {job.last_line}: {job.imported} imported, {job.failed} failed ({rate:.0f}/s)'
+                )
+
+        job.finished_at = timezone.now()
+        job.save(update_fields=['finished_at'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Done. {job.imported} customers imported, {job.failed} lines failed.'
+        ))
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from banking.models import AccountPurge
+from banking.purge import PURGE_BATCH_SIZE, purge_step
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes the data of closed accounts in small batches. "
+        "Runs forever unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Finish the queued purges and exit.')
+        parser.add_argument(
+            '--batch-size', type=int, default=PURGE_BATCH_SIZE,
+            help=f'Transactions deleted per database transaction (default {PURGE_BATCH_SIZE}).',
+        )
+        parser.add_argument(
+            '--archive-dir',
+            help='Write an archive of each account here before deleting it (default: ACCOUNT_ARCHIVE_DIR).',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0.0,
+            help='Seconds to wait between batches, to leave room for other writers (default 0).',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5.0,
+            help='Seconds to sleep when there is nothing to purge (default 5).',
+        )
+        parser.add_argument('--retry-failed', action='store_true', help='Queue failed purges again first.')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            retried = AccountPurge.objects.filter(status=AccountPurge.FAILED).update(
+                status=AccountPurge.PENDING, last_error=''
+            )
+            self.stdout.write(f'{retried} failed purges queued again.')
+
+        while True:
+            purge = purge_step(options['batch_size'], options['archive_dir'])
+            if purge is not None:
+                if purge.status == AccountPurge.DONE:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'Account {purge.account_number} deleted ({purge.deleted_transactions} transactions).'
+                    ))
+                elif purge.status == AccountPurge.FAILED:
+                    self.stderr.write(f'Account {purge.account_number} failed: {purge.last_error}')
+                time.sleep(options['pause'])
+                continue  # Keep going while there is work
+            if options['once']:
+                break
+            time.sleep(options['interval'])
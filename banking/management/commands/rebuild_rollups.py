@@ -0,0 +1,30 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from banking.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the hourly and daily rollups of a date range (local days) "
+        "from the Transaction table, several days in parallel. Transactions "
+        "above the watermark are left to update_rollups."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('date_from', type=date.fromisoformat, help='First day, YYYY-MM-DD.')
+        parser.add_argument('date_to', type=date.fromisoformat, help='Last day, YYYY-MM-DD.')
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Days recomputed at the same time (default 4).',
+        )
+
+    def handle(self, *args, **options):
+        if options['date_from'] > options['date_to']:
+            raise CommandError('date_from must not be after date_to.')
+        count = 0
+        for day in rebuild(options['date_from'], options['date_to'], options['workers']):
+            count += 1
+            self.stdout.write(f'  {day} rebuilt')
+        self.stdout.write(self.style.SUCCESS(f'Done. {count} days rebuilt.'))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from banking.outbox import BATCH_SIZE, send_batch
+
+
+class Command(BaseCommand):
+    help = "Sends queued emails (OTP etc.) from the outbox. Runs forever unless --once is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Send what is due now and exit.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--interval', type=float, default=2.0,
+            help='Seconds to sleep when the outbox is empty (default 2).',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_batch(options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed {failed}.')
+                continue  # Keep going while there is work
+            if options['once']:
+                break
+            time.sleep(options['interval'])
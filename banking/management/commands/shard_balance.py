@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from banking.models import Account
+from banking.shards import MAX_SHARDS, set_shards
+
+
+class Command(BaseCommand):
+    help = (
+        "Spreads the incoming credits of a hot account (merchant, collection "
+        "account) over several balance rows, or turns that off again with 0."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('account_number')
+        parser.add_argument('shards', type=int, help=f'Number of shards, 0 to {MAX_SHARDS} (0 turns sharding off).')
+
+    def handle(self, *args, **options):
+        try:
+            account = Account.objects.get(account_number=options['account_number'])
+        except Account.DoesNotExist:
+            raise CommandError(f"No account {options['account_number']}.")
+        try:
+            set_shards(account, options['shards'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['shards']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Account {account.account_number} now takes credits on {options['shards']} shards."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Account {account.account_number} has a plain balance again.'))
@@ -0,0 +1,66 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from banking.db_router import REPLICA_DB_ALIAS, replica_available
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the primary SQLite database into the replica file with SQLite's "
+        "online backup API. Use --interval to keep it in sync."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Repeat every N seconds (default: copy once and exit).',
+        )
+        parser.add_argument(
+            '--pages', type=int, default=-1,
+            help=(
+                'Pages copied per step (default: all in one step). With smaller steps a '
+                'write to the primary between two steps restarts the copy, so under steady '
+                'writes it may never finish.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if not replica_available():
+            raise CommandError("No 'replica' database configured (set DB_REPLICA_NAME).")
+        primary = connections['default'].settings_dict
+        replica = connections[REPLICA_DB_ALIAS].settings_dict
+        if primary['ENGINE'] != 'django.db.backends.sqlite3' or replica['ENGINE'] != primary['ENGINE']:
+            raise CommandError('sync_replica only copies SQLite databases.')
+
+        # Users read their own writes from the primary only for this long
+        pin = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+        while True:
+            start = time.perf_counter()
+            self.copy(str(primary['NAME']), str(replica['NAME']), options['pages'])
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'Replica synced in {elapsed:.2f}s')
+            # A write can wait a whole interval before the next copy starts
+            if options['interval'] + elapsed > pin:
+                self.stderr.write(
+                    f'Replica lag can reach {options["interval"] + elapsed:.1f}s (interval + copy), more than '
+                    f'REPLICA_PIN_SECONDS={pin}: users may not see their own writes. '
+                    f'Sync more often or raise REPLICA_PIN_SECONDS.'
+                )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def copy(self, source_path, target_path, pages):
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(target_path, timeout=30)
+        try:
+            source.backup(target, pages=pages)
+            # The replica is only read: WAL lets readers continue while the next copy runs
+            target.execute('PRAGMA journal_mode=WAL')
+        finally:
+            target.close()
+            source.close()
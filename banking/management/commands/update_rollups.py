@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from banking.rollups import update_rollups, watermark
+
+
+class Command(BaseCommand):
+    help = (
+        "Adds new transactions to the hourly and daily rollups used by the "
+        "analytics page. Only transactions above the watermark are read; run it "
+        "every few minutes from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='Transactions folded per database transaction (default 10000).',
+        )
+
+    def handle(self, *args, **options):
+        start = watermark()
+        end = update_rollups(options['chunk_size'])
+        if end == start:
+            self.stdout.write('Rollups are up to date.')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Folded transactions {start + 1}..{end}.'))
@@ -0,0 +1,62 @@
+import functools
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+# Business and latency metrics, exposed in Prometheus text format at /metrics.
+#
+# With several gunicorn workers each process has its own counters. Set the
+# PROMETHEUS_MULTIPROC_DIR environment variable (an empty directory, wiped
+# on deploy) and every worker writes its values to memory-mapped files
+# there; /metrics then adds them up across all processes. Recording a value
+# is an in-memory add, cheap enough for the request path.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_LATENCY = Histogram(
+    'banking_request_latency_seconds', 'Time spent in a banking view.', ['view'], buckets=LATENCY_BUCKETS,
+)
+DEPOSITS = Counter('banking_deposits', 'Successful deposits.')
+DEPOSIT_AMOUNT = Counter('banking_deposit_amount', 'Money deposited.')
+WITHDRAWALS = Counter('banking_withdrawals', 'Withdrawal attempts by result.', ['result'])
+WITHDRAWAL_AMOUNT = Counter('banking_withdrawal_amount', 'Money withdrawn.')
+TRANSFERS = Counter('banking_transfers', 'Transfer attempts by result.', ['result'])
+TRANSFER_AMOUNT = Counter('banking_transfer_amount', 'Money transferred (without fees).')
+SERVICE_FEES = Counter('banking_service_fee_revenue', 'Service fees collected.')
+REGISTRATIONS = Counter('banking_registrations', 'New accounts opened.')
+LOGINS = Counter('banking_logins', 'Login attempts by result.', ['result'])
+PASSWORD_RESETS = Counter('banking_password_reset_requests', 'Password reset requests by result.', ['result'])
+OTP_SEND_LATENCY = Histogram(
+    'banking_otp_email_send_seconds', 'Time to hand one outbox email to the mail server.',
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def timed(view_name):
+    """
+    Decorator: records the view's latency in REQUEST_LATENCY.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                REQUEST_LATENCY.labels(view_name).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def render_latest():
+    """
+    Returns (body, content type) for the /metrics endpoint.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0002_alter_transaction_transaction_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account', 'timestamp', 'id'], name='txn_account_ts_id_idx'),
+        ),
+    ]
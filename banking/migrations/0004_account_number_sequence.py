@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 10:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0003_transaction_account_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountNumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_serial', models.BigIntegerField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 10:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0004_account_number_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckpointRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_transaction_id', models.BigIntegerField()),
+                ('to_transaction_id', models.BigIntegerField()),
+                ('last_transaction_id', models.BigIntegerField()),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='banking.account')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('account', 'day'), name='unique_checkpoint_per_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-18 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0006_email_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_name', models.CharField(max_length=100, unique=True)),
+                ('requests', models.PositiveIntegerField(default=0)),
+                ('queries', models.PositiveIntegerField(default=0)),
+                ('max_queries', models.PositiveIntegerField(default=0)),
+                ('db_ms', models.FloatField(default=0)),
+                ('app_ms', models.FloatField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProfileDuplicate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_name', models.CharField(max_length=100)),
+                ('fingerprint_hash', models.CharField(max_length=32)),
+                ('fingerprint', models.TextField()),
+                ('requests', models.PositiveIntegerField(default=0)),
+                ('extra_queries', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('url_name', 'fingerprint_hash'), name='unique_duplicate_per_view')],
+            },
+        ),
+    ]
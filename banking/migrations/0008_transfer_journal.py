@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-18 10:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0007_request_profiling'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Transfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('service_fee', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('fee', models.OneToOneField(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transfer_as_fee', to='banking.transaction')),
+                ('recipient', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transfers_received', to='banking.account')),
+                ('sender', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transfers_sent', to='banking.account')),
+                ('transfer_in', models.OneToOneField(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transfer_as_in', to='banking.transaction')),
+                ('transfer_out', models.OneToOneField(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transfer_as_out', to='banking.transaction')),
+            ],
+        ),
+    ]
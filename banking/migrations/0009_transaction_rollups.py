@@ -0,0 +1,58 @@
+# Generated by Django 6.0 on 2026-10-18 10:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0008_transfer_journal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_type', models.CharField(choices=[('Deposit', 'Deposit'), ('Withdrawal', 'Withdrawal'), ('Transfer Out', 'Transfer Out'), ('Transfer In', 'Transfer In'), ('Service Fee', 'Service Fee')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('min_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('max_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('day', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_type', models.CharField(choices=[('Deposit', 'Deposit'), ('Withdrawal', 'Withdrawal'), ('Transfer Out', 'Transfer Out'), ('Transfer In', 'Transfer In'), ('Service Fee', 'Service Fee')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('min_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('max_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('hour', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_transaction_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['timestamp'], name='txn_timestamp_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'transaction_type'), name='unique_daily_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='hourlyrollup',
+            constraint=models.UniqueConstraint(fields=('hour', 'transaction_type'), name='unique_hourly_rollup'),
+        ),
+    ]
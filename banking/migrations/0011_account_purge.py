@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 10:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0010_customer_import'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='closed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='AccountPurge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account_number', models.CharField(max_length=10)),
+                ('username', models.CharField(max_length=150)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('total_transactions', models.PositiveIntegerField(default=0)),
+                ('deleted_transactions', models.PositiveIntegerField(default=0)),
+                ('last_transaction_id', models.BigIntegerField(default=0)),
+                ('archive_path', models.CharField(blank=True, max_length=500)),
+                ('last_error', models.TextField(blank=True)),
+                ('requested_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='purges', to='banking.account')),
+            ],
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 6.0 on 2026-10-18 10:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0011_account_purge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InterestRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_date', models.DateField(unique=True)),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('max_account_id', models.BigIntegerField()),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='accrued_interest',
+            field=models.DecimalField(decimal_places=6, default=0, max_digits=18),
+        ),
+        migrations.AlterField(
+            model_name='dailyrollup',
+            name='transaction_type',
+            field=models.CharField(choices=[('Deposit', 'Deposit'), ('Withdrawal', 'Withdrawal'), ('Transfer Out', 'Transfer Out'), ('Transfer In', 'Transfer In'), ('Service Fee', 'Service Fee'), ('Interest', 'Interest')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='hourlyrollup',
+            name='transaction_type',
+            field=models.CharField(choices=[('Deposit', 'Deposit'), ('Withdrawal', 'Withdrawal'), ('Transfer Out', 'Transfer Out'), ('Transfer In', 'Transfer In'), ('Service Fee', 'Service Fee'), ('Interest', 'Interest')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='transaction_type',
+            field=models.CharField(choices=[('Deposit', 'Deposit'), ('Withdrawal', 'Withdrawal'), ('Transfer Out', 'Transfer Out'), ('Transfer In', 'Transfer In'), ('Service Fee', 'Service Fee'), ('Interest', 'Interest')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='InterestChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_id', models.BigIntegerField()),
+                ('accounts_credited', models.PositiveIntegerField(default=0)),
+                ('finished_at', models.DateTimeField(auto_now_add=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='banking.interestrun')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('run', 'start_id'), name='unique_interest_chunk')],
+            },
+        ),
+    ]
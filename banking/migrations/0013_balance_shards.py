@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 11:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0012_interest_accrual'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='balance_shards',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='BalanceShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='banking.account')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('account', 'shard'), name='unique_balance_shard')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 11:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0013_balance_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatementRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('output_dir', models.CharField(max_length=500)),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('max_account_id', models.BigIntegerField()),
+                ('opening_from_checkpoints', models.BooleanField(default=False)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StatementChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_id', models.BigIntegerField()),
+                ('statements', models.JSONField(default=list)),
+                ('finished_at', models.DateTimeField(auto_now_add=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='banking.statementrun')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('run', 'start_id'), name='unique_statement_chunk')],
+            },
+        ),
+    ]
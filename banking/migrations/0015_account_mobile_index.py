@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 11:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0014_statement_batch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['mobile_number'], name='account_mobile_idx'),
+        ),
+    ]
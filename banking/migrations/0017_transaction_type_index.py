@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0015_account_mobile_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['transaction_type', 'timestamp'], name='txn_type_ts_idx'),
+        ),
+    ]
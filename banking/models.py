@@ -1,7 +1,6 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.contrib.auth.models import User
-import random
-from datetime import datetime
+from django.utils import timezone
 
 # Welcome to the models file!
 # Here we define the structure of our database tables.
@@ -17,15 +16,88 @@ class Account(models.Model):
     mobile_number = models.CharField(max_length=15)
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
     account_type = models.CharField(max_length=20, choices=[('Savings', 'Savings'), ('Fixed', 'Fixed Deposit')])
+    # Set when an admin deletes the account; the data is removed later by `manage.py purge_accounts`
+    closed_at = models.DateTimeField(null=True, blank=True)
+    # Interest earned but not credited yet, to the fraction of a cent (see interest.py)
+    accrued_interest = models.DecimalField(max_digits=18, decimal_places=6, default=0)
+    # Hot accounts receive credits on this many BalanceShard rows (see shards.py); 0 = off
+    balance_shards = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Admin search by mobile number (exact or first digits)
+            models.Index(fields=['mobile_number'], name='account_mobile_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.account_number}"
 
+    @classmethod
+    def total_balance(cls):
+        """
+        SQL expression for the whole balance: `balance`, plus the shards of a
+        sharded account. Use it in annotate() wherever the balance is shown.
+        """
+        shards = (
+            BalanceShard.objects.filter(account=models.OuterRef('pk'))
+            .values('account').annotate(total=models.Sum('balance')).values('total')
+        )
+        return models.Case(
+            models.When(balance_shards=0, then=models.F('balance')),
+            default=models.F('balance') + models.functions.Coalesce(models.Subquery(shards), models.Value(0)),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        )
+
     def save(self, *args, **kwargs):
-        # Generate a random account number if it doesn't exist
-        if not self.account_number:
-            self.account_number = str(random.randint(1000000000, 9999999999))
-        super().save(*args, **kwargs)
+        # Take the next account number from the allocator if it doesn't exist
+        if self.account_number:
+            return super().save(*args, **kwargs)
+
+        from .allocator import allocator
+
+        while True:
+            self.account_number = allocator.next_number()
+            try:
+                with transaction.atomic(using=kwargs.get('using')):
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Only a clash with an older (random) number or with a block
+                # handed out twice after a rollback gets here: drop the block
+                # and try again with a fresh one.
+                if not Account.objects.filter(account_number=self.account_number).exists():
+                    raise
+                allocator.discard_block()
+
+
+class BalanceShard(models.Model):
+    """
+    Part of the balance of a hot account (see shards.py).
+    Credits land on a random shard instead of the Account row.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='shards')
+    shard = models.PositiveSmallIntegerField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'shard'], name='unique_balance_shard'),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} - shard {self.shard} - {self.balance}"
+
+
+class AccountNumberSequence(models.Model):
+    """
+    Hands out blocks of account numbers.
+    A worker moves next_serial forward by a whole block in one UPDATE and then
+    assigns numbers from memory (see allocator.py).
+    """
+    name = models.CharField(max_length=50, unique=True)
+    next_serial = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name} - {self.next_serial}"
 
 class Transaction(models.Model):
     """
@@ -37,12 +109,372 @@ class Transaction(models.Model):
         ('Transfer Out', 'Transfer Out'),
         ('Transfer In', 'Transfer In'),
         ('Service Fee', 'Service Fee'),
+        ('Interest', 'Interest'),
     ]
+    # Types that add money to the account. Everything else takes money out.
+    CREDIT_TYPES = ('Deposit', 'Transfer In', 'Interest')
 
     account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='transactions')
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     transaction_type = models.CharField(max_length=20, choices=TRANSACTION_TYPES)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Matches the history query: WHERE account_id = ? ORDER BY timestamp DESC, id DESC
+            # so keyset pagination can seek straight to the page instead of sorting.
+            models.Index(fields=['account', 'timestamp', 'id'], name='txn_account_ts_id_idx'),
+            # Bank-wide time ranges (rollup rebuilds) without scanning the whole table
+            models.Index(fields=['timestamp'], name='txn_timestamp_idx'),
+            # Admin list filtered by type, newest first (and its capped count): a rare
+            # type would otherwise walk the timestamp index over the whole table
+            models.Index(fields=['transaction_type', 'timestamp'], name='txn_type_ts_idx'),
+        ]
+
     def __str__(self):
         return f"{self.transaction_type} - {self.amount} - {self.timestamp}"
+
+    @classmethod
+    def is_credit(cls, transaction_type):
+        return transaction_type in cls.CREDIT_TYPES
+
+    @classmethod
+    def signed_amount(cls):
+        """
+        SQL expression for the amount as it affects the balance:
+        positive for credits, negative for debits. Use it inside Sum().
+        """
+        return models.Case(
+            models.When(transaction_type__in=cls.CREDIT_TYPES, then=models.F('amount')),
+            default=-models.F('amount'),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        )
+
+
+class Transfer(models.Model):
+    """
+    Journal entry for one P2P transfer.
+    Links the three ledger rows a transfer creates, so a transfer and its
+    fee can be shown with one query (select_related on the legs).
+    """
+    sender = models.ForeignKey(Account, on_delete=models.SET_NULL, null=True, related_name='transfers_sent')
+    recipient = models.ForeignKey(Account, on_delete=models.SET_NULL, null=True, related_name='transfers_received')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    service_fee = models.DecimalField(max_digits=12, decimal_places=2)
+    transfer_out = models.OneToOneField(
+        Transaction, on_delete=models.SET_NULL, null=True, related_name='transfer_as_out'
+    )
+    fee = models.OneToOneField(
+        Transaction, on_delete=models.SET_NULL, null=True, related_name='transfer_as_fee'
+    )
+    transfer_in = models.OneToOneField(
+        Transaction, on_delete=models.SET_NULL, null=True, related_name='transfer_as_in'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Transfer {self.amount} (+{self.service_fee} fee) {self.sender_id} -> {self.recipient_id}"
+
+
+class BalanceCheckpoint(models.Model):
+    """
+    The balance of an account at the end of a day (local time).
+    Lets point-in-time balances start from the nearest checkpoint instead of
+    summing the whole history. Built by `manage.py build_checkpoints`.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='checkpoints')
+    day = models.DateField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'day'], name='unique_checkpoint_per_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} - {self.day} - {self.balance}"
+
+
+class CheckpointRun(models.Model):
+    """
+    One run of the checkpoint builder.
+    A run folds the transactions with id in (from_transaction_id, to_transaction_id]
+    into the checkpoints, one chunk at a time. last_transaction_id records how
+    far it got, so an interrupted run can be resumed.
+    """
+    from_transaction_id = models.BigIntegerField()
+    to_transaction_id = models.BigIntegerField()
+    last_transaction_id = models.BigIntegerField()
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Checkpoint run {self.from_transaction_id} -> {self.to_transaction_id}"
+
+
+
+class TransactionRollup(models.Model):
+    """
+    Count, sum, min and max of the transactions of one type in one time bucket.
+    """
+    transaction_type = models.CharField(max_length=20, choices=Transaction.TRANSACTION_TYPES)
+    count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    min_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    max_amount = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        abstract = True
+
+
+class HourlyRollup(TransactionRollup):
+    """
+    Transactions per type and hour (local time). Built by `manage.py update_rollups`.
+    """
+    hour = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'transaction_type'], name='unique_hourly_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.hour} - {self.transaction_type} - {self.count}"
+
+
+class DailyRollup(TransactionRollup):
+    """
+    Transactions per type and day (local time). Built by `manage.py update_rollups`.
+    """
+    day = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'transaction_type'], name='unique_daily_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} - {self.transaction_type} - {self.count}"
+
+
+class RollupWatermark(models.Model):
+    """
+    Id of the last transaction folded into the rollups (a single row).
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_transaction_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_transaction_id}"
+
+class CustomerImport(models.Model):
+    """
+    Progress of one `manage.py import_customers` file.
+    Every batch moves last_line forward in the same database transaction as
+    its inserts, so an interrupted import resumes right after the last batch.
+    """
+    source = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, unique=True)  # sha256 of the file
+    last_line = models.PositiveIntegerField(default=0)
+    imported = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.source} - line {self.last_line}"
+
+
+class InterestRun(models.Model):
+    """
+    The interest accrual of one day (`manage.py accrue_interest`).
+    Accounts are processed in id-range chunks of chunk_size, up to
+    max_account_id (fixed when the run starts, so a resumed run has the
+    same chunks).
+    """
+    run_date = models.DateField(unique=True)
+    chunk_size = models.PositiveIntegerField()
+    max_account_id = models.BigIntegerField()
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Interest run {self.run_date}"
+
+
+class InterestChunk(models.Model):
+    """
+    A chunk of an InterestRun that is done. Written in the same database
+    transaction as the chunk's updates, so no chunk is ever applied twice.
+    """
+    run = models.ForeignKey(InterestRun, on_delete=models.CASCADE, related_name='chunks')
+    start_id = models.BigIntegerField()
+    accounts_credited = models.PositiveIntegerField(default=0)
+    finished_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'start_id'], name='unique_interest_chunk'),
+        ]
+
+    def __str__(self):
+        return f"{self.run.run_date} from account {self.start_id}"
+
+
+class StatementRun(models.Model):
+    """
+    The month-end statements of one month (`manage.py generate_statements`).
+    Accounts are processed in id-range chunks like an InterestRun; the files
+    go to output_dir.
+    """
+    month = models.DateField(unique=True)  # First day of the month
+    output_dir = models.CharField(max_length=500)
+    chunk_size = models.PositiveIntegerField()
+    max_account_id = models.BigIntegerField()
+    # Opening balances come from the checkpoints if they covered the month start
+    opening_from_checkpoints = models.BooleanField(default=False)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Statements {self.month:%Y-%m}"
+
+
+class StatementChunk(models.Model):
+    """
+    A chunk of a StatementRun whose files are written, with their manifest entries.
+    """
+    run = models.ForeignKey(StatementRun, on_delete=models.CASCADE, related_name='chunks')
+    start_id = models.BigIntegerField()
+    statements = models.JSONField(default=list)
+    finished_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'start_id'], name='unique_statement_chunk'),
+        ]
+
+    def __str__(self):
+        return f"{self.run.month:%Y-%m} from account {self.start_id}"
+
+
+class OutboxEmail(models.Model):
+    """
+    An email waiting to be sent.
+    Views only add rows here; `manage.py send_outbox` sends them in batches
+    so a slow SMTP server never holds up a web request.
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.TextField(help_text="Comma separated recipients")
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to} ({self.status})"
+
+
+class AccountPurge(models.Model):
+    """
+    A closed account waiting to be deleted by `manage.py purge_accounts`.
+    Transactions are deleted in batches by id range (last_transaction_id is
+    the progress), then the account and the user.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    account = models.ForeignKey(Account, on_delete=models.SET_NULL, null=True, blank=True, related_name='purges')
+    # Copied so the row still says what was deleted once the account is gone
+    account_number = models.CharField(max_length=10)
+    username = models.CharField(max_length=150)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    total_transactions = models.PositiveIntegerField(default=0)
+    deleted_transactions = models.PositiveIntegerField(default=0)
+    last_transaction_id = models.BigIntegerField(default=0)
+    archive_path = models.CharField(max_length=500, blank=True)
+    last_error = models.TextField(blank=True)
+    requested_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Purge {self.account_number} ({self.status})"
+
+    def progress(self):
+        """
+        Share of the transactions deleted so far, 0 - 100.
+        """
+        if self.status == self.DONE:
+            return 100
+        if not self.total_transactions:
+            return 0
+        return min(100, self.deleted_transactions * 100 // self.total_transactions)
+
+
+class ProfileStat(models.Model):
+    """
+    Aggregated cost of one view (URL name), flushed from the profiling
+    middleware's in-memory buffer. Times are in milliseconds.
+    """
+    url_name = models.CharField(max_length=100, unique=True)
+    requests = models.PositiveIntegerField(default=0)
+    queries = models.PositiveIntegerField(default=0)
+    max_queries = models.PositiveIntegerField(default=0)
+    db_ms = models.FloatField(default=0)
+    app_ms = models.FloatField(default=0)  # Time outside the database: view code, templates, middleware
+    total_ms = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.url_name} ({self.requests} requests)"
+
+
+class ProfileDuplicate(models.Model):
+    """
+    A SQL statement (fingerprint) that ran more than once in the same request.
+    Usually an N+1 pattern.
+    """
+    url_name = models.CharField(max_length=100)
+    fingerprint_hash = models.CharField(max_length=32)
+    fingerprint = models.TextField()
+    requests = models.PositiveIntegerField(default=0)
+    extra_queries = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['url_name', 'fingerprint_hash'], name='unique_duplicate_per_view'),
+        ]
+
+    def __str__(self):
+        return f"{self.url_name}: {self.fingerprint[:50]}"
@@ -0,0 +1,130 @@
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import OutboxEmail
+
+# Email outbox.
+#
+# enqueue_mail() just inserts a row, so views return immediately.
+# The send_outbox worker claims due rows in batches, sends them over one
+# reused SMTP connection and retries failures with exponential backoff.
+#
+# The body of an email (the OTP) is purged once it is sent or given up on,
+# so the table never keeps codes around. Hosts that block outgoing SMTP
+# (Render's free tier) never deliver anything: with OUTBOX_LOG_UNDELIVERED
+# on, the first failed attempt logs the body, OTP included, so it can be
+# read from the worker's logs instead (see EMAIL_SETUP.md).
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 30  # 30s, 60s, 120s, ...
+CLAIM_TIMEOUT = timedelta(minutes=5)  # A worker that died mid-batch loses its claim after this
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_mail(subject, body, recipient_list, from_email=None):
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or '',
+        to=','.join(recipient_list),
+    )
+
+
+def release_stale_claims():
+    """
+    Puts back rows claimed by a worker that never finished them.
+    """
+    return OutboxEmail.objects.filter(
+        status=OutboxEmail.SENDING, claimed_at__lt=timezone.now() - CLAIM_TIMEOUT
+    ).update(status=OutboxEmail.PENDING, claimed_by='')
+
+
+def claim_batch(batch_size=BATCH_SIZE):
+    """
+    Claims up to batch_size due emails for this worker.
+    The conditional UPDATE (status still pending) makes sure two workers
+    never claim the same row.
+    """
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    with transaction.atomic():
+        ids = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEmail.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        OutboxEmail.objects.filter(id__in=ids, status=OutboxEmail.PENDING).update(
+            status=OutboxEmail.SENDING, claimed_by=token, claimed_at=now
+        )
+    return list(OutboxEmail.objects.filter(claimed_by=token, status=OutboxEmail.SENDING).order_by('id'))
+
+
+def _retry_later(email, error):
+    email.attempts += 1
+    email.last_error = str(error)
+    email.claimed_by = ''
+    if email.attempts == 1 and settings.OUTBOX_LOG_UNDELIVERED:
+        logger.warning('Could not send email to %s (%s). It said:\n%s', email.to, error, email.body)
+    if email.attempts >= MAX_ATTEMPTS:
+        email.status = OutboxEmail.FAILED
+        email.body = ''
+    else:
+        email.status = OutboxEmail.PENDING
+        email.next_attempt_at = timezone.now() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (email.attempts - 1))
+    email.save(update_fields=['attempts', 'last_error', 'claimed_by', 'status', 'next_attempt_at', 'body'])
+
+
+def send_batch(batch_size=BATCH_SIZE):
+    """
+    Sends one batch. Returns (sent, failed) counts.
+    """
+    release_stale_claims()
+    emails = claim_batch(batch_size)
+    if not emails:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        # SMTP server unreachable: the whole batch goes back with backoff
+        for email in emails:
+            _retry_later(email, e)
+        return 0, len(emails)
+
+    try:
+        for email in emails:
+            message = EmailMessage(
+                email.subject,
+                email.body,
+                email.from_email or None,
+                email.to.split(','),
+                connection=connection,
+            )
+            try:
+                with metrics.OTP_SEND_LATENCY.time():
+                    message.send()
+            except Exception as e:
+                _retry_later(email, e)
+                failed += 1
+            else:
+                email.status = OutboxEmail.SENT
+                email.attempts += 1
+                email.sent_at = timezone.now()
+                email.body = ''  # Nothing left to send; don't keep the OTP
+                email.save(update_fields=['status', 'attempts', 'sent_at', 'body'])
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
@@ -0,0 +1,107 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db.models import Q
+
+# Keyset (cursor) pagination.
+#
+# OFFSET pagination makes the database walk past every skipped row, so page
+# 10,000 costs 10,000 pages of work. Keyset pagination remembers the sort key
+# of the last row shown and asks for "rows after this key" instead, which an
+# index can answer directly: every page costs the same.
+#
+# The cursor is the last row's sort values, JSON encoded and base64'd so it
+# can travel in a query string.
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    """
+    One page of results.
+    - items: the rows on this page.
+    - next_cursor: pass it back to get the following page (None on the last page).
+    """
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def _jsonable(value):
+    # Full isoformat(): DjangoJSONEncoder would cut datetimes to milliseconds,
+    # and a cursor must repeat the sort key exactly.
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values):
+    raw = json.dumps([_jsonable(value) for value in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, fields):
+    """
+    Turns a cursor string back into Python values (datetimes, ints, ...)
+    using each model field's own to_python().
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise ValueError
+        return [model._meta.get_field(name).to_python(value) for name, value in zip(fields, values)]
+    except Exception:
+        raise InvalidCursor('Invalid cursor.')
+
+
+def _after(fields, values, descending):
+    """
+    Builds the "row comes after (values)" filter for a lexicographic sort:
+        (a < x) OR (a = x AND b < y) OR ...
+    """
+    lookup = 'lt' if descending else 'gt'
+    condition = Q()
+    for i, name in enumerate(fields):
+        clause = Q(**{f'{name}__{lookup}': values[i]})
+        for previous, value in zip(fields[:i], values[:i]):
+            clause &= Q(**{previous: value})
+        condition |= clause
+    return condition
+
+
+def keyset_page(queryset, ordering, cursor=None, page_size=25):
+    """
+    Returns a KeysetPage of the queryset sorted by `ordering`.
+    - ordering: field names all in the same direction, e.g. ('-timestamp', '-id').
+      The last field must be unique (usually 'id') so the order is total.
+    - cursor: the next_cursor of the previous page, or None for the first page.
+    Raises InvalidCursor if the cursor can't be decoded.
+    """
+    descending = ordering[0].startswith('-')
+    fields = [name.lstrip('-') for name in ordering]
+
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = decode_cursor(cursor, queryset.model, fields)
+        queryset = queryset.filter(_after(fields, values, descending))
+
+    # Fetch one extra row to know whether there is a next page.
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, name) for name in fields])
+    return KeysetPage(rows, next_cursor)
@@ -0,0 +1,205 @@
+import hashlib
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import ProfileDuplicate, ProfileStat
+
+# Per-request SQL and timing profiler.
+#
+# A sampled share of requests (PROFILING_SAMPLE_RATE, 0 = off) is measured:
+# query count, time spent in the database, time spent outside it (app_ms:
+# view code, template rendering, middleware) and SQL statements repeated
+# within the request. Samples go into a bounded in-memory ring buffer per
+# worker. A background thread of the worker flushes it to ProfileStat /
+# ProfileDuplicate every PROFILING_FLUSH_SECONDS, so no request ever waits
+# for those writes.
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = 1000
+_NUMBER = re.compile(r"\b\d+(\.\d+)?\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_IN_LIST = re.compile(r"IN \((?:%s|\?)(?:, (?:%s|\?))*\)")
+
+
+def fingerprint(sql):
+    """
+    Reduces a SQL statement to its shape: literals and IN lists are replaced,
+    so the same query with other parameters has the same fingerprint.
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    """
+    execute_wrapper that counts queries, their time and their fingerprints.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+            shape = fingerprint(sql)
+            self.fingerprints[shape] = self.fingerprints.get(shape, 0) + 1
+
+    def duplicates(self):
+        return {shape: n for shape, n in self.fingerprints.items() if n > 1}
+
+
+class ProfileBuffer:
+    """
+    Bounded ring buffer of request samples for this worker process.
+    When full, the oldest samples are dropped.
+    """
+
+    def __init__(self, size=BUFFER_SIZE):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=size)
+        self._flusher_pid = None
+
+    def add(self, sample):
+        with self._lock:
+            self._samples.append(sample)
+            # Once per process: a thread started before a fork isn't in the child
+            if self._flusher_pid != os.getpid():
+                self._flusher_pid = os.getpid()
+                threading.Thread(target=self._flush_forever, name='profiling-flush', daemon=True).start()
+
+    def drain(self):
+        with self._lock:
+            samples = list(self._samples)
+            self._samples.clear()
+        return samples
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(getattr(settings, 'PROFILING_FLUSH_SECONDS', 30))
+            samples = self.drain()
+            if not samples:
+                continue
+            try:
+                flush(samples)
+            except Exception:
+                logger.exception('Could not flush profiling samples')
+            finally:
+                connections.close_all()  # This thread's connections only
+
+
+buffer = ProfileBuffer()
+
+
+def _increment(model, lookup, create_defaults, **changes):
+    """
+    Adds to counters of one row, creating it if needed.
+    """
+    updated = model.objects.filter(**lookup).update(**changes)
+    if not updated:
+        try:
+            with transaction.atomic():
+                model.objects.create(**lookup, **create_defaults)
+        except IntegrityError:
+            # Another worker created it first
+            model.objects.filter(**lookup).update(**changes)
+
+
+def flush(samples):
+    """
+    Folds samples into the ProfileStat / ProfileDuplicate tables.
+    """
+    stats = {}
+    duplicates = {}
+    for sample in samples:
+        row = stats.setdefault(sample['url_name'], {
+            'requests': 0, 'queries': 0, 'max_queries': 0, 'db_ms': 0.0, 'app_ms': 0.0, 'total_ms': 0.0,
+        })
+        row['requests'] += 1
+        row['queries'] += sample['queries']
+        row['max_queries'] = max(row['max_queries'], sample['queries'])
+        row['db_ms'] += sample['db_ms']
+        row['app_ms'] += sample['app_ms']
+        row['total_ms'] += sample['total_ms']
+        for shape, count in sample['duplicates'].items():
+            dup = duplicates.setdefault((sample['url_name'], shape), {'requests': 0, 'extra_queries': 0})
+            dup['requests'] += 1
+            dup['extra_queries'] += count - 1
+
+    for url_name, row in stats.items():
+        _increment(
+            ProfileStat, {'url_name': url_name}, row,
+            requests=F('requests') + row['requests'],
+            queries=F('queries') + row['queries'],
+            max_queries=Greatest('max_queries', row['max_queries']),
+            db_ms=F('db_ms') + row['db_ms'],
+            app_ms=F('app_ms') + row['app_ms'],
+            total_ms=F('total_ms') + row['total_ms'],
+        )
+    for (url_name, shape), row in duplicates.items():
+        shape_hash = hashlib.md5(shape.encode()).hexdigest()
+        _increment(
+            ProfileDuplicate, {'url_name': url_name, 'fingerprint_hash': shape_hash},
+            {'fingerprint': shape, **row},
+            requests=F('requests') + row['requests'],
+            extra_queries=F('extra_queries') + row['extra_queries'],
+        )
+
+
+class ProfilingMiddleware:
+    """
+    Measures a sample of requests to the banking views.
+    Settings:
+    - PROFILING_SAMPLE_RATE: share of requests to measure, 0.0 - 1.0 (0 = off).
+    - PROFILING_FLUSH_SECONDS: how often a worker writes its buffer to the database
+      (from a background thread, never in a request).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        if rate <= 0 or random.random() >= rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            # Every database: read-only views go to the replica
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()  # Count lazy TemplateResponse rendering too
+        total = time.perf_counter() - start
+
+        match = request.resolver_match
+        if match and match.func.__module__.startswith('banking.'):
+            buffer.add({
+                'url_name': match.url_name,
+                'queries': recorder.count,
+                'db_ms': recorder.seconds * 1000,
+                'app_ms': (total - recorder.seconds) * 1000,  # Everything but the database
+                'total_ms': total * 1000,
+                'duplicates': recorder.duplicates(),
+            })
+        return response
@@ -0,0 +1,154 @@
+import gzip
+import json
+import logging
+import os
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from . import dashboard_cache, directory
+from .models import Account, AccountPurge, BalanceCheckpoint, BalanceShard, Transaction
+from .statements import jsonl_lines
+
+# Account deletion.
+#
+# Deleting an account with a long history in one go (user.delete() and
+# CASCADE) loads every related row into memory and holds one write
+# transaction for the whole time, which blocks everybody else on SQLite.
+# So deletion is split in two:
+# - close_account() runs in the admin's request: it marks the account
+#   closed, deactivates the user (no login, no transfers to the account)
+#   and queues an AccountPurge;
+# - `manage.py purge_accounts` (a worker, like send_outbox) optionally
+#   writes an archive file, deletes the transactions PURGE_BATCH_SIZE at a
+#   time by id range, each batch in its own short transaction, and finally
+#   deletes the account and the user.
+#
+# Run a single purge worker: purges are picked up in order, not claimed.
+
+logger = logging.getLogger(__name__)
+
+PURGE_BATCH_SIZE = 1000
+
+
+@transaction.atomic
+def close_account(account):
+    """
+    Closes the account right away and queues the deletion of its data.
+    Returns the AccountPurge.
+    """
+    # Lock it like the ledger does, so no transfer lands in the middle
+    account = Account.objects.select_for_update().select_related('user').get(id=account.id)
+    # Credits to a sharded account lock a shard instead: wait for them too
+    list(BalanceShard.objects.select_for_update().filter(account=account).order_by('shard'))
+    account.closed_at = timezone.now()
+    account.save(update_fields=['closed_at'])
+    User.objects.filter(id=account.user_id).update(is_active=False)
+    purge = AccountPurge.objects.create(
+        account=account,
+        account_number=account.account_number,
+        username=account.user.username,
+        total_transactions=account.transactions.count(),
+    )
+    dashboard_cache.invalidate(account.user_id)
+    directory.account_removed(account.account_number)
+    return purge
+
+
+def next_purge():
+    """
+    The oldest purge that isn't finished, or None.
+    """
+    return (
+        AccountPurge.objects.filter(status__in=[AccountPurge.PENDING, AccountPurge.RUNNING])
+        .order_by('id').first()
+    )
+
+
+def write_archive(purge, archive_dir):
+    """
+    Saves the account and its full statement as gzipped JSON Lines before anything is deleted.
+    """
+    account = (
+        Account.objects.select_related('user')
+        .annotate(total_balance=Account.total_balance()).get(id=purge.account_id)
+    )
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f'{account.account_number}-{purge.id}.jsonl.gz')
+    partial = path + '.part'
+    with gzip.open(partial, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({
+            'username': account.user.username,
+            'first_name': account.user.first_name,
+            'last_name': account.user.last_name,
+            'email': account.user.email,
+            'mobile_number': account.mobile_number,
+            'balance': f'{account.total_balance:.2f}',
+            'closed_at': account.closed_at.isoformat() if account.closed_at else None,
+        }) + '\n')
+        for line in jsonl_lines(account):
+            f.write(line)
+    os.replace(partial, path)  # A crash mid-write never leaves a file that looks complete
+
+    purge.archive_path = path
+    purge.save(update_fields=['archive_path'])
+
+
+def delete_batch(purge, batch_size):
+    """
+    Deletes the next `batch_size` transactions of the account (by id range)
+    and records the progress. Returns how many were deleted, 0 when none are left.
+    """
+    ids = list(
+        Transaction.objects.filter(account_id=purge.account_id, id__gt=purge.last_transaction_id)
+        .order_by('id').values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return 0
+    with transaction.atomic():
+        Transaction.objects.filter(account_id=purge.account_id, id__gte=ids[0], id__lte=ids[-1]).delete()
+        purge.last_transaction_id = ids[-1]
+        purge.deleted_transactions += len(ids)
+        purge.save(update_fields=['last_transaction_id', 'deleted_transactions'])
+    return len(ids)
+
+
+@transaction.atomic
+def finish(purge):
+    """
+    Deletes what is left once the transactions are gone: checkpoints, the account and the user.
+    """
+    if purge.account_id:
+        BalanceCheckpoint.objects.filter(account_id=purge.account_id).delete()
+        User.objects.filter(account__id=purge.account_id).delete()
+    purge.status = AccountPurge.DONE
+    purge.finished_at = timezone.now()
+    purge.save(update_fields=['status', 'finished_at'])
+
+
+def purge_step(batch_size=PURGE_BATCH_SIZE, archive_dir=None):
+    """
+    Does one step of the oldest unfinished purge: archive, one batch of
+    transactions, or the final delete. Returns the purge, or None if there
+    is nothing to do.
+    """
+    purge = next_purge()
+    if purge is None:
+        return None
+    archive_dir = archive_dir or getattr(settings, 'ACCOUNT_ARCHIVE_DIR', None)
+    try:
+        if purge.status == AccountPurge.PENDING:
+            if archive_dir and purge.account_id and not purge.archive_path:
+                write_archive(purge, archive_dir)
+            purge.status = AccountPurge.RUNNING
+            purge.save(update_fields=['status'])
+        elif not purge.account_id or not delete_batch(purge, batch_size):
+            finish(purge)
+    except Exception as e:
+        logger.exception('Purge of account %s failed', purge.account_number)
+        purge.status = AccountPurge.FAILED
+        purge.last_error = str(e)
+        purge.save(update_fields=['status', 'last_error'])
+    return purge
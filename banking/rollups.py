@@ -0,0 +1,235 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connections, transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from .models import DailyRollup, HourlyRollup, RollupWatermark, Transaction
+
+# Transaction rollups for the analytics page.
+#
+# HourlyRollup / DailyRollup hold count, sum, min and max per transaction
+# type and time bucket. They are kept up to date incrementally: every run of
+# update_rollups() only reads the transactions with an id above the watermark
+# and adds them to the buckets they fall in. Charts then read a few hundred
+# rollup rows instead of aggregating the Transaction table.
+#
+# rebuild() recomputes a date range from scratch (after a bug fix or a
+# manual correction), one day per task, several days in parallel.
+
+WATERMARK_NAME = 'transactions'
+
+# granularity -> (model, bucket field, SQL function that truncates a timestamp to the bucket)
+GRANULARITIES = {
+    'hour': (HourlyRollup, 'hour', TruncHour),
+    'day': (DailyRollup, 'day', TruncDate),
+}
+STAT_FIELDS = ['count', 'total', 'min_amount', 'max_amount']
+
+
+def watermark():
+    """
+    Id of the last transaction included in the rollups (0 if none).
+    """
+    state = RollupWatermark.objects.filter(name=WATERMARK_NAME).first()
+    return state.last_transaction_id if state else 0
+
+
+def _lock_watermark():
+    """
+    Locks and returns the watermark row. Must be called inside atomic().
+    Folding and rebuilding both take this lock so they never write the same
+    buckets at the same time.
+    """
+    RollupWatermark.objects.get_or_create(name=WATERMARK_NAME)
+    return RollupWatermark.objects.select_for_update().get(name=WATERMARK_NAME)
+
+
+def _aggregate(queryset, granularity):
+    """
+    Groups a Transaction queryset into {(bucket, transaction_type): stats}.
+    """
+    _, field, trunc = GRANULARITIES[granularity]
+    rows = (
+        queryset.annotate(bucket=trunc('timestamp'))
+        .values('bucket', 'transaction_type')
+        .annotate(count=Count('id'), total=Sum('amount'), min_amount=Min('amount'), max_amount=Max('amount'))
+        .order_by()
+    )
+    return {
+        (row['bucket'], row['transaction_type']): {name: row[name] for name in STAT_FIELDS}
+        for row in rows
+    }
+
+
+def _combine(a, b):
+    return {
+        'count': a['count'] + b['count'],
+        'total': a['total'] + b['total'],
+        'min_amount': min(a['min_amount'], b['min_amount']),
+        'max_amount': max(a['max_amount'], b['max_amount']),
+    }
+
+
+def _write(granularity, stats):
+    """
+    Upserts {(bucket, transaction_type): stats} into the rollup table.
+    """
+    model, field, _ = GRANULARITIES[granularity]
+    model.objects.bulk_create(
+        [
+            model(**{field: bucket}, transaction_type=transaction_type, **values)
+            for (bucket, transaction_type), values in stats.items()
+        ],
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=[field, 'transaction_type'],
+        update_fields=STAT_FIELDS,
+    )
+
+
+def _add(granularity, stats):
+    """
+    Adds new stats to the existing buckets (creating missing ones).
+    """
+    if not stats:
+        return
+    model, field, _ = GRANULARITIES[granularity]
+    buckets = {bucket for bucket, _ in stats}
+    for row in model.objects.filter(**{f'{field}__in': buckets}):
+        key = (getattr(row, field), row.transaction_type)
+        if key in stats:
+            stats[key] = _combine(stats[key], {name: getattr(row, name) for name in STAT_FIELDS})
+    _write(granularity, stats)
+
+
+# ==========================================
+# INCREMENTAL UPDATE
+# ==========================================
+
+@transaction.atomic
+def fold_chunk(chunk_size):
+    """
+    Folds the next `chunk_size` transaction ids above the watermark into the
+    rollups and moves the watermark, in one database transaction.
+    Returns the new watermark, or None if there was nothing new.
+    """
+    state = _lock_watermark()
+    latest = Transaction.objects.aggregate(last=Max('id'))['last'] or 0
+    if latest <= state.last_transaction_id:
+        return None
+
+    end = min(state.last_transaction_id + chunk_size, latest)
+    new = Transaction.objects.filter(id__gt=state.last_transaction_id, id__lte=end)
+    for granularity in GRANULARITIES:
+        _add(granularity, _aggregate(new, granularity))
+
+    state.last_transaction_id = end
+    state.save(update_fields=['last_transaction_id', 'updated_at'])
+    return end
+
+
+def update_rollups(chunk_size=10000):
+    """
+    Folds everything above the watermark. Returns the final watermark.
+    """
+    last = watermark()
+    while True:
+        end = fold_chunk(chunk_size)
+        if end is None:
+            return last
+        last = end
+
+
+# ==========================================
+# REBUILDING A DATE RANGE
+# ==========================================
+
+def _rebuild_day(day):
+    """
+    Recomputes the hourly and daily rollups of one local day.
+    The heavy aggregate runs without the lock. Transactions folded by
+    update_rollups meanwhile are added before the write, under the lock.
+    """
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    in_day = Transaction.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    try:
+        seen = watermark()
+        stats = {g: _aggregate(in_day.filter(id__lte=seen), g) for g in GRANULARITIES}
+
+        with transaction.atomic():
+            state = _lock_watermark()
+            if state.last_transaction_id > seen:
+                late = in_day.filter(id__gt=seen, id__lte=state.last_transaction_id)
+                for granularity in GRANULARITIES:
+                    for key, values in _aggregate(late, granularity).items():
+                        current = stats[granularity].get(key)
+                        stats[granularity][key] = _combine(current, values) if current else values
+
+            HourlyRollup.objects.filter(hour__gte=start, hour__lt=end).delete()
+            DailyRollup.objects.filter(day=day).delete()
+            for granularity, values in stats.items():
+                _write(granularity, values)
+        return day
+    finally:
+        connections.close_all()
+
+
+def rebuild(first_day, last_day, workers=4):
+    """
+    Recomputes the rollups of every day in [first_day, last_day].
+    Days are independent, so up to `workers` are computed at the same time.
+    Yields the days in order as they are done.
+    """
+    days = [first_day + timedelta(days=n) for n in range((last_day - first_day).days + 1)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_rebuild_day, days)
+
+
+# ==========================================
+# READING
+# ==========================================
+
+def series(granularity, start, end, transaction_type=None):
+    """
+    Time series from the rollups only.
+    - start / end: bucket range, end exclusive (datetimes for 'hour', dates for 'day').
+    Returns {transaction_type: [{'bucket', 'count', 'total', 'min_amount', 'max_amount'}, ...]}
+    with buckets in time order.
+    """
+    model, field, _ = GRANULARITIES[granularity]
+    rows = model.objects.filter(**{f'{field}__gte': start, f'{field}__lt': end})
+    if transaction_type:
+        rows = rows.filter(transaction_type=transaction_type)
+    result = {}
+    for row in rows.order_by(field, 'transaction_type').values(field, 'transaction_type', *STAT_FIELDS):
+        bucket = row.pop(field)
+        result.setdefault(row.pop('transaction_type'), []).append({'bucket': bucket, **row})
+    return result
+
+
+def totals_by_type(*transaction_types):
+    """
+    All-time total amount per transaction type: the daily rollups plus the
+    transactions above the watermark that haven't been folded yet.
+    """
+    totals = {transaction_type: Decimal('0') for transaction_type in transaction_types}
+    last = watermark()
+    for queryset, column in (
+        (DailyRollup.objects.all(), 'total'),
+        (Transaction.objects.filter(id__gt=last), 'amount'),
+    ):
+        rows = (
+            queryset.filter(transaction_type__in=transaction_types)
+            .values('transaction_type')
+            .annotate(sum=Sum(column))
+            .order_by()
+        )
+        for row in rows:
+            totals[row['transaction_type']] += row['sum']
+    # SQLite returns sums as floats
+    return {key: value.quantize(Decimal('0.01')) for key, value in totals.items()}
@@ -0,0 +1,129 @@
+import random
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from . import dashboard_cache
+from .models import Account, BalanceShard
+
+# Sharded balances for hot accounts.
+#
+# Merchant and collection accounts receive a large share of all transfers.
+# Every credit rewrites Account.balance, so on a database with row locks
+# (PostgreSQL) all transfers to such an account queue up behind one row.
+# An admin can switch an account to sharded mode (`manage.py shard_balance`):
+# - credits from ledger.transfer() add to one of N BalanceShard rows,
+#   chosen at random, and never lock the Account row;
+# - debits lock the Account row as usual and, when Account.balance alone
+#   doesn't cover them, move money in from as few shards as possible;
+# - the balance shown anywhere is Account.balance plus the shards
+#   (Account.total_balance(), one query).
+#
+# A credit to a shard is the last write of its database transaction and
+# checks afterwards that the account is still open. Debits and
+# close_account() lock the Account row first and the shards after, so
+# nothing waits in a circle.
+#
+# On SQLite every write transaction takes the whole database lock, so
+# sharding changes nothing there. It pays off on PostgreSQL.
+
+MAX_SHARDS = 64
+SHARDED_KEY = 'banking:shards:accounts'
+SHARDED_TTL = 5 * 60  # Seconds. Changes delete the entry, this is a safety net.
+CENTS = Decimal('0.01')
+
+
+def sharded_accounts():
+    """
+    {account_id: number of shards} of every sharded account, cached.
+    """
+    accounts = cache.get(SHARDED_KEY)
+    if accounts is None:
+        accounts = dict(Account.objects.filter(balance_shards__gt=0).values_list('id', 'balance_shards'))
+        cache.set(SHARDED_KEY, accounts, SHARDED_TTL)
+    return accounts
+
+
+def shard_count(account_id):
+    return sharded_accounts().get(account_id, 0)
+
+
+def totals(account_ids):
+    """
+    {account_id: whole balance}, in one query.
+    """
+    rows = Account.objects.filter(id__in=account_ids).annotate(total=Account.total_balance())
+    # Quantized because SQLite drops the scale of computed decimals
+    return {pk: total.quantize(CENTS) for pk, total in rows.values_list('id', 'total')}
+
+
+def _fold(account_id):
+    """
+    Moves the money of every shard back into Account.balance and deletes
+    the shards. The Account row must be locked.
+    """
+    held = BalanceShard.objects.select_for_update().filter(account_id=account_id).order_by('shard')
+    total = sum(held.values_list('balance', flat=True))
+    Account.objects.filter(id=account_id).update(balance=F('balance') + total)
+    BalanceShard.objects.filter(account_id=account_id).delete()
+
+
+@transaction.atomic
+def set_shards(account, shards):
+    """
+    Switches an account to `shards` balance shards, or back to a plain
+    balance with 0. The balance doesn't change.
+    """
+    if not 0 <= shards <= MAX_SHARDS:
+        raise ValueError(f'shards must be between 0 and {MAX_SHARDS}.')
+    locked = Account.objects.select_for_update().get(id=account.id)
+    _fold(locked.id)
+    BalanceShard.objects.bulk_create([BalanceShard(account=locked, shard=i) for i in range(shards)])
+    Account.objects.filter(id=locked.id).update(balance_shards=shards)
+    account.balance_shards = shards
+    dashboard_cache.invalidate(locked.user_id)
+    transaction.on_commit(lambda: cache.delete(SHARDED_KEY))
+
+
+def credit(account_id, amount, shards):
+    """
+    Adds `amount` to a random shard of the account. Call it as the last
+    write of the transaction. Returns (user_id, whole balance), or None if
+    the account was closed or deleted meanwhile (roll back then).
+    """
+    landed = BalanceShard.objects.filter(account_id=account_id, shard=random.randrange(shards)).update(
+        balance=F('balance') + amount
+    )
+    if not landed:
+        # The shards were changed since sharded_accounts() was read
+        Account.objects.filter(id=account_id).update(balance=F('balance') + amount)
+    row = (
+        Account.objects.filter(id=account_id, closed_at__isnull=True)
+        .annotate(total=Account.total_balance()).values_list('user_id', 'total').first()
+    )
+    return row and (row[0], row[1].quantize(CENTS))
+
+
+def collect(account, needed):
+    """
+    Moves at least `needed` from the shards into Account.balance (everything
+    if the shards hold less), locking the fullest shards first so that as
+    few as possible are touched. The Account row must be locked.
+    Returns the amount moved.
+    """
+    candidates = list(
+        BalanceShard.objects.filter(account_id=account.id, balance__gt=0)
+        .order_by('-balance').values_list('id', flat=True)
+    )
+    moved = 0
+    for shard_id in candidates:
+        if moved >= needed:
+            break
+        shard = BalanceShard.objects.select_for_update().get(id=shard_id)
+        BalanceShard.objects.filter(id=shard_id).update(balance=F('balance') - shard.balance)
+        moved += shard.balance
+    if moved:
+        Account.objects.filter(id=account.id).update(balance=F('balance') + moved)
+    return moved
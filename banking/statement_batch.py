@@ -0,0 +1,274 @@
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import groupby
+
+import django
+from django.db import IntegrityError
+from django.db.models import Max, Min, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .checkpoints import watermark
+from .models import Account, BalanceCheckpoint, StatementChunk, StatementRun, Transaction
+from .statements import STATEMENT_CHUNK_SIZE
+
+# Month-end statements.
+#
+# `manage.py generate_statements` writes a statement for every account that
+# existed during the month: opening balance, every transaction of the month
+# with the running balance, fees charged and closing balance. Each one is a
+# gzipped JSON Lines file (header line, one line per transaction, summary
+# line); manifest.json lists them all with their totals and checksums.
+#
+# Accounts are split into id ranges of CHUNK_SIZE and the chunks run in a
+# process pool. A chunk costs two queries whatever its size: the accounts
+# with their opening balances, and all their transactions of the month in
+# one query ordered by (account, timestamp, id), which is the order of the
+# txn_account_ts_id_idx index. A chunk is recorded as done (StatementChunk,
+# with its manifest entries) only after its files are complete, so running
+# the command again for the same month resumes with the missing chunks.
+
+CHUNK_SIZE = 500
+CENTS = Decimal('0.01')
+
+
+def month_bounds(month):
+    """
+    (start, end) of the month containing the date `month`, in local time.
+    """
+    first = month.replace(day=1)
+    following = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return (
+        timezone.make_aware(datetime.combine(first, time.min)),
+        timezone.make_aware(datetime.combine(following, time.min)),
+    )
+
+
+def month_dir(run):
+    return os.path.join(run.output_dir, f'{run.month:%Y-%m}')
+
+
+def start_run(month, output_dir, chunk_size=CHUNK_SIZE):
+    """
+    Returns the run of `month`: the existing one (resume) or a new one.
+    """
+    start, _ = month_bounds(month)
+    run, _ = StatementRun.objects.get_or_create(
+        month=month.replace(day=1),
+        defaults={
+            'output_dir': str(output_dir),
+            'chunk_size': chunk_size,
+            'max_account_id': Account.objects.aggregate(last=Max('id'))['last'] or 0,
+            # Checkpoints are only complete if the builder has seen every transaction before the month
+            'opening_from_checkpoints': not Transaction.objects.filter(
+                id__gt=watermark(), timestamp__lt=start
+            ).exists(),
+        },
+    )
+    return run
+
+
+def pending_chunks(run):
+    """
+    Start ids of the chunks not done yet, aligned to multiples of chunk_size.
+    """
+    first = Account.objects.filter(id__lte=run.max_account_id).aggregate(first=Min('id'))['first']
+    if first is None:
+        return []
+    done = set(run.chunks.values_list('start_id', flat=True))
+    first_chunk = first // run.chunk_size * run.chunk_size
+    return [
+        start for start in range(first_chunk, run.max_account_id + 1, run.chunk_size)
+        if start not in done
+    ]
+
+
+# ==========================================
+# ONE CHUNK
+# ==========================================
+
+def _chunk_accounts(run, start_id, start, end):
+    """
+    {account_id: header dict} of the accounts in the chunk that existed during the month.
+    """
+    accounts = Account.objects.filter(
+        id__gte=start_id,
+        id__lt=min(start_id + run.chunk_size, run.max_account_id + 1),
+        user__date_joined__lt=end,
+    )
+    if run.opening_from_checkpoints:
+        # Balance at the end of the last day with a checkpoint before the month
+        accounts = accounts.annotate(opening=Subquery(
+            BalanceCheckpoint.objects.filter(account=OuterRef('pk'), day__lt=start.date())
+            .order_by('-day').values('balance')[:1]
+        ))
+        openings = None
+    else:
+        openings = dict(
+            Transaction.objects.filter(account__in=accounts, timestamp__lt=start)
+            .values('account_id').annotate(total=Sum(Transaction.signed_amount())).order_by()
+            .values_list('account_id', 'total')
+        )
+
+    headers = {}
+    rows = accounts.order_by('id').values(
+        'id', 'account_number', 'account_type', 'user__first_name', 'user__last_name',
+        *(['opening'] if openings is None else []),
+    )
+    for row in rows:
+        opening = row['opening'] if openings is None else openings.get(row['id'])
+        headers[row['id']] = {
+            'account_number': row['account_number'],
+            'account_type': row['account_type'],
+            'holder': f"{row['user__first_name']} {row['user__last_name']}".strip(),
+            'period_start': start.isoformat(),
+            'period_end': end.isoformat(),
+            'opening_balance': (opening or Decimal('0')).quantize(CENTS),
+        }
+    return headers
+
+
+class _HashingFile:
+    """
+    Passes writes through to a file and keeps the SHA-256 of what was written.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+
+def _write_statement(directory, header, transactions):
+    """
+    Writes one statement file (via a .part file, so a crash never leaves a
+    file that looks complete). Returns its manifest entry.
+    """
+    file_name = f"{header['account_number']}.jsonl.gz"
+    path = os.path.join(directory, file_name)
+    balance = header['opening_balance']
+    summary = {'credits': Decimal('0.00'), 'debits': Decimal('0.00'), 'fees': Decimal('0.00'), 'transactions': 0}
+
+    with open(path + '.part', 'wb') as raw:
+        hashed = _HashingFile(raw)
+        with gzip.GzipFile(fileobj=hashed, mode='wb', mtime=0) as f:
+            f.write((json.dumps({**header, 'opening_balance': str(balance)}) + '\n').encode())
+            for txn_id, timestamp, transaction_type, amount in transactions:
+                if Transaction.is_credit(transaction_type):
+                    summary['credits'] += amount
+                else:
+                    summary['debits'] += amount
+                    amount = -amount
+                if transaction_type == 'Service Fee':
+                    summary['fees'] += -amount
+                balance += amount
+                summary['transactions'] += 1
+                f.write((json.dumps({
+                    'id': txn_id,
+                    'timestamp': timezone.localtime(timestamp).isoformat(),
+                    'transaction_type': transaction_type,
+                    'amount': str(amount),
+                    'balance': str(balance),
+                }) + '\n').encode())
+            summary = {key: value if key == 'transactions' else str(value) for key, value in summary.items()}
+            f.write((json.dumps({'closing_balance': str(balance), **summary}) + '\n').encode())
+    os.replace(path + '.part', path)
+
+    return {
+        'account_number': header['account_number'],
+        'file': file_name,
+        'opening_balance': str(header['opening_balance']),
+        'closing_balance': str(balance),
+        **summary,
+        'bytes': hashed.size,
+        'sha256': hashed.sha256.hexdigest(),
+    }
+
+
+def generate_chunk(run_id, start_id):
+    """
+    Writes the statements of the accounts with id in [start_id, start_id +
+    chunk_size) and records the chunk. Returns the number of statements,
+    or None if the chunk was already done. Safe to run in a worker process.
+    """
+    run = StatementRun.objects.get(id=run_id)
+    if run.chunks.filter(start_id=start_id).exists():
+        return None
+    start, end = month_bounds(run.month)
+    headers = _chunk_accounts(run, start_id, start, end)
+    directory = month_dir(run)
+    os.makedirs(directory, exist_ok=True)
+
+    rows = (
+        Transaction.objects.filter(account_id__in=list(headers), timestamp__gte=start, timestamp__lt=end)
+        .order_by('account_id', 'timestamp', 'id')
+        .values_list('account_id', 'id', 'timestamp', 'transaction_type', 'amount')
+        .iterator(chunk_size=STATEMENT_CHUNK_SIZE)
+    )
+    entries = []
+    pending = iter(sorted(headers))
+    for account_id, group in groupby(rows, key=lambda row: row[0]):
+        # Accounts without transactions this month come first in id order
+        for quiet_id in pending:
+            if quiet_id == account_id:
+                break
+            entries.append(_write_statement(directory, headers[quiet_id], []))
+        entries.append(_write_statement(directory, headers[account_id], (row[1:] for row in group)))
+    for quiet_id in pending:
+        entries.append(_write_statement(directory, headers[quiet_id], []))
+
+    try:
+        StatementChunk.objects.create(run=run, start_id=start_id, statements=entries)
+    except IntegrityError:
+        return None  # Another worker did it at the same time, with the same files
+    return len(entries)
+
+
+def init_worker():
+    """
+    Process pool initializer: makes Django usable in the worker (needed
+    where processes are spawned rather than forked).
+    """
+    django.setup()
+
+
+def write_manifest(run):
+    """
+    Writes manifest.json for a run whose chunks are all done and marks the run finished.
+    Returns the manifest path.
+    """
+    statements = sorted(
+        (entry for chunk in run.chunks.all() for entry in chunk.statements),
+        key=lambda entry: entry['account_number'],
+    )
+    start, end = month_bounds(run.month)
+    manifest = {
+        'month': f'{run.month:%Y-%m}',
+        'period_start': start.isoformat(),
+        'period_end': end.isoformat(),
+        'generated_at': timezone.now().isoformat(),
+        'accounts': len(statements),
+        'transactions': sum(entry['transactions'] for entry in statements),
+        'fees': str(sum((Decimal(entry['fees']) for entry in statements), Decimal('0.00'))),
+        'statements': statements,
+    }
+    path = os.path.join(month_dir(run), 'manifest.json')
+    os.makedirs(month_dir(run), exist_ok=True)
+    with open(path + '.part', 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + '.part', path)
+
+    run.finished_at = timezone.now()
+    run.save(update_fields=['finished_at'])
+    return path
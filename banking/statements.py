@@ -0,0 +1,77 @@
+import csv
+import json
+
+from django.utils.timezone import localtime
+
+from .checkpoints import balance_as_of
+from .models import Transaction
+
+# Statement export.
+#
+# Statements are streamed: rows are read with .iterator() as plain tuples
+# (values_list, no model instances) and written out one by one with the
+# running balance computed on the fly. Memory stays flat whatever the size
+# of the history, and the header goes out before the query even runs.
+
+STATEMENT_CHUNK_SIZE = 2000
+STATEMENT_FIELDS = ['id', 'timestamp', 'transaction_type', 'amount', 'balance']
+
+
+class Echo:
+    """
+    File-like object that hands back what is written to it,
+    so csv.writer can be used to build one line at a time.
+    """
+
+    def write(self, value):
+        return value
+
+
+def statement_rows(account, start=None, end=None):
+    """
+    Yields (id, timestamp, transaction_type, signed amount, running balance)
+    for every transaction of the account in [start, end), oldest first.
+    The running balance starts from the balance at `start` (from checkpoints).
+    """
+    transactions = account.transactions.all()
+    balance = 0
+    if start:
+        transactions = transactions.filter(timestamp__gte=start)
+        balance = balance_as_of(account, start)
+    if end:
+        transactions = transactions.filter(timestamp__lt=end)
+
+    rows = (
+        transactions.order_by('timestamp', 'id')
+        .values_list('id', 'timestamp', 'transaction_type', 'amount')
+        .iterator(chunk_size=STATEMENT_CHUNK_SIZE)
+    )
+    for txn_id, timestamp, transaction_type, amount in rows:
+        if not Transaction.is_credit(transaction_type):
+            amount = -amount
+        balance += amount
+        yield txn_id, timestamp, transaction_type, amount, balance
+
+
+def csv_lines(account, start=None, end=None):
+    writer = csv.writer(Echo())
+    yield writer.writerow(STATEMENT_FIELDS)
+    for txn_id, timestamp, transaction_type, amount, balance in statement_rows(account, start, end):
+        yield writer.writerow([txn_id, localtime(timestamp).isoformat(), transaction_type, amount, balance])
+
+
+def jsonl_lines(account, start=None, end=None):
+    yield json.dumps({'account_number': account.account_number, 'account_type': account.account_type}) + '\n'
+    for row in statement_rows(account, start, end):
+        record = dict(zip(STATEMENT_FIELDS, row))
+        record['timestamp'] = localtime(record['timestamp']).isoformat()
+        record['amount'] = str(record['amount'])
+        record['balance'] = str(record['balance'])
+        yield json.dumps(record) + '\n'
+
+
+STATEMENT_FORMATS = {
+    # format: (generator, content type, file extension)
+    'csv': (csv_lines, 'text/csv', 'csv'),
+    'jsonl': (jsonl_lines, 'application/x-ndjson', 'jsonl'),
+}
@@ -0,0 +1,46 @@
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+from .models import Account
+from .rollups import totals_by_type
+
+# Bank-wide totals for the admin panel.
+# Scanning the whole Transaction table on every page refresh is wasteful, so
+# the totals are cached for a short time. They can be up to
+# BANK_TOTALS_TTL seconds old, which is fine for an overview header.
+
+BANK_TOTALS_CACHE_KEY = 'banking:bank_totals'
+BANK_TOTALS_TTL = 60  # Seconds
+
+
+def compute_bank_totals():
+    """
+    Computes the totals. Deposits and fees come from the rollups (see
+    rollups.py), accounts from one aggregate query with conditional counts.
+    """
+    ledger = totals_by_type('Deposit', 'Service Fee')
+    account_types = dict(Account._meta.get_field('account_type').choices)
+    accounts = Account.objects.aggregate(
+        total_balance=Sum(Account.total_balance(), default=0),
+        total_accounts=Count('id'),
+        **{
+            f'type_{key}': Count('id', filter=Q(account_type=key))
+            for key in account_types
+        }
+    )
+    return {
+        'total_deposits': ledger['Deposit'],
+        'service_fee_revenue': ledger['Service Fee'],
+        'total_balance': accounts['total_balance'],
+        'total_accounts': accounts['total_accounts'],
+        'accounts_per_type': [
+            (label, accounts[f'type_{key}']) for key, label in account_types.items()
+        ],
+    }
+
+
+def bank_totals():
+    """
+    Cached version of compute_bank_totals().
+    """
+    return cache.get_or_set(BANK_TOTALS_CACHE_KEY, compute_bank_totals, BANK_TOTALS_TTL)
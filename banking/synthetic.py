@@ -0,0 +1,264 @@
+import math
+import random
+from bisect import bisect_right
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import directory
+from .customer_import import account_numbers
+from .models import Account, Transaction, Transfer
+
+# Synthetic data for local performance work (manage.py generate_data).
+#
+# Creates users with accounts and a transaction history that looks like
+# production: a few busy accounts and a long tail of quiet ones, timestamps
+# spread over several years, transfers written the way ledger.transfer()
+# writes them (Transfer Out, Service Fee of 10-30%, Transfer In, plus a
+# Transfer journal row). Each account's history is simulated in time order
+# in integer cents, counting only its own deposits, withdrawals and interest
+# as spendable (incoming transfers only ever add to that), so no account
+# goes below zero at any point in time and every Account.balance equals the
+# sum of its ledger rows.
+#
+# Everything comes from one random.Random(seed): the same seed, counts and
+# start date give the same data. Rows are written with bulk_create,
+# batch_size rows at a time. Each batch is committed on its own together
+# with the balance changes it makes, so the database is never locked for
+# the whole run and an interrupted run leaves a smaller but consistent
+# data set.
+# All users share one password (hashed once), SYNTHETIC_PASSWORD, so any
+# of them can log in.
+
+SYNTHETIC_PASSWORD = 'Synthetic-pass-1'
+BATCH_SIZE = 10000  # Transaction rows per bulk_create (and per commit)
+
+# Mix of operations after the opening deposit
+OPERATION_WEIGHTS = {
+    'deposit': 35,
+    'withdrawal': 25,
+    'transfer': 32,
+    'interest': 8,
+}
+# Rows written per operation, to turn a row count into an operation count
+ROWS_PER_OPERATION = {'deposit': 1, 'withdrawal': 1, 'transfer': 3, 'interest': 1}
+# Transactions per account follow a Pareto distribution: about 20% of the
+# accounts make 80% of the transactions
+ACTIVITY_SHAPE = 1.16
+FIXED_SHARE = 0.15  # Share of Fixed Deposit accounts
+
+FIRST_NAMES = ['Aarav', 'Priya', 'Rahul', 'Ananya', 'Vikram', 'Sneha', 'Arjun', 'Kavya', 'Rohan', 'Isha']
+LAST_NAMES = ['Sharma', 'Patel', 'Iyer', 'Reddy', 'Singh', 'Gupta', 'Nair', 'Das', 'Mehta', 'Rao']
+
+
+def _amount(rng, median_rupees):
+    """
+    A log-normal amount in cents: most around the median, a few much larger.
+    """
+    return max(100, int(rng.lognormvariate(math.log(median_rupees * 100), 1.0)))
+
+
+def _cents(value):
+    return Decimal(value).scaleb(-2)
+
+
+@contextmanager
+def _keep_timestamps():
+    """
+    Transaction.timestamp is auto_now_add, which would stamp every row with
+    the current time. Switch that off while history is being written.
+    """
+    field = Transaction._meta.get_field('timestamp')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _activity(rng, accounts, operations):
+    """
+    Number of operations of each account: Pareto weights scaled to the total.
+    """
+    weights = [rng.paretovariate(ACTIVITY_SHAPE) for _ in range(accounts)]
+    scale = operations / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    # Hand out what rounding down left over to the busiest accounts
+    for i in sorted(range(accounts), key=lambda i: -weights[i])[:operations - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+class Generator:
+    """
+    Writes the data. Accounts get rows in order of joining, so a transfer
+    only ever goes to an account that already existed at that time.
+    """
+
+    def __init__(self, users, rows, seed=0, years=3, prefix='synth', batch_size=BATCH_SIZE, start=None):
+        self.rng = random.Random(seed)
+        self.users = users
+        self.rows = rows
+        self.prefix = prefix
+        self.batch_size = batch_size
+        # The history ends today unless a start date is given
+        first_day = start or timezone.localdate() - timedelta(days=365 * years)
+        self.start = timezone.make_aware(datetime.combine(first_day, time.min))
+        self.end = self.start + timedelta(days=365 * years)
+
+        self.account_ids = []
+        self.joined = []  # Seconds after self.start, ascending
+        self.fixed = []
+        self.current = None  # Index of the account being simulated
+        self.balance = 0  # Its spendable balance in cents
+        self.pending = []  # Transaction rows not written yet
+        self.journals = []  # (sender index, recipient index, amount, fee, first leg position in pending)
+        self.deltas = defaultdict(int)  # Account index -> balance change of the pending rows, in cents
+        self.written = 0
+
+    # ------------------------------------------
+    # Users and accounts
+    # ------------------------------------------
+
+    def create_accounts(self):
+        span = (self.end - self.start).total_seconds()
+        # The whole population joins over the first 80% of the period
+        self.joined = sorted(self.rng.uniform(0, span * 0.8) for _ in range(self.users))
+        self.fixed = [self.rng.random() < FIXED_SHARE for _ in range(self.users)]
+        password = make_password(SYNTHETIC_PASSWORD)
+
+        for first in range(0, self.users, self.batch_size):
+            indexes = range(first, min(first + self.batch_size, self.users))
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(
+                        username=f'{self.prefix}{i:08d}',
+                        first_name=self.rng.choice(FIRST_NAMES),
+                        last_name=self.rng.choice(LAST_NAMES),
+                        email=f'{self.prefix}{i:08d}@example.com',
+                        password=password,
+                        date_joined=self.start + timedelta(seconds=self.joined[i]),
+                    )
+                    for i in indexes
+                ])
+                accounts = Account.objects.bulk_create([
+                    Account(
+                        user=user,
+                        account_number=number,
+                        mobile_number=f'9{self.rng.randrange(10 ** 9):09d}',
+                        account_type='Fixed' if self.fixed[i] else 'Savings',
+                    )
+                    for i, user, number in zip(indexes, users, account_numbers(len(users)))
+                ])
+                directory.accounts_imported()
+            self.account_ids += [account.id for account in accounts]
+            yield len(self.account_ids)
+
+    # ------------------------------------------
+    # Transactions
+    # ------------------------------------------
+
+    def _row(self, index, cents, transaction_type, seconds):
+        self.pending.append(Transaction(
+            account_id=self.account_ids[index],
+            amount=_cents(cents),
+            transaction_type=transaction_type,
+            timestamp=self.start + timedelta(seconds=seconds),
+        ))
+        self.deltas[index] += cents if Transaction.is_credit(transaction_type) else -cents
+        if index == self.current:
+            self.balance += cents if Transaction.is_credit(transaction_type) else -cents
+
+    def _operation(self, index, seconds):
+        rng = self.rng
+        operation = rng.choices(list(OPERATION_WEIGHTS), weights=list(OPERATION_WEIGHTS.values()))[0]
+        balance = self.balance
+        if operation == 'withdrawal' and (self.fixed[index] or balance < 100):
+            operation = 'deposit'  # Fixed Deposits can't withdraw, nor can an empty account
+        if operation == 'transfer' and (balance < 200 or bisect_right(self.joined, seconds) < 2):
+            operation = 'deposit'
+
+        if operation == 'deposit':
+            self._row(index, _amount(rng, 2000), 'Deposit', seconds)
+        elif operation == 'withdrawal':
+            self._row(index, min(_amount(rng, 1500), balance), 'Withdrawal', seconds)
+        elif operation == 'interest':
+            self._row(index, max(1, balance * rng.randint(1, 50) // 10000), 'Interest', seconds)
+        else:
+            # Same fee as transfer_view: 10-30% on top of the amount, rounded half up
+            percentage = rng.randint(10, 30)
+            amount = min(_amount(rng, 1000), balance * 100 // (100 + percentage))
+            fee = (amount * percentage + 50) // 100
+            if amount < 1 or amount + fee > balance:
+                self._row(index, _amount(rng, 2000), 'Deposit', seconds)
+                return
+            # Somebody who had already joined
+            recipient = rng.randrange(bisect_right(self.joined, seconds) - 1)
+            if recipient >= index:
+                recipient += 1
+            self.journals.append((index, recipient, amount, fee, len(self.pending)))
+            self._row(index, amount, 'Transfer Out', seconds)
+            self._row(index, fee, 'Service Fee', seconds)
+            self._row(recipient, amount, 'Transfer In', seconds)
+
+    @transaction.atomic
+    def _flush(self):
+        """
+        Writes the pending rows and adds them to the balances, in one commit.
+        """
+        with _keep_timestamps():
+            rows = Transaction.objects.bulk_create(self.pending)
+        Transfer.objects.bulk_create([
+            Transfer(
+                sender_id=self.account_ids[sender],
+                recipient_id=self.account_ids[recipient],
+                amount=_cents(amount),
+                service_fee=_cents(fee),
+                transfer_out_id=rows[position].id,
+                fee_id=rows[position + 1].id,
+                transfer_in_id=rows[position + 2].id,
+                created_at=rows[position].timestamp,
+            )
+            for sender, recipient, amount, fee, position in self.journals
+        ])
+        # One prepared UPDATE run per account: a primary key lookup each
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {connection.ops.quote_name(Account._meta.db_table)} SET balance = balance + %s WHERE id = %s',
+                [(_cents(cents), self.account_ids[index]) for index, cents in self.deltas.items() if cents],
+            )
+        self.written += len(rows)
+        self.pending, self.journals, self.deltas = [], [], defaultdict(int)
+
+    def create_transactions(self):
+        """
+        Writes about `rows` transactions (an opening deposit per account,
+        then the operations) and the balances, committing every batch.
+        Yields the number of rows written after every batch.
+        """
+        span = (self.end - self.start).total_seconds()
+        average = sum(
+            ROWS_PER_OPERATION[op] * weight for op, weight in OPERATION_WEIGHTS.items()
+        ) / sum(OPERATION_WEIGHTS.values())
+        operations = max(0, int((self.rows - self.users) / average))
+        activity = _activity(self.rng, self.users, operations)
+
+        for index in range(self.users):
+            joined = self.joined[index]
+            self.current, self.balance = index, 0
+            self._row(index, _amount(self.rng, 5000), 'Deposit', joined)
+            moments = sorted(self.rng.uniform(joined, span) for _ in range(activity[index]))
+            for seconds in moments:
+                self._operation(index, seconds)
+                if len(self.pending) >= self.batch_size:
+                    self._flush()
+                    yield self.written
+        if self.pending:
+            self._flush()
+            yield self.written
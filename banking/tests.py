@@ -1,3 +1,1481 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import (
+    checkpoints, customer_import, dashboard_cache, directory, interest, ledger, outbox, profiling, purge, rollups,
+    shards, velocity,
+)
+from .admin import MAX_PAGES
+from .allocator import AccountNumberAllocator, has_valid_check_digit, is_well_formed
+from .forms import TransferForm
+from .models import (
+    Account, AccountPurge, BalanceShard, CustomerImport, DailyRollup, HourlyRollup, OutboxEmail, StatementChunk,
+    StatementRun, Transaction, Transfer,
+)
+from .pagination import InvalidCursor, encode_cursor, keyset_page
+from .statements import STATEMENT_FORMATS, csv_lines, statement_rows
+from .synthetic import Generator
+
+
+def make_account(username, balance='0', account_type='Savings'):
+    """
+    A user with an account. The opening balance goes in as a ledger deposit,
+    so the balance always equals the sum of the account's transactions.
+    """
+    user = User.objects.create_user(username, first_name=username.title())  # No password: no slow hashing
+    account = Account.objects.create(user=user, mobile_number='9000000000', account_type=account_type)
+    if Decimal(balance):
+        ledger.deposit(account, Decimal(balance))
+    return account
+
+
+def ledger_sum(account):
+    """
+    Balance recomputed from the account's transactions.
+    """
+    total = account.transactions.aggregate(total=Sum(Transaction.signed_amount()))['total']
+    return (total or Decimal('0')).quantize(Decimal('0.01'))
+
+
+def run_concurrently(*calls):
+    """
+    Runs every call in its own thread (own database connection), all
+    starting together. Returns what each returned, or the exception it raised.
+    """
+    barrier = threading.Barrier(len(calls))
+    results = [None] * len(calls)
+
+    def worker(i, call):
+        try:
+            barrier.wait()
+            results[i] = call()
+        except Exception as e:
+            results[i] = e
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i, call)) for i, call in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+# ==========================================
+# LEDGER
+# ==========================================
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_account('alice', '100')
+        self.bob = make_account('bob')
+
+    def test_deposit_and_withdraw(self):
+        ledger.deposit(self.alice, Decimal('50'))
+        self.assertEqual(self.alice.balance, Decimal('150'))
+        ledger.withdraw(self.alice, Decimal('30'))
+        self.assertEqual(self.alice.balance, Decimal('120'))
+        self.assertEqual(ledger_sum(self.alice), Decimal('120'))
+
+    def test_withdraw_more_than_balance_changes_nothing(self):
+        with self.assertRaises(ledger.InsufficientFunds):
+            ledger.withdraw(self.alice, Decimal('100.01'))
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.balance, Decimal('100'))
+        self.assertEqual(self.alice.transactions.count(), 1)
+
+    def test_fixed_deposit_cannot_withdraw(self):
+        fixed = make_account('carol', '10', account_type='Fixed')
+        with self.assertRaises(ledger.FixedDepositWithdrawal):
+            ledger.withdraw(fixed, Decimal('1'))
+
+    def test_transfer_writes_three_legs_and_a_journal(self):
+        journal = ledger.transfer(self.alice, self.bob, Decimal('50'), service_fee=Decimal('10'))
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.balance, self.bob.balance), (Decimal('40'), Decimal('50')))
+        self.assertEqual(
+            [journal.transfer_out.transaction_type, journal.fee.transaction_type, journal.transfer_in.transaction_type],
+            ['Transfer Out', 'Service Fee', 'Transfer In'],
+        )
+        self.assertEqual(ledger_sum(self.alice), self.alice.balance)
+        self.assertEqual(ledger_sum(self.bob), self.bob.balance)
+
+    def test_transfer_fee_counts_against_the_balance(self):
+        with self.assertRaises(ledger.InsufficientFunds):
+            ledger.transfer(self.alice, self.bob, Decimal('95'), service_fee=Decimal('10'))
+        self.assertFalse(Transfer.objects.exists())
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.balance, 0)
+
+    def test_self_transfer(self):
+        with self.assertRaises(ledger.SelfTransfer):
+            ledger.transfer(self.alice, self.alice, Decimal('1'))
+
+    def test_transfer_to_closed_account(self):
+        Account.objects.filter(id=self.bob.id).update(closed_at='2026-01-01T00:00:00Z')
+        with self.assertRaises(ledger.AccountNotFound):
+            ledger.transfer(self.alice, self.bob, Decimal('1'))
+
+    def test_random_service_fee_is_10_to_30_percent(self):
+        for _ in range(20):
+            fee = ledger.service_fee_for(Decimal('100'))
+            self.assertTrue(Decimal('10') <= fee <= Decimal('30'))
+
+    def test_batch_transfer_accepts_what_the_balance_covers(self):
+        carol = make_account('carol')
+        results = ledger.batch_transfer(self.alice, [
+            (self.bob.account_number, Decimal('40')),
+            ('0000000000', Decimal('1')),
+            (self.alice.account_number, Decimal('1')),
+            (carol.account_number, Decimal('1000')),
+        ])
+        self.assertEqual([r['status'] for r in results], ['ok', 'rejected', 'rejected', 'rejected'])
+        for account in (self.alice, self.bob, carol):
+            account.refresh_from_db()
+            self.assertEqual(ledger_sum(account), account.balance)
+        self.assertEqual(self.bob.balance, Decimal('40'))
+
+    def test_batch_transfer_recipient_deleted_before_locking(self):
+        carol = make_account('carol')
+        real_lock = ledger.lock_accounts
+
+        def delete_then_lock(*ids):
+            Account.objects.filter(id=carol.id).delete()
+            return real_lock(*ids)
+
+        with mock.patch.object(ledger, 'lock_accounts', delete_then_lock):
+            results = ledger.batch_transfer(self.alice, [
+                (carol.account_number, Decimal('10')),
+                (self.bob.account_number, Decimal('10')),
+            ])
+        self.assertEqual([r['status'] for r in results], ['rejected', 'ok'])
+        self.assertEqual(results[0]['error'], str(ledger.AccountNotFound()))
+        self.alice.refresh_from_db()
+        self.assertEqual(ledger_sum(self.alice), self.alice.balance)
+
+
+class LedgerConcurrencyTests(TransactionTestCase):
+    """
+    Several connections at once: the row locks and conditional UPDATEs must
+    keep any interleaving from spending the same money twice.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.alice = make_account('alice', '100')
+        self.bob = make_account('bob')
+
+    def assert_consistent(self, *accounts):
+        for account in accounts:
+            account.refresh_from_db()
+            self.assertGreaterEqual(account.balance, 0)
+            self.assertEqual(ledger_sum(account), account.balance)
+
+    def test_concurrent_withdrawals_do_not_overdraw(self):
+        results = run_concurrently(*[
+            lambda: ledger.withdraw(Account.objects.get(id=self.alice.id), Decimal('80'))
+            for _ in range(4)
+        ])
+        failures = [r for r in results if isinstance(r, Exception)]
+        self.assertEqual(len(failures), 3)
+        self.assertTrue(all(isinstance(r, ledger.InsufficientFunds) for r in failures), failures)
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.balance, Decimal('20'))
+        self.assert_consistent(self.alice)
+
+    def test_concurrent_transfers_do_not_double_spend(self):
+        results = run_concurrently(*[
+            lambda: ledger.transfer(self.alice, self.bob, Decimal('30'), service_fee=Decimal('5'))
+            for _ in range(5)
+        ])
+        succeeded = [r for r in results if isinstance(r, Transfer)]
+        self.assertEqual(len(succeeded), 2)  # 2 x 35 fits in 100, a third doesn't
+        self.assertTrue(all(
+            isinstance(r, (Transfer, ledger.InsufficientFunds)) for r in results
+        ), results)
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.balance, self.bob.balance), (Decimal('30'), Decimal('60')))
+        self.assert_consistent(self.alice, self.bob)
+
+    def test_opposite_transfers_do_not_deadlock(self):
+        ledger.deposit(self.bob, Decimal('100'))
+        results = run_concurrently(*[
+            (lambda: ledger.transfer(self.alice, self.bob, Decimal('10'), service_fee=Decimal('1')))
+            if i % 2 else
+            (lambda: ledger.transfer(self.bob, self.alice, Decimal('10'), service_fee=Decimal('1')))
+            for i in range(6)
+        ])
+        self.assertTrue(all(isinstance(r, Transfer) for r in results), results)
+        self.assert_consistent(self.alice, self.bob)
+
+
+# ==========================================
+# HISTORY PAGINATION
+# ==========================================
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.account = make_account('alice')
+        for amount in range(1, 8):
+            ledger.deposit(self.account, Decimal(amount))
+        # Ties on timestamp: the id must decide the order
+        Transaction.objects.filter(amount__lte=4).update(timestamp='2026-01-01T10:00:00Z')
+        self.newest_first = list(
+            self.account.transactions.order_by('-timestamp', '-id').values_list('id', flat=True)
+        )
+
+    def walk(self, page_size):
+        ids, cursor = [], None
+        while True:
+            page = keyset_page(self.account.transactions.all(), ('-timestamp', '-id'), cursor, page_size)
+            ids += [t.id for t in page.items]
+            if not page.has_next:
+                return ids
+            cursor = page.next_cursor
+
+    def test_pages_cover_every_row_once_in_order(self):
+        for page_size in (1, 2, 3, 7, 10):
+            self.assertEqual(self.walk(page_size), self.newest_first, page_size)
+
+    def test_last_page_has_no_cursor(self):
+        page = keyset_page(self.account.transactions.all(), ('-timestamp', '-id'), None, 7)
+        self.assertEqual(len(page.items), 7)
+        self.assertIsNone(page.next_cursor)
+
+    def test_invalid_cursor(self):
+        for cursor in ('garbage', encode_cursor([1]), encode_cursor(['not a date', 'x'])):
+            with self.assertRaises(InvalidCursor):
+                keyset_page(self.account.transactions.all(), ('-timestamp', '-id'), cursor)
+
+    def test_history_api(self):
+        self.client.force_login(self.account.user)
+        response = self.client.get('/api/history/', {'limit': 4})
+        first = response.json()
+        self.assertEqual([t['id'] for t in first['transactions']], self.newest_first[:4])
+        response = self.client.get('/api/history/', {'limit': 4, 'cursor': first['next_cursor']})
+        second = response.json()
+        self.assertEqual([t['id'] for t in second['transactions']], self.newest_first[4:])
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(self.client.get('/api/history/', {'cursor': 'garbage'}).status_code, 400)
+
+    def test_history_api_refuses_admins(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        self.assertEqual(self.client.get('/api/history/').status_code, 403)
+
+
+# ==========================================
+# STATEMENT EXPORT
+# ==========================================
+
+class StatementTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_account('alice', '100')
+        self.bob = make_account('bob')
+        ledger.transfer(self.alice, self.bob, Decimal('20'), service_fee=Decimal('4'))
+        ledger.withdraw(self.alice, Decimal('6'))
+
+    def test_running_balance(self):
+        rows = list(statement_rows(self.alice))
+        self.assertEqual(
+            [(transaction_type, amount, balance) for _, _, transaction_type, amount, balance in rows],
+            [
+                ('Deposit', Decimal('100'), Decimal('100')),
+                ('Transfer Out', Decimal('-20'), Decimal('80')),
+                ('Service Fee', Decimal('-4'), Decimal('76')),
+                ('Withdrawal', Decimal('-6'), Decimal('70')),
+            ],
+        )
+        self.alice.refresh_from_db()
+        self.assertEqual(rows[-1][-1], self.alice.balance)
+
+    def test_period_starts_from_the_balance_at_start(self):
+        Transaction.objects.filter(account=self.alice, transaction_type='Deposit').update(
+            timestamp='2026-01-01T00:00:00Z'
+        )
+        start = timezone.make_aware(datetime(2026, 1, 2))
+        rows = list(statement_rows(self.alice, start=start))
+        self.assertEqual(rows[0][2:], ('Transfer Out', Decimal('-20'), Decimal('80')))
+
+    def test_header_goes_out_before_the_query(self):
+        lines = csv_lines(self.alice)
+        with self.assertNumQueries(0):
+            self.assertEqual(next(lines), 'id,timestamp,transaction_type,amount,balance\r\n')
+        self.assertEqual(len(list(lines)), 4)
+
+    def test_export_view_streams(self):
+        self.client.force_login(self.alice.user)
+        response = self.client.get('/statement/', {'format': 'jsonl'})
+        self.assertTrue(response.streaming)
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(lines[0]['account_number'], self.alice.account_number)
+        self.assertEqual(lines[-1]['balance'], '70.00')
+        self.assertEqual(self.client.get('/statement/', {'format': 'xml'}).status_code, 400)
+
+
+# ==========================================
+# ACCOUNT NUMBERS
+# ==========================================
+
+class AccountNumberTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_account('alice', '100')
+        self.bob = make_account('bob')
+
+    def typo(self, number):
+        return number[:-1] + str((int(number[-1]) + 1) % 10)
+
+    def test_new_numbers_carry_a_check_digit(self):
+        self.assertTrue(has_valid_check_digit(self.bob.account_number))
+
+    def test_typo_is_rejected_by_the_check_digit(self):
+        form = TransferForm({'recipient_account': self.typo(self.bob.account_number), 'amount': '10'})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['recipient_account'], ['Invalid account number!'])
+
+    def test_legacy_number_without_check_digit(self):
+        legacy = self.typo(self.bob.account_number)
+        Account.objects.filter(id=self.bob.id).update(account_number=legacy)
+        self.assertTrue(is_well_formed(legacy))
+        form = TransferForm({'recipient_account': legacy, 'amount': '10'})
+        self.assertTrue(form.is_valid(), form.errors)
+        with self.settings(ACCOUNT_NUMBER_LEGACY_LOOKUP=False):
+            self.assertFalse(is_well_formed(legacy))
+
+    def test_blocks_without_update_returning(self):
+        # MariaDB: INSERT ... RETURNING but no UPDATE ... RETURNING
+        allocator = AccountNumberAllocator(block_size=3)
+        first = allocator.allocate(1)
+        with mock.patch.object(connection, 'vendor', 'mysql'), CaptureQueriesContext(connection) as queries:
+            numbers = allocator.allocate(4)
+        self.assertFalse([query['sql'] for query in queries.captured_queries if 'RETURNING' in query['sql']])
+        serials = [int(number[:-1]) for number in first + numbers]
+        self.assertEqual(serials, list(range(serials[0], serials[0] + 5)))
+        self.assertTrue(all(has_valid_check_digit(number) for number in numbers))
+
+
+# ==========================================
+# BALANCE CHECKPOINTS
+# ==========================================
+
+class CheckpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_account('alice', '100')
+        ledger.withdraw(self.alice, Decimal('30'))
+        Transaction.objects.update(timestamp='2026-01-01T06:00:00Z')
+
+    def fold_all(self):
+        run = checkpoints.start_run()
+        while run and run.finished_at is None:
+            checkpoints.fold_chunk(run, 1000)
+
+    def test_balance_as_of(self):
+        self.fold_all()
+        ledger.deposit(self.alice, Decimal('5'))  # Not folded yet
+        now = timezone.now()
+        self.assertEqual(checkpoints.balance_as_of(self.alice, now), Decimal('75'))
+        day_after = timezone.make_aware(datetime(2026, 1, 2))
+        self.assertEqual(checkpoints.balance_as_of(self.alice, day_after), Decimal('70'))
+
+    def test_fold_committing_during_the_read_is_not_counted_twice(self):
+        self.fold_all()
+        ledger.deposit(self.alice, Decimal('5'))
+        Transaction.objects.filter(amount=5).update(timestamp='2026-01-01T07:00:00Z')
+        real_watermark = checkpoints.watermark
+        calls = []
+
+        def watermark_then_fold():
+            calls.append(1)
+            value = real_watermark()
+            if len(calls) == 1:
+                self.fold_all()  # Lands between the watermark and the checkpoint read
+            return value
+
+        with mock.patch.object(checkpoints, 'watermark', watermark_then_fold):
+            balance = checkpoints.balance_as_of(self.alice, timezone.now())
+        self.assertEqual(balance, Decimal('75'))
+
+
+# ==========================================
+# EMAIL OUTBOX
+# ==========================================
+
+class OutboxTests(TestCase):
+    def test_reset_queues_the_otp_instead_of_sending_it(self):
+        User.objects.create_user('alice', 'alice@example.com')
+        response = self.client.post('/forgot-password/', {'email': 'alice@example.com'})
+        self.assertRedirects(response, '/verify-otp/', fetch_redirect_response=False)
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.to, 'alice@example.com')
+        self.assertIn(self.client.session['reset_otp'], email.body)
+
+    def test_rolled_back_email_is_never_sent(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            outbox.enqueue_mail('Hello', 'Your OTP is 123456', ['a@example.com'])
+            raise RuntimeError
+        self.assertFalse(OutboxEmail.objects.exists())
+        self.assertEqual(outbox.send_batch(), (0, 0))
+
+    def test_send_outbox_delivers_and_purges_the_body(self):
+        outbox.enqueue_mail('Password Reset OTP', 'Your OTP is 123456', ['a@example.com', 'b@example.com'])
+        call_command('send_outbox', '--once', stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['a@example.com', 'b@example.com'])
+        self.assertEqual(mail.outbox[0].body, 'Your OTP is 123456')
+        email = OutboxEmail.objects.get()
+        self.assertEqual((email.status, email.attempts, email.body), (OutboxEmail.SENT, 1, ''))
+        self.assertEqual(outbox.send_batch(), (0, 0))  # Not sent twice
+
+    @override_settings(OUTBOX_LOG_UNDELIVERED=True)
+    def test_failures_back_off_then_give_up(self):
+        email = outbox.enqueue_mail('Password Reset OTP', 'Your OTP is 123456', ['a@example.com'])
+        unreachable = mock.Mock(**{'open.side_effect': OSError('Network is unreachable')})
+        delays = []
+        with mock.patch.object(outbox, 'get_connection', return_value=unreachable):
+            with self.assertLogs('banking.outbox', 'WARNING') as logs:
+                for attempt in range(outbox.MAX_ATTEMPTS):
+                    before = timezone.now()
+                    self.assertEqual(outbox.send_batch(), (0, 1))
+                    self.assertEqual(outbox.send_batch(), (0, 0))  # Not due yet
+                    email.refresh_from_db()
+                    delays.append(email.next_attempt_at - before)
+                    OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        # The first failure logs the OTP once (SMTP blocked fallback)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('123456', logs.output[0])
+        for attempt, delay in enumerate(delays[:-1]):
+            expected = timedelta(seconds=outbox.RETRY_BASE_SECONDS * 2 ** attempt)
+            self.assertLess(abs(delay - expected), timedelta(seconds=5))
+        self.assertEqual((email.status, email.attempts, email.body), (OutboxEmail.FAILED, outbox.MAX_ATTEMPTS, ''))
+        self.assertIn('Network is unreachable', email.last_error)
+        self.assertEqual(len(mail.outbox), 0)
+
+
+# ==========================================
+# DASHBOARD CACHE
+# ==========================================
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_account('alice', '100')
+
+    def test_unchanged_dashboard_is_served_from_the_cache(self):
+        first = dashboard_cache.get_dashboard(self.alice.user_id)
+        with self.assertNumQueries(1):  # Only the version check
+            self.assertEqual(dashboard_cache.get_dashboard(self.alice.user_id), first)
+
+    def test_write_without_invalidation_is_seen(self):
+        # Another worker or a management command: this process's cache is not told
+        first = dashboard_cache.get_dashboard(self.alice.user_id)
+        with mock.patch.object(dashboard_cache, 'invalidate'):
+            ledger.deposit(self.alice, Decimal('25'))
+        data = dashboard_cache.get_dashboard(self.alice.user_id)
+        self.assertEqual(data['account']['balance'], Decimal('125.00'))
+        self.assertNotEqual(data['etag'], first['etag'])
+
+    def test_etag_changes_after_a_write_from_elsewhere(self):
+        self.client.force_login(self.alice.user)
+        etag = self.client.get('/dashboard/')['ETag']
+        self.assertEqual(self.client.get('/dashboard/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with mock.patch.object(dashboard_cache, 'invalidate'):
+            ledger.withdraw(self.alice, Decimal('10'))
+        response = self.client.get('/dashboard/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '90.00')
+
+
+# Not process-local, like Redis
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': os.path.join(tempfile.gettempdir(), 'scambank-test-cache'),
+}})
+class SharedDashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_account('alice', '100')
+
+    def test_cache_hit_runs_no_query(self):
+        first = dashboard_cache.get_dashboard(self.alice.user_id)
+        with self.assertNumQueries(0):
+            self.assertEqual(dashboard_cache.get_dashboard(self.alice.user_id), first)
+
+    def test_write_invalidates(self):
+        dashboard_cache.get_dashboard(self.alice.user_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            ledger.deposit(self.alice, Decimal('25'))
+        self.assertEqual(dashboard_cache.get_dashboard(self.alice.user_id)['account']['balance'], Decimal('125.00'))
+
+    def test_write_during_a_rebuild_is_not_cached(self):
+        build = dashboard_cache.build
+
+        def build_then_write(user_id):
+            data = build(user_id)
+            # Its invalidate() ran before the rebuild reached cache.set()
+            with mock.patch.object(dashboard_cache, 'invalidate'):
+                ledger.deposit(self.alice, Decimal('25'))
+            return data
+
+        with mock.patch.object(dashboard_cache, 'build', side_effect=build_then_write):
+            dashboard_cache.get_dashboard(self.alice.user_id)
+        self.assertIsNone(cache.get(dashboard_cache.cache_key(self.alice.user_id)))
+        self.assertEqual(dashboard_cache.get_dashboard(self.alice.user_id)['account']['balance'], Decimal('125.00'))
+
+    def test_admin_edits_invalidate(self):
+        dashboard_cache.get_dashboard(self.alice.user_id)
+        self.alice.account_type = 'Fixed'
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.site._registry[Account].save_model(None, self.alice, None, True)
+        self.assertEqual(dashboard_cache.get_dashboard(self.alice.user_id)['account']['account_type'], 'Fixed')
+
+        deposit = self.alice.transactions.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.site._registry[Transaction].delete_model(None, deposit)
+        self.assertEqual(dashboard_cache.get_dashboard(self.alice.user_id)['transactions'], [])
+
+
+# ==========================================
+# REQUEST PROFILING
+# ==========================================
+
+@override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_FLUSH_SECONDS=0.05)
+class ProfilingTests(TestCase):
+    def test_samples_are_flushed_outside_the_request(self):
+        alice = make_account('alice', '100')
+        self.client.force_login(alice.user)
+        flushed = threading.Event()
+        flushed_by = []
+
+        def record(samples):
+            flushed_by.append((threading.current_thread(), samples))
+            flushed.set()
+
+        profiling.buffer.drain()
+        with mock.patch.object(profiling, 'flush', side_effect=record):
+            self.client.get('/dashboard/')
+            self.assertTrue(flushed.wait(5))
+        thread, samples = flushed_by[0]
+        self.assertIsNot(thread, threading.current_thread())
+        sample = samples[0]
+        self.assertEqual(sample['url_name'], 'dashboard')
+        self.assertGreater(sample['queries'], 0)
+        self.assertAlmostEqual(sample['db_ms'] + sample['app_ms'], sample['total_ms'])
+
+
+# ==========================================
+# METRICS
+# ==========================================
+
+class MetricsTests(TestCase):
+    @override_settings(METRICS_TOKEN=None)
+    def test_without_a_token_only_loopback_is_answered(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='127.0.0.1').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.7').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token_is_required_when_set(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret', REMOTE_ADDR='203.0.113.7')
+        self.assertEqual(response.status_code, 200)
+
+
+# ==========================================
+# READ REPLICA
+# ==========================================
+
+class SyncReplicaTests(TestCase):
+    def databases_in(self, folder):
+        primary = os.path.join(folder, 'primary.sqlite3')
+        with sqlite3.connect(primary) as db:
+            db.execute('CREATE TABLE t (x)')
+            db.executemany('INSERT INTO t VALUES (?)', [(i,) for i in range(5000)])
+        engine = 'django.db.backends.sqlite3'
+        return {
+            'default': mock.Mock(settings_dict={'ENGINE': engine, 'NAME': primary}),
+            'replica': mock.Mock(settings_dict={'ENGINE': engine, 'NAME': os.path.join(folder, 'replica.sqlite3')}),
+        }
+
+    def sync(self, folder, **overrides):
+        out, err = io.StringIO(), io.StringIO()
+        command = 'banking.management.commands.sync_replica'
+        with mock.patch(f'{command}.replica_available', return_value=True), \
+                mock.patch(f'{command}.connections', self.databases_in(folder)), \
+                override_settings(**overrides):
+            call_command('sync_replica', stdout=out, stderr=err)
+        with sqlite3.connect(os.path.join(folder, 'replica.sqlite3')) as db:
+            self.assertEqual(db.execute('SELECT count(*) FROM t').fetchone(), (5000,))
+        return err.getvalue()
+
+    def test_copies_the_database(self):
+        with tempfile.TemporaryDirectory() as folder:
+            self.assertEqual(self.sync(folder, REPLICA_PIN_SECONDS=60), '')
+
+    def test_warns_when_the_lag_outgrows_the_pin(self):
+        with tempfile.TemporaryDirectory() as folder:
+            self.assertIn('REPLICA_PIN_SECONDS=0', self.sync(folder, REPLICA_PIN_SECONDS=0))
+
+
+# ==========================================
+# RECIPIENT DIRECTORY
+# ==========================================
+
+@mock.patch.object(directory, 'INDEX_CHECK_SECONDS', 0)
+class DirectoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(directory, 'index', directory.DirectoryIndex())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.alice = make_account('alice')
+
+    def test_sees_accounts_created_by_other_processes(self):
+        self.assertEqual(directory.search(self.alice.account_number[:8]), [(self.alice.account_number, 'A***')])
+        # Created elsewhere: this process's cache never gets the change
+        cache.clear()
+        bob = make_account('bob')
+        self.assertIn((bob.account_number, 'B***'), directory.search(bob.account_number[:8]))
+
+    def test_closed_accounts_drop_out_on_reload(self):
+        directory.search(self.alice.account_number[:8])
+        Account.objects.filter(id=self.alice.id).update(closed_at=timezone.now())
+        with mock.patch.object(directory, 'INDEX_RELOAD_SECONDS', 0):
+            self.assertEqual(directory.search(self.alice.account_number[:8]), [])
+
+    def test_search_needs_most_of_the_number(self):
+        self.assertEqual(directory.search(self.alice.account_number[:7]), [])
+        self.assertEqual(len(directory.search(self.alice.account_number)), 1)
+
+    def test_searches_are_rate_limited(self):
+        bob = make_account('bob')
+        self.client.force_login(bob.user)
+        url = '/api/recipients/?q=' + self.alice.account_number
+        for _ in range(directory.SEARCHES_PER_MINUTE):
+            response = self.client.get(url)
+            self.assertEqual(response.json()['results'][0]['account_number'], self.alice.account_number)
+        self.assertEqual(self.client.get(url).status_code, 429)
+
+
+# ==========================================
+# ASGI ENTRY POINT
+# ==========================================
+
+class AsgiTests(TransactionTestCase):
+    def get(self, path, on_message):
+        """
+        Runs a GET as the logged-in client through scambank_project.asgi,
+        passing every message sent back to on_message.
+        """
+        from scambank_project.asgi import application
+
+        cookie = '; '.join(f'{name}={morsel.value}' for name, morsel in self.client.cookies.items())
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+            'method': 'GET', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+
+        requests = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            await asyncio.Event().wait()  # The client stays connected
+
+        async def send(message):
+            on_message(message)
+
+        async_to_sync(application)(scope, receive, send)
+
+    def test_statement_streams_before_the_last_row_is_read(self):
+        alice = make_account('alice', '100')
+        for _ in range(30):
+            ledger.deposit(alice, Decimal('1'))
+        self.client.force_login(alice.user)
+        produced = []
+        lines_at_first_chunk = []
+        body = []
+
+        def counted_lines(*args):
+            for line in csv_lines(*args):
+                produced.append(line)
+                yield line
+
+        def on_message(message):
+            if message['type'] == 'http.response.start':
+                self.assertEqual(message['status'], 200)
+            elif message.get('body'):
+                if not body:
+                    lines_at_first_chunk.append(len(produced))
+                body.append(message['body'])
+
+        with mock.patch.dict(STATEMENT_FORMATS, {'csv': (counted_lines, 'text/csv', 'csv')}), \
+                mock.patch('banking.statements.STATEMENT_CHUNK_SIZE', 5):
+            self.get('/statement/', on_message)
+        self.assertEqual(lines_at_first_chunk, [1])  # The header went out before any row was read
+        self.assertEqual(b''.join(body).decode().count('\n'), len(produced))
+        self.assertEqual(len(produced), 32)  # Header, opening deposit, 30 deposits
+
+    def test_no_persistent_connections_under_asgi(self):
+        # A fresh interpreter: settings are read when asgi.py is imported
+        code = (
+            'import scambank_project.asgi\n'
+            'from django.db import connections\n'
+            "print(connections['default'].settings_dict['CONN_MAX_AGE'])"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', code], capture_output=True, text=True, check=True,
+            env={**os.environ, 'DB_CONN_MAX_AGE': '60'}, cwd=settings.BASE_DIR,
+        )
+        self.assertEqual(result.stdout.strip(), '0')
+
+
+# ==========================================
+# SYNTHETIC DATA
+# ==========================================
+
+class SyntheticDataTests(TestCase):
+    def generate(self, prefix, **options):
+        generator = Generator(20, 400, seed=3, prefix=prefix, batch_size=50, **options)
+        for _ in generator.create_accounts():
+            pass
+        for _ in generator.create_transactions():
+            pass
+        return list(
+            Transaction.objects.filter(account__user__username__startswith=prefix).order_by('id')
+            .values_list('transaction_type', 'amount', 'timestamp')
+        )
+
+    def test_same_seed_and_start_give_the_same_data(self):
+        first = self.generate('one', start=date(2024, 1, 1))
+        self.assertEqual(self.generate('two', start=date(2024, 1, 1)), first)
+        self.assertEqual(timezone.localtime(min(row[2] for row in first)).year, 2024)
+
+    def test_every_batch_commits_consistent_balances(self):
+        generator = Generator(20, 400, seed=3, batch_size=50)
+        for _ in generator.create_accounts():
+            pass
+        batches = generator.create_transactions()
+        next(batches)
+        next(batches)  # Stopped halfway: what was committed so far adds up
+        for account in Account.objects.all():
+            self.assertEqual(account.balance, ledger_sum(account))
+
+
+# ==========================================
+# VELOCITY LIMITS
+# ==========================================
+
+@override_settings(VELOCITY_LIMITS={'Savings': {'payments_per_minute': 3, 'amount_per_day': 1000}})
+class VelocityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_account('alice', '5000')
+        self.bob = make_account('bob')
+
+    def pay(self, amount, payments=1):
+        with velocity.reserve(self.alice, Decimal(amount), payments):
+            pass
+
+    def test_payments_per_minute(self):
+        for _ in range(3):
+            self.pay('1')
+        with self.assertRaisesMessage(velocity.LimitExceeded, 'at most 3 per minute'):
+            self.pay('1')
+
+    def test_amount_per_day(self):
+        self.pay('600')
+        with self.assertRaisesMessage(velocity.LimitExceeded, 'Daily limit'):
+            self.pay('500')
+        self.pay('400')  # The refused payment wasn't counted
+
+    def test_windows_move_on(self):
+        with mock.patch('banking.velocity.time.time', return_value=1_000_000):
+            for _ in range(3):
+                self.pay('300')
+        with mock.patch('banking.velocity.time.time', return_value=1_000_000 + 60):
+            self.pay('1')  # A minute later: new payments, but the same day
+            with self.assertRaises(velocity.LimitExceeded):
+                self.pay('200')
+        with mock.patch('banking.velocity.time.time', return_value=1_000_000 + 24 * 60 * 60):
+            self.pay('900')
+
+    def test_counters_released_when_the_payment_fails(self):
+        for _ in range(3):
+            with self.assertRaises(ledger.InsufficientFunds):
+                with velocity.reserve(self.alice, Decimal('300')):
+                    ledger.withdraw(self.alice, Decimal('9000'))
+        for _ in range(3):
+            self.pay('300')
+
+    def test_cache_failure_refuses_the_payment(self):
+        with mock.patch.object(velocity.cache, 'incr', side_effect=ConnectionError('down')), \
+                self.assertLogs('banking.velocity', 'ERROR'):
+            with self.assertRaises(velocity.LimiterUnavailable):
+                self.pay('1')
+
+    def test_batch_counts_every_line(self):
+        self.client.force_login(self.alice.user)
+        transfers = [{'recipient_account': self.bob.account_number, 'amount': '10'}] * 4
+        response = self.client.post(
+            '/api/transfers/batch/', json.dumps({'transfers': transfers}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(ledger_sum(self.bob), Decimal('0'))
+
+        response = self.client.post(
+            '/api/transfers/batch/', json.dumps({'transfers': transfers[:3]}), content_type='application/json'
+        )
+        self.assertEqual(response.json()['accepted'], 3)
+        with self.assertRaises(velocity.LimitExceeded):
+            self.pay('1')  # The batch used up the minute
+
+    def test_batch_over_the_daily_amount_is_refused(self):
+        self.client.force_login(self.alice.user)
+        csv_file = io.BytesIO(f'{self.bob.account_number},600\n{self.bob.account_number},600\n'.encode())
+        csv_file.name = 'pay.csv'
+        response = self.client.post('/transfer/batch/', {'csv_file': csv_file})
+        self.assertContains(response, 'Daily limit')
+        self.assertEqual(ledger_sum(self.bob), Decimal('0'))
+
+    def test_batch_released_when_the_ledger_raises(self):
+        self.client.force_login(self.alice.user)
+        transfers = [{'recipient_account': self.bob.account_number, 'amount': '300'}] * 3
+        with mock.patch.object(ledger, 'batch_transfer', side_effect=RuntimeError('database down')):
+            with self.assertRaises(RuntimeError):
+                self.client.post(
+                    '/api/transfers/batch/', json.dumps({'transfers': transfers}), content_type='application/json'
+                )
+        for _ in range(3):
+            self.pay('300')
+
+
+# ==========================================
+# INTEREST
+# ==========================================
+
+# 0.1% a day below 1000, 0.2% a day from 1000 on
+DAILY_RATES = {'Savings': {'compounding': 'daily', 'tiers': [(0, '0.365'), (1000, '0.730')]}}
+
+
+@override_settings(INTEREST_RATES=DAILY_RATES)
+class InterestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.below = make_account('below', '999.99')
+        self.at = make_account('at', '1000')
+        self.above = make_account('above', '2000')
+
+    def accrue(self, day, chunk_size=interest.CHUNK_SIZE):
+        run = interest.start_run(day, chunk_size)
+        return dict(interest.run_interest(run)), run
+
+    def credited(self, account):
+        return list(account.transactions.filter(transaction_type='Interest').values_list('amount', flat=True))
+
+    def test_tiers_at_their_boundaries(self):
+        self.accrue(date(2026, 3, 10))
+        self.assertEqual(self.credited(self.below), [Decimal('1.00')])  # 0.99999, lower tier
+        self.assertEqual(self.credited(self.at), [Decimal('2.00')])
+        self.assertEqual(self.credited(self.above), [Decimal('4.00')])
+        for account in (self.below, self.at, self.above):
+            self.assertEqual(ledger_sum(account), Account.objects.get(id=account.id).balance)
+
+    def test_same_day_again_credits_nothing(self):
+        self.accrue(date(2026, 3, 10))
+        results, run = self.accrue(date(2026, 3, 10))
+        self.assertEqual(results, {})
+        self.assertIsNotNone(run.finished_at)
+        for start_id in run.chunks.values_list('start_id', flat=True):
+            self.assertIsNone(interest.process_chunk(run, start_id, interest.rate_tables()))
+        self.assertEqual(Transaction.objects.filter(transaction_type='Interest').count(), 3)
+
+    def test_crashed_run_resumes_with_the_missing_chunks(self):
+        run = interest.start_run(date(2026, 3, 10), chunk_size=1)
+        real_credit = ledger.credit_interest
+        calls = []
+
+        def crash_on_second_chunk(amounts):
+            calls.append(amounts)
+            if len(calls) == 2:
+                raise RuntimeError('worker killed')
+            real_credit(amounts)
+
+        with mock.patch.object(ledger, 'credit_interest', crash_on_second_chunk):
+            with self.assertRaises(RuntimeError):
+                list(interest.run_interest(run))
+        self.assertEqual(run.chunks.count(), 1)
+        self.assertEqual(len(self.credited(self.at)), 0)  # Its chunk rolled back
+
+        list(interest.run_interest(run))
+        run.refresh_from_db()
+        self.assertIsNotNone(run.finished_at)
+        for account in (self.below, self.at, self.above):
+            self.assertEqual(len(self.credited(account)), 1)
+
+    def test_credit_days(self):
+        self.assertTrue(interest.is_credit_day('daily', date(2026, 3, 10)))
+        self.assertFalse(interest.is_credit_day('monthly', date(2026, 3, 30)))
+        self.assertTrue(interest.is_credit_day('monthly', date(2026, 2, 28)))
+        self.assertFalse(interest.is_credit_day('quarterly', date(2026, 2, 28)))
+        self.assertTrue(interest.is_credit_day('quarterly', date(2026, 3, 31)))
+        self.assertTrue(interest.is_credit_day('quarterly', date(2026, 12, 31)))
+
+    @override_settings(INTEREST_RATES={'Savings': {'compounding': 'monthly', 'tiers': [(0, '0.365')]}})
+    def test_monthly_accrues_daily_and_credits_at_month_end(self):
+        self.accrue(date(2026, 3, 29))
+        self.accrue(date(2026, 3, 30))
+        self.assertEqual(self.credited(self.above), [])
+        self.assertEqual(Account.objects.get(id=self.above.id).accrued_interest, Decimal('4.00'))
+        self.accrue(date(2026, 3, 31))
+        self.assertEqual(self.credited(self.above), [Decimal('6.00')])
+        self.assertEqual(Account.objects.get(id=self.above.id).accrued_interest, Decimal('0'))
+
+    @override_settings(INTEREST_RATES={'Savings': {'compounding': 'quarterly', 'tiers': [(0, '0.365')]}})
+    def test_quarterly_credits_only_at_quarter_end(self):
+        self.accrue(date(2026, 2, 28))
+        self.assertEqual(self.credited(self.above), [])
+        self.accrue(date(2026, 3, 31))
+        self.assertEqual(self.credited(self.above), [Decimal('4.00')])
+
+
+# ==========================================
+# BALANCE SHARDS
+# ==========================================
+
+class ShardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_account('alice', '1000')
+        self.shop = make_account('shop', '100')
+        shards.set_shards(self.shop, 4)
+
+    def pay_shop(self, *amounts):
+        for amount in amounts:
+            ledger.transfer(self.alice, self.shop, Decimal(amount), service_fee=Decimal('1'))
+
+    def state(self):
+        base = Account.objects.get(id=self.shop.id).balance
+        held = list(BalanceShard.objects.filter(account=self.shop).values_list('balance', flat=True))
+        total = Account.objects.annotate(total=Account.total_balance()).get(id=self.shop.id).total
+        return base, held, total
+
+    def test_credit_lands_on_a_shard(self):
+        self.pay_shop('50')
+        base, held, total = self.state()
+        self.assertEqual(base, Decimal('100'))
+        self.assertEqual(sorted(held), [0, 0, 0, Decimal('50')])
+        self.assertEqual(total, Decimal('150'))
+
+    def test_total_balance_is_base_plus_shards(self):
+        self.pay_shop('10', '20', '30', '40')
+        base, held, total = self.state()
+        self.assertEqual(total, base + sum(held))
+        self.assertEqual(total, ledger_sum(self.shop))
+        self.assertEqual(shards.totals([self.shop.id]), {self.shop.id: Decimal('200.00')})
+
+    def test_withdrawal_collects_from_the_shards(self):
+        self.pay_shop('30', '40', '50')
+        ledger.withdraw(self.shop, Decimal('200'))
+        base, held, total = self.state()
+        self.assertGreaterEqual(base, 0)
+        self.assertTrue(all(balance >= 0 for balance in held))
+        self.assertEqual(total, Decimal('20'))
+        self.assertEqual(total, ledger_sum(self.shop))
+
+    def test_withdrawal_over_the_whole_balance_is_refused(self):
+        self.pay_shop('30')
+        with self.assertRaises(ledger.InsufficientFunds):
+            ledger.withdraw(self.shop, Decimal('131'))
+        base, held, total = self.state()
+        self.assertEqual((base, sum(held), total), (Decimal('100'), Decimal('30'), Decimal('130')))
+
+    def test_unsharding_folds_the_shards_back(self):
+        self.pay_shop('30', '40')
+        with self.captureOnCommitCallbacks(execute=True):
+            shards.set_shards(self.shop, 0)
+        base, held, total = self.state()
+        self.assertEqual((base, held, total), (Decimal('170'), [], Decimal('170')))
+        self.assertEqual(shards.shard_count(self.shop.id), 0)
+
+
+# ==========================================
+# BACKFILL TRANSFERS
+# ==========================================
+class BackfillTransfersTests(TestCase):
+    def setUp(self):
+        self.alice = make_account('alice', '1000')
+        self.bob = make_account('bob')
+
+    def old_transfer(self, amount, late_credit=False):
+        """
+        The three rows a transfer wrote before journals existed.
+        """
+        out = Transaction.objects.create(account=self.alice, amount=amount, transaction_type='Transfer Out')
+        fee = Transaction.objects.create(account=self.alice, amount='1.00', transaction_type='Service Fee')
+        credit = Transaction.objects.create(account=self.bob, amount=amount, transaction_type='Transfer In')
+        if late_credit:
+            Transaction.objects.filter(id=credit.id).update(timestamp=out.timestamp + timedelta(minutes=5))
+        return out, fee, credit
+
+    def backfill(self):
+        stdout = io.StringIO()
+        call_command('backfill_transfers', stdout=stdout)
+        return stdout.getvalue().strip().splitlines()[-1]
+
+    def test_running_twice_links_each_triple_once(self):
+        first = self.old_transfer('100.00')
+        second = self.old_transfer('25.00')
+        self.old_transfer('40.00', late_credit=True)
+
+        self.assertEqual(self.backfill(), 'Done. 2 journals created, 1 Transfer Out rows could not be matched.')
+        self.assertEqual(self.backfill(), 'Done. 0 journals created, 1 Transfer Out rows could not be matched.')
+
+        self.assertEqual(Transfer.objects.count(), 2)
+        for out, fee, credit in (first, second):
+            journal = Transfer.objects.get(transfer_out=out)
+            self.assertEqual((journal.fee_id, journal.transfer_in_id), (fee.id, credit.id))
+            self.assertEqual((journal.sender, journal.recipient), (self.alice, self.bob))
+            self.assertEqual(journal.amount, Decimal(out.amount))
+
+
+# ==========================================
+# ROLLUPS
+# ==========================================
+class RollupTests(TransactionTestCase):
+    """
+    rebuild() works one day per thread, so the rows must be committed.
+    """
+
+    def setUp(self):
+        self.alice = make_account('alice', '1000')
+        self.bob = make_account('bob')
+        self.placed = 0
+        self.spread_over_days()
+
+    def spread_over_days(self):
+        """
+        Moves the new transactions onto the last three days, at different hours.
+        """
+        self.today = timezone.localdate()
+        noon = timezone.make_aware(datetime.combine(self.today, datetime.min.time())) + timedelta(hours=12)
+        for txn_id in Transaction.objects.filter(id__gt=self.placed).order_by('id').values_list('id', flat=True):
+            Transaction.objects.filter(id=txn_id).update(timestamp=noon - timedelta(days=txn_id % 3, hours=txn_id % 5))
+            self.placed = txn_id
+
+    def pay(self, *amounts):
+        for amount in amounts:
+            ledger.transfer(self.alice, self.bob, Decimal(amount))
+        self.spread_over_days()
+
+    def assert_daily_rollups_match(self):
+        expected = {
+            (row['day'], row['transaction_type']): (row['count'], row['total'].quantize(Decimal('0.01')))
+            for row in Transaction.objects.annotate(day=TruncDate('timestamp'))
+            .values('day', 'transaction_type').annotate(count=Count('id'), total=Sum('amount')).order_by()
+        }
+        daily = {
+            (row.day, row.transaction_type): (row.count, row.total.quantize(Decimal('0.01')))
+            for row in DailyRollup.objects.all()
+        }
+        self.assertEqual(daily, expected)
+        hourly_total = HourlyRollup.objects.aggregate(total=Sum('total'))['total']
+        raw_total = Transaction.objects.aggregate(total=Sum('amount'))['total']
+        self.assertEqual(Decimal(hourly_total).quantize(Decimal('0.01')), raw_total.quantize(Decimal('0.01')))
+
+    def test_new_transactions_are_folded_in(self):
+        self.pay('10', '20', '30')
+        self.assertEqual(rollups.update_rollups(chunk_size=2), Transaction.objects.latest('id').id)
+        self.assert_daily_rollups_match()
+
+        self.pay('5', '7')
+        rollups.update_rollups(chunk_size=2)
+        self.assert_daily_rollups_match()
+        # Nothing new: the watermark stays
+        self.assertIsNone(rollups.fold_chunk(100))
+
+    def test_totals_include_transactions_not_folded_yet(self):
+        self.pay('10', '20')
+        rollups.update_rollups()
+        self.pay('30')
+        raw = Transaction.objects.filter(transaction_type='Transfer Out').aggregate(total=Sum('amount'))['total']
+        self.assertEqual(rollups.totals_by_type('Transfer Out'), {'Transfer Out': raw.quantize(Decimal('0.01'))})
+
+    def test_rebuild_matches_after_folding(self):
+        self.pay('10', '20', '30', '40')
+        rollups.update_rollups(chunk_size=3)
+        # A manual correction the rollups don't know about
+        Transaction.objects.filter(transaction_type='Service Fee').update(amount=Decimal('2.00'))
+        DailyRollup.objects.update(count=0)
+
+        first_day = self.today - timedelta(days=2)
+        self.assertEqual(list(rollups.rebuild(first_day, self.today, workers=2)), [first_day + timedelta(days=n) for n in range(3)])
+        self.assert_daily_rollups_match()
+
+        self.pay('50')
+        rollups.update_rollups()
+        self.assert_daily_rollups_match()
+
+
+# ==========================================
+# CUSTOMER IMPORT
+# ==========================================
+CUSTOMERS_CSV = """username,first_name,last_name,email,password,mobile_number,account_type,opening_balance
+ann,Ann,Lee,ann@example.com,pass-ann,9000000001,Savings,100.00
+bad name,Bad,Name,,pass-x,9000000002,Savings,0
+ben,Ben,Roy,ben@example.com,pass-ben,9000000003,Fixed,
+cat,Cat,Das,not-an-email,pass-cat,9000000004,Savings,5
+dan,Dan,Sen,,pass-dan,9000000005,Savings,20.50
+ann,Ann,Again,,pass-ann2,9000000006,Savings,1
+eve,Eve,Roy,,pass-eve,9000000007,Current,1
+fay,Fay,Kim,,pass-fay,9000000008,Savings,7
+"""
+
+
+# The worker processes are forked, so they hash with the fast hasher too
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CustomerImportTests(TransactionTestCase):
+    """
+    The command closes the connections before forking, which a TestCase's
+    transaction would not survive.
+    """
+
+    def setUp(self):
+        cache.clear()
+        handle, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as f:
+            f.write(CUSTOMERS_CSV)
+        self.addCleanup(os.remove, self.path)
+
+    def run_import(self):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_customers', self.path, batch_size=3, workers=1, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def assert_imported(self):
+        self.assertEqual(
+            sorted(User.objects.values_list('username', flat=True)), ['ann', 'ben', 'dan', 'fay'],
+        )
+        for account in Account.objects.select_related('user'):
+            self.assertEqual(ledger_sum(account), account.balance)
+        self.assertEqual(Account.objects.get(user__username='ann').balance, Decimal('100.00'))
+        self.assertEqual(Account.objects.get(user__username='ben').transactions.count(), 0)
+
+    def test_bad_lines_are_reported_and_skipped(self):
+        stdout, stderr = self.run_import()
+        failed_lines = [line.split(':')[0] for line in stderr.splitlines()]
+        self.assertEqual(failed_lines, ['line 3', 'line 5', 'line 7', 'line 8'])
+        self.assertIn('appears earlier in the file', stderr)
+        self.assertIn('Done. 4 customers imported, 4 lines failed.', stdout)
+        self.assert_imported()
+
+    def test_passwords_are_hashed(self):
+        self.run_import()
+        user = User.objects.get(username='dan')
+        self.assertNotEqual(user.password, 'pass-dan')
+        self.assertTrue(user.check_password('pass-dan'))
+
+    def test_interrupted_import_resumes(self):
+        write_batch = customer_import.write_batch
+        calls = []
+
+        def crash_on_second_batch(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('Killed')
+            return write_batch(*args, **kwargs)
+
+        with mock.patch('banking.management.commands.import_customers.write_batch', side_effect=crash_on_second_batch):
+            with self.assertRaises(RuntimeError):
+                self.run_import()
+        job = CustomerImport.objects.get()
+        self.assertEqual((job.last_line, job.imported, job.finished_at), (4, 2, None))
+
+        stdout, _ = self.run_import()
+        self.assertIn('Resuming after line 4.', stdout)
+        self.assert_imported()
+
+        stdout, _ = self.run_import()
+        self.assertIn('was already imported', stdout)
+        self.assertEqual(User.objects.count(), 4)
+
+
+# ==========================================
+# ACCOUNT PURGE
+# ==========================================
+class PurgeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_account('alice', '100')
+        self.bob = make_account('bob', '50')
+        for amount in ('1', '2', '3', '4', '5', '6'):
+            ledger.deposit(self.alice, Decimal(amount))
+        self.alice_ids = list(self.alice.transactions.order_by('id').values_list('id', flat=True))
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        self.archive_dir = archive_dir.name
+        self.job = purge.close_account(self.alice)
+
+    def run_purge(self):
+        stdout = io.StringIO()
+        call_command('purge_accounts', once=True, batch_size=3, archive_dir=self.archive_dir, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_transactions_are_deleted_in_batches(self):
+        delete_batch = purge.delete_batch
+        batches = []
+
+        def record(job, batch_size):
+            before = set(Transaction.objects.values_list('id', flat=True))
+            deleted = delete_batch(job, batch_size)
+            batches.append(sorted(before - set(Transaction.objects.values_list('id', flat=True))))
+            return deleted
+
+        with mock.patch.object(purge, 'delete_batch', side_effect=record):
+            output = self.run_purge()
+        self.assertEqual(batches, [self.alice_ids[:3], self.alice_ids[3:6], self.alice_ids[6:], []])
+        self.assertIn(f'Account {self.alice.account_number} deleted (7 transactions).', output)
+
+        self.assertFalse(User.objects.filter(username='alice').exists())
+        self.assertFalse(Account.objects.filter(id=self.alice.id).exists())
+        self.assertEqual(ledger_sum(self.bob), Decimal('50.00'))
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.deleted_transactions), (AccountPurge.DONE, 7))
+
+    def test_account_is_archived_before_anything_is_deleted(self):
+        delete_batch = purge.delete_batch
+
+        def check_archive(job, batch_size):
+            self.assertTrue(os.path.exists(job.archive_path))
+            return delete_batch(job, batch_size)
+
+        with mock.patch.object(purge, 'delete_batch', side_effect=check_archive) as deleting:
+            self.run_purge()
+        self.assertTrue(deleting.called)
+
+        self.job.refresh_from_db()
+        with gzip.open(self.job.archive_path, 'rt', encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual((lines[0]['username'], lines[0]['balance']), ('alice', '121.00'))
+        self.assertEqual([line['id'] for line in lines[2:]], self.alice_ids)
+        self.assertEqual(lines[-1]['balance'], '121.00')
+
+    def test_rerun_after_completion_does_nothing(self):
+        self.run_purge()
+        self.job.refresh_from_db()
+        finished_at = self.job.finished_at
+
+        self.assertEqual(self.run_purge(), '')
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.finished_at), (AccountPurge.DONE, finished_at))
+        self.assertEqual(Transaction.objects.count(), 1)  # Bob's opening deposit
+
+
+# ==========================================
+# MONTH-END STATEMENTS
+# ==========================================
+class StatementBatchTests(TransactionTestCase):
+    """
+    The statements are written by worker processes, which only see committed rows.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.start = timezone.make_aware(datetime(2025, 3, 1))
+        self.end = timezone.make_aware(datetime(2025, 4, 1))
+        self.alice = make_account('alice', '500')
+        self.bob = make_account('bob', '20')
+        self.carol = make_account('carol')
+        User.objects.update(date_joined=self.start - timedelta(days=60))
+        self.at(self.start - timedelta(days=20))
+        ledger.transfer(self.alice, self.bob, Decimal('100'))
+        self.at(self.start - timedelta(hours=1))
+        ledger.deposit(self.bob, Decimal('5'))
+        self.at(self.start + timedelta(days=3))
+        ledger.transfer(self.alice, self.carol, Decimal('30'))
+        ledger.withdraw(self.bob, Decimal('50'))
+        output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(output_dir.cleanup)
+        self.output_dir = output_dir.name
+        self.month_dir = os.path.join(self.output_dir, '2025-03')
+
+    def at(self, when):
+        """
+        Moves the transactions written since the last call to `when`.
+        """
+        Transaction.objects.filter(timestamp__gt=self.start + timedelta(days=60)).update(timestamp=when)
+
+    def generate(self):
+        stdout = io.StringIO()
+        call_command(
+            'generate_statements', month=date(2025, 3, 1), output_dir=self.output_dir,
+            chunk_size=1, workers=2, stdout=stdout,
+        )
+        return stdout.getvalue()
+
+    def read_statement(self, account):
+        with gzip.open(os.path.join(self.month_dir, f'{account.account_number}.jsonl.gz'), 'rt') as f:
+            return [json.loads(line) for line in f]
+
+    def assert_statements_match_balances(self):
+        with open(os.path.join(self.month_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+        accounts = (self.alice, self.bob, self.carol)
+        self.assertEqual(manifest['accounts'], 3)
+        in_month = Transaction.objects.filter(timestamp__gte=self.start, timestamp__lt=self.end)
+        self.assertEqual(manifest['transactions'], in_month.count())
+        entries = {entry['account_number']: entry for entry in manifest['statements']}
+        for account in accounts:
+            entry = entries[account.account_number]
+            lines = self.read_statement(account)
+            opening = checkpoints.balance_as_of(account, self.start).quantize(Decimal('0.01'))
+            closing = checkpoints.balance_as_of(account, self.end).quantize(Decimal('0.01'))
+            self.assertEqual(Decimal(lines[0]['opening_balance']), opening, account)
+            self.assertEqual(Decimal(entry['opening_balance']), opening, account)
+            self.assertEqual(Decimal(lines[-1]['closing_balance']), closing, account)
+            self.assertEqual(Decimal(entry['closing_balance']), closing, account)
+            self.assertEqual(entry['transactions'], len(lines) - 2)
+
+    def test_manifest_and_opening_balances(self):
+        output = self.generate()
+        self.assertIn('Statements for 2025-03 written: 3 accounts', output)
+        self.assertFalse(StatementRun.objects.get().opening_from_checkpoints)
+        self.assert_statements_match_balances()
+
+    def test_opening_balances_from_checkpoints(self):
+        call_command('build_checkpoints', stdout=io.StringIO())
+        self.generate()
+        self.assertTrue(StatementRun.objects.get().opening_from_checkpoints)
+        self.assert_statements_match_balances()
+
+    def test_rerun_skips_finished_statements(self):
+        self.generate()
+        self.assertIn('already in', self.generate())
+
+        # An interrupted run: Bob's chunk never finished
+        run = StatementRun.objects.get()
+        StatementChunk.objects.filter(run=run, start_id=self.bob.id).delete()
+        StatementRun.objects.update(finished_at=None)
+        os.remove(os.path.join(self.month_dir, f'{self.bob.account_number}.jsonl.gz'))
+        others = {
+            path: os.stat(path).st_mtime_ns
+            for path in (os.path.join(self.month_dir, f'{a.account_number}.jsonl.gz') for a in (self.alice, self.carol))
+        }
+
+        output = self.generate()
+        self.assertIn('Resuming: 2 chunks already done, 1 left.', output)
+        self.assertEqual({path: os.stat(path).st_mtime_ns for path in others}, others)
+        self.assert_statements_match_balances()
+
+
+# ==========================================
+# ADMIN CHANGELISTS
+# ==========================================
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.alice = make_account('alice', '100')
+        self.bob = make_account('bob', '5')
+        start = timezone.make_aware(datetime(2025, 1, 1, 10))
+        rows = Transaction.objects.bulk_create([
+            Transaction(account=self.alice if i % 2 else self.bob, amount=i + 1,
+                        transaction_type=('Deposit', 'Withdrawal', 'Service Fee')[i % 3])
+            for i in range(60)
+        ])
+        for i, row in enumerate(rows):  # bulk_create stamps them all with now
+            Transaction.objects.filter(id=row.id).update(timestamp=start + timedelta(days=i * 3))
+        self.client.force_login(User.objects.create_superuser('root', password='x'))
+
+    def changelist(self, path, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl'], [query['sql'] for query in queries.captured_queries]
+
+    def query_plan(self, queryset):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Reads the SQLite query plan')
+        return queryset.explain()
+
+    def test_unfiltered_list_never_counts_the_table(self):
+        # An id far ahead makes the table look like a million rows
+        Transaction.objects.create(id=10 ** 6, account=self.alice, amount=1, transaction_type='Deposit')
+        cl, queries = self.changelist('/admin/banking/transaction/')
+        self.assertFalse([sql for sql in queries if 'COUNT(' in sql])
+        first = Transaction.objects.order_by('id').first().id
+        self.assertEqual(cl.paginator.count, 10 ** 6 - first + 1)
+        self.assertEqual(cl.paginator.num_pages, MAX_PAGES)
+        self.assertEqual(len(cl.result_list), Transaction.objects.count())
+
+    def test_filtered_count_stops_at_the_limit(self):
+        with mock.patch('banking.admin.COUNT_LIMIT', 5):
+            cl, queries = self.changelist('/admin/banking/transaction/', transaction_type__exact='Deposit')
+        self.assertEqual(cl.paginator.count, 5)
+        self.assertTrue([sql for sql in queries if 'COUNT(' in sql and 'LIMIT 5' in sql])
+
+    def test_account_number_search_uses_the_index(self):
+        cl, _ = self.changelist('/admin/banking/transaction/', q=self.alice.account_number)
+        self.assertEqual(
+            sorted(t.id for t in cl.result_list), sorted(self.alice.transactions.values_list('id', flat=True)),
+        )
+        plan = self.query_plan(cl.queryset)
+        self.assertIn('SEARCH banking_account USING', plan)
+        self.assertIn('SEARCH banking_transaction USING INDEX txn_account_ts_id_idx', plan)
+        self.assertNotIn('SCAN', plan)
+
+        cl, _ = self.changelist('/admin/banking/account/', q=self.alice.account_number[:9])
+        self.assertEqual(list(cl.result_list), [self.alice])
+        plan = self.query_plan(cl.queryset)
+        self.assertNotIn('SCAN banking_account', plan)
+        self.assertIn('account_mobile_idx', plan)
+
+    def test_type_and_period_filters(self):
+        params = {'transaction_type__exact': 'Deposit', 'period': '2025-03'}
+        with self.assertNumQueries(5):  # User, period bounds (2), bounded count, page
+            cl, _ = self.changelist('/admin/banking/transaction/', **params)
+        march = Transaction.objects.filter(
+            transaction_type='Deposit',
+            timestamp__gte=timezone.make_aware(datetime(2025, 3, 1)),
+            timestamp__lt=timezone.make_aware(datetime(2025, 4, 1)),
+        ).order_by('-timestamp', '-id')
+        self.assertEqual(len(march), 3)
+        self.assertEqual(list(cl.result_list), list(march))
+        self.assertEqual(cl.paginator.count, 3)
+        self.assertIn('txn_type_ts_idx', self.query_plan(cl.queryset))
+
+        # Deeper periods keep the type filter
+        cl, _ = self.changelist('/admin/banking/transaction/', **{**params, 'period': '2025-03-05'})
+        self.assertEqual(list(cl.result_list), [march[2]])
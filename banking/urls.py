@@ -10,9 +10,21 @@ urlpatterns = [
     path('verify-otp/', views.verify_otp_view, name='verify_otp'),
     path('reset-password/', views.reset_password_view, name='reset_password'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('events/', views.account_events, name='account_events'),
+    path('history/', views.history_view, name='history'),
+    path('api/history/', views.history_api, name='history_api'),
+    path('statement/', views.statement_export, name='statement_export'),
     path('deposit/', views.deposit_view, name='deposit'),
     path('withdraw/', views.withdraw_view, name='withdraw'),
     path('transfer/', views.transfer_view, name='transfer'),
+    path('transfer/batch/', views.batch_transfer_view, name='batch_transfer'),
+    path('api/recipients/', views.recipient_search, name='recipient_search'),
+    path('api/transfers/batch/', views.batch_transfer_api, name='batch_transfer_api'),
+    path('metrics', views.metrics_view, name='metrics'),
     path('admin-panel/', views.admin_dashboard, name='admin_dashboard'),
+    path('admin-panel/profiling/', views.profiling_report, name='profiling_report'),
+    path('admin-panel/analytics/', views.analytics_view, name='analytics'),
+    path('api/analytics/', views.analytics_api, name='analytics_api'),
+    path('admin-panel/accounts/<int:account_id>/statement/', views.admin_statement_export, name='admin_statement_export'),
     path('delete-account/<int:account_id>/', views.delete_account, name='delete_account'),
 ]
@@ -0,0 +1,110 @@
+import logging
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Velocity limits: how many payments an account may make per minute and how
+# much money it may send per day (transfers and withdrawals).
+#
+# The counters live in the cache, split into time buckets: the minute window
+# is six 10-second buckets, the day window is 24 hourly buckets. A check
+# reads a fixed number of keys, however long the account's history is, and
+# never touches the Transaction table. The window moves one bucket at a time,
+# so "the last minute" is really the last 50-60 seconds.
+#
+# A payment first adds itself to the counters and then checks the total, so
+# two simultaneous requests can't both squeeze under the limit. If the
+# payment is rejected or fails later, its share is taken back out.
+#
+# If the cache can't be reached the payment is refused (fail closed).
+
+logger = logging.getLogger(__name__)
+
+# limit name -> (window, bucket size), in seconds
+WINDOWS = {
+    'payments_per_minute': (60, 10),
+    'amount_per_day': (24 * 60 * 60, 60 * 60),
+}
+
+
+class LimitExceeded(Exception):
+    pass
+
+
+class LimiterUnavailable(LimitExceeded):
+    def __init__(self):
+        super().__init__('Payments are temporarily unavailable. Please try again in a few minutes.')
+
+
+def limits_for(account):
+    """
+    The limits of the account's type from settings.VELOCITY_LIMITS,
+    without the ones set to None.
+    """
+    limits = getattr(settings, 'VELOCITY_LIMITS', {}).get(account.account_type) or {}
+    return {name: limit for name, limit in limits.items() if limit is not None}
+
+
+def _bucket_keys(account_id, name, now):
+    """
+    Cache keys of the buckets in the window, oldest first (the last one is current).
+    """
+    window, step = WINDOWS[name]
+    current = int(now // step)
+    return [
+        f'banking:velocity:{account_id}:{name}:{bucket}'
+        for bucket in range(current - window // step + 1, current + 1)
+    ]
+
+
+def _release(taken):
+    for key, delta in taken:
+        try:
+            cache.decr(key, delta)
+        except Exception:
+            # Expired or unreachable: at worst the account is limited a bit early
+            logger.warning('Could not release velocity counter %s', key)
+
+
+@contextmanager
+def reserve(account, amount, payments=1):
+    """
+    Counts `payments` payments totalling `amount` against the account's
+    limits for the duration of the block (a batch transfer counts all its lines).
+    - Raises LimitExceeded (nothing counted) if it would go over a limit.
+    - Raises LimiterUnavailable if the cache can't be reached.
+    - If the block raises, the payment is taken back out of the counters.
+    """
+    limits = limits_for(account)
+    increments = {'payments_per_minute': payments, 'amount_per_day': int(amount * 100)}
+    now = time.time()
+    taken = []
+    try:
+        for name, limit in limits.items():
+            keys = _bucket_keys(account.id, name, now)
+            delta = increments[name]
+            cache.add(keys[-1], 0, WINDOWS[name][0] + WINDOWS[name][1])
+            used = cache.incr(keys[-1], delta)
+            taken.append((keys[-1], delta))
+            used += sum(cache.get_many(keys[:-1]).values())
+
+            if name == 'amount_per_day' and used > int(Decimal(str(limit)) * 100):
+                raise LimitExceeded(f'Daily limit reached: you can send at most ${limit} per 24 hours.')
+            if name == 'payments_per_minute' and used > limit:
+                raise LimitExceeded(f'Too many payments: at most {limit} per minute. Please wait a moment.')
+    except LimitExceeded:
+        _release(taken)
+        raise
+    except Exception as e:
+        logger.exception('Velocity counters unavailable')
+        _release(taken)
+        raise LimiterUnavailable() from e
+
+    try:
+        yield
+    except BaseException:
+        _release(taken)
+        raise
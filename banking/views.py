@@ -3,11 +3,31 @@ from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.contrib.auth.forms import AuthenticationForm
-from .models import Account, Transaction
-from .forms import RegisterForm, DepositForm, WithdrawForm, TransferForm
-from django.db import transaction
-from django.core.mail import send_mail
+from .models import Account, AccountPurge, Transaction, ProfileStat, ProfileDuplicate
+from .forms import RegisterForm, DepositForm, WithdrawForm, TransferForm, BatchTransferForm, HistoryFilterForm, AnalyticsFilterForm, clean_batch_lines
+from .pagination import keyset_page, InvalidCursor
+from .stats import bank_totals
+from .statements import STATEMENT_FORMATS
+from .outbox import enqueue_mail
+from .purge import close_account
+from . import dashboard_cache
+from . import feed
+from . import directory
+from . import metrics
+from .db_router import read_only_view
+from . import ledger
+from . import rollups
+from . import velocity
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import ExpressionWrapper, F, FloatField, Q
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
+from asgiref.sync import sync_to_async
+import hmac
+import json
 import random
 from decimal import Decimal
 
@@ -41,6 +61,7 @@ def home(request):
     return render(request, 'banking/index.html')
 
 
+@metrics.timed('register')
 def register_view(request):
     """
     Handles user registration.
@@ -72,7 +93,9 @@ def register_view(request):
                     amount=initial_deposit,
                     transaction_type='Deposit'
                 )
+            directory.account_added(account)
 
+            metrics.REGISTRATIONS.inc()
             messages.success(request, 'Account created successfully! Please login.')
             return redirect('login')
     else:
@@ -81,6 +104,7 @@ def register_view(request):
     return render(request, 'banking/register.html', {'form': form})
 
 
+@metrics.timed('login')
 def login_view(request):
     """
     Standard Login View.
@@ -91,11 +115,13 @@ def login_view(request):
         if form.is_valid():
             user = form.get_user()
             login(request, user)
+            metrics.LOGINS.labels('ok').inc()
             
             # Redirect based on user role
             if user.is_superuser:
                 return redirect('admin_dashboard')
             return redirect('dashboard')
+        metrics.LOGINS.labels('failed').inc()
     else:
         form = AuthenticationForm()
     return render(request, 'banking/login.html', {'form': form})
@@ -113,11 +139,12 @@ def logout_view(request):
 # PASSWORD RESET FEATURES (OTP via Email)
 # ==========================================
 
+@metrics.timed('forgot_password')
 def forgot_password_view(request):
     """
     Step 1: User enters email.
     - Generate 6-digit OTP.
-    - Send OTP via Email.
+    - Queue OTP Email in the outbox (the send_outbox worker delivers it).
     - Store OTP in session for verification.
     """
     if request.method == 'POST':
@@ -133,24 +160,18 @@ def forgot_password_view(request):
             request.session['reset_otp'] = otp
             request.session['reset_email'] = email
             
-            # Send Email
-            try:
-                send_mail(
-                    'Password Reset OTP',
-                    f'Your OTP for password reset is: {otp}',
-                    None,
-                    [email],
-                    fail_silently=False,
-                )
-                messages.success(request, f'OTP sent to {email}')
-            except Exception as e:
-                # Fallback for Development/Render Free Tier blocking SMTP
-                print(f"!!! RENDER/LOCAL SMTP DEBUG !!!")
-                print(f"OTP for {email} is: {otp}")
-                messages.warning(request, f"Email delivery may be restricted. Check server logs for OTP.")
+            # Queue the Email (sent by the send_outbox worker, not in this request)
+            enqueue_mail(
+                'Password Reset OTP',
+                f'Your OTP for password reset is: {otp}',
+                [email],
+            )
+            metrics.PASSWORD_RESETS.labels('queued').inc()
+            messages.success(request, f'OTP sent to {email}')
             
             return redirect('verify_otp')
         except User.DoesNotExist:
+            metrics.PASSWORD_RESETS.labels('unknown_email').inc()
             messages.error(request, 'Email not found!')
             
     return render(request, 'banking/forgot_password.html')
@@ -208,47 +229,189 @@ def reset_password_view(request):
 # BANKING FEATURES (Login Required)
 # ==========================================
 
+@read_only_view
 @login_required
 def dashboard(request):
     """
     Main Dashboard.
     Shows account balance and the last 5 transactions.
+    - Served from the cached read model (one indexed query until something changes).
+    - Answers 304 Not Modified when the browser already has this version.
     """
     if request.user.is_superuser:
         return redirect('admin_dashboard')
-        
+
+    data = dashboard_cache.get_dashboard(request.user.pk)
+    etag = data['etag']
+    # Flash messages are part of the page, so only skip rendering when there are none
+    if request.headers.get('If-None-Match') == etag and not len(messages.get_messages(request)):
+        response = HttpResponseNotModified()
+    else:
+        response = render(request, 'banking/dashboard.html', {
+            'account': data['account'],
+            'transactions': data['transactions'],
+        })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+async def account_events(request):
+    """
+    Live dashboard updates as Server-Sent Events (see feed.py).
+    - Starts with a snapshot, or with the changes missed since Last-Event-ID.
+    - Then pushes every committed balance change of the user's account.
+    - Only under ASGI: a WSGI worker would be blocked by the open stream, so
+      there the browser gets 204 No Content and stops listening.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    user = await request.auser()
+    if user.is_superuser:
+        return HttpResponse(status=204)
+    try:
+        data = await sync_to_async(dashboard_cache.get_dashboard)(user.pk)
+    except Account.DoesNotExist:
+        return HttpResponse(status=204)
+
+    cursor = request.headers.get('Last-Event-ID') or request.GET.get('cursor')
+    cursor = int(cursor) if cursor and cursor.isdigit() else None
+    response = StreamingHttpResponse(
+        feed.stream(data['account']['id'], user.pk, cursor), content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from holding events back
+    return response
+
+
+HISTORY_PAGE_SIZE = 25
+HISTORY_MAX_PAGE_SIZE = 100
+
+
+def _history_page(request, account, form, page_size):
+    """
+    Shared by the history page and the history API.
+    Returns a KeysetPage or raises InvalidCursor.
+    Sorted newest first on (timestamp, id) and paginated by cursor, so every
+    page is an index seek on (account, timestamp, id), however deep it is.
+    """
+    queryset = account.transactions.all()
+    if form.is_valid():
+        queryset = form.filter(queryset)
+    return keyset_page(queryset, ('-timestamp', '-id'), request.GET.get('cursor'), page_size)
+
+
+@read_only_view
+@login_required
+def history_view(request):
+    """
+    Full transaction history, 25 rows per page.
+    Filters: transaction type and date range.
+    """
+    if request.user.is_superuser:
+        return redirect('admin_dashboard')
+
     account = request.user.account
-    recent_transactions = account.transactions.order_by('-timestamp')[:5]
-    
-    return render(request, 'banking/dashboard.html', {
+    form = HistoryFilterForm(request.GET)
+    try:
+        page = _history_page(request, account, form, HISTORY_PAGE_SIZE)
+    except InvalidCursor:
+        messages.error(request, 'That page link is no longer valid.')
+        return redirect('history')
+
+    # Keep the filters when moving to the next page
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    if page.has_next:
+        params['cursor'] = page.next_cursor
+    return render(request, 'banking/history.html', {
         'account': account,
-        'transactions': recent_transactions
+        'form': form,
+        'transactions': page.items,
+        'next_query': params.urlencode() if page.has_next else None,
     })
 
 
+@read_only_view
+@login_required
+def history_api(request):
+    """
+    JSON version of the history page.
+    Query params: transaction_type, date_from, date_to, cursor, limit (max 100).
+    Admins have no account, so they get a 403 (the page redirects them instead).
+    """
+    if request.user.is_superuser:
+        return JsonResponse({'error': 'Admin users have no account history.'}, status=403)
+
+    account = request.user.account
+    form = HistoryFilterForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'error': form.errors}, status=400)
+    try:
+        page_size = min(max(int(request.GET.get('limit', HISTORY_PAGE_SIZE)), 1), HISTORY_MAX_PAGE_SIZE)
+        page = _history_page(request, account, form, page_size)
+    except (ValueError, InvalidCursor):
+        return JsonResponse({'error': 'Invalid limit or cursor.'}, status=400)
+
+    return JsonResponse({
+        'transactions': [
+            {
+                'id': t.id,
+                'transaction_type': t.transaction_type,
+                'amount': t.amount,
+                'timestamp': t.timestamp,
+            }
+            for t in page.items
+        ],
+        'next_cursor': page.next_cursor,
+    })
+
+
+def _statement_response(request, account):
+    """
+    Streams the statement of `account` as CSV (default) or JSON Lines.
+    Optional date_from / date_to limit the period (opening balance included).
+    """
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in STATEMENT_FORMATS:
+        return HttpResponseBadRequest('Unknown format. Use csv or jsonl.')
+    form = HistoryFilterForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest('Invalid date range.')
+
+    lines, content_type, extension = STATEMENT_FORMATS[export_format]
+    start, end = form.date_bounds()
+    response = StreamingHttpResponse(lines(account, start, end), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="statement-{account.account_number}.{extension}"'
+    return response
+
+
+@login_required
+def statement_export(request):
+    """
+    Downloads the full statement of the logged-in user's account.
+    """
+    if request.user.is_superuser:
+        return redirect('admin_dashboard')
+    return _statement_response(request, request.user.account)
+
+
+@metrics.timed('deposit')
 @login_required
-@transaction.atomic
 def deposit_view(request):
     """
     Handles cash deposits.
-    Updates balance and creates a transaction record.
+    The ledger updates the balance and creates the transaction record.
     """
     account = request.user.account
     if request.method == 'POST':
         form = DepositForm(request.POST)
         if form.is_valid():
             amount = form.cleaned_data['amount']
-            
-            # Update Balance
-            account.balance += amount
-            account.save()
-            
-            # Log Transaction
-            Transaction.objects.create(
-                account=account,
-                amount=amount,
-                transaction_type='Deposit'
-            )
+            ledger.deposit(account, amount)
+            metrics.DEPOSITS.inc()
+            metrics.DEPOSIT_AMOUNT.inc(float(amount))
             messages.success(request, f'Deposited ${amount} successfully!')
             return redirect('dashboard')
     else:
@@ -256,50 +419,51 @@ def deposit_view(request):
     return render(request, 'banking/deposit.html', {'form': form})
 
 
+@metrics.timed('withdraw')
 @login_required
-@transaction.atomic
 def withdraw_view(request):
     """
     Handles withdrawals.
-    - Checks for sufficient funds.
+    - Checks for sufficient funds (inside the ledger, as one conditional UPDATE).
     - Prevents withdrawal from 'Fixed Deposit' accounts.
+    - Enforces the velocity limits of the account type (see velocity.py).
     """
     account = request.user.account
     if request.method == 'POST':
         form = WithdrawForm(request.POST)
         if form.is_valid():
             amount = form.cleaned_data['amount']
-            
-            # Validation
-            if account.account_type == 'Fixed':
-                messages.error(request, 'You cannot withdraw from a Fixed Deposit account!')
-            elif account.balance >= amount:
-                # Perform Withdrawal
-                account.balance -= amount
-                account.save()
-                
-                Transaction.objects.create(
-                    account=account,
-                    amount=amount,
-                    transaction_type='Withdrawal'
-                )
+            try:
+                with velocity.reserve(account, amount):
+                    ledger.withdraw(account, amount)
+            except velocity.LimitExceeded as e:
+                metrics.WITHDRAWALS.labels('rate_limited').inc()
+                messages.error(request, str(e))
+            except ledger.InsufficientFunds:
+                metrics.WITHDRAWALS.labels('insufficient_balance').inc()
+                messages.error(request, 'Insufficient balance!')
+            except ledger.LedgerError as e:
+                metrics.WITHDRAWALS.labels('rejected').inc()
+                messages.error(request, str(e))
+            else:
+                metrics.WITHDRAWALS.labels('ok').inc()
+                metrics.WITHDRAWAL_AMOUNT.inc(float(amount))
                 messages.success(request, f'Withdrew ${amount} successfully!')
                 return redirect('dashboard')
-            else:
-                messages.error(request, 'Insufficient balance!')
     else:
         form = WithdrawForm()
     return render(request, 'banking/withdraw.html', {'form': form})
 
 
+@metrics.timed('transfer')
 @login_required
-@transaction.atomic
 def transfer_view(request):
     """
     Peer-to-Peer Transfer (The "Scam" Feature).
     - Transfers money from User A to User B.
     - !!! HIDDEN FEATURE !!!: Deducts a random 'Service Fee' (10-30%) from the sender.
-    - Uses database transactions (atomic) to ensure safety.
+    - The ledger locks both accounts (in id order) and applies the change atomically.
+    - Enforces the velocity limits of the account type (see velocity.py).
     """
     account = request.user.account
     if request.method == 'POST':
@@ -313,73 +477,316 @@ def transfer_view(request):
                 messages.error(request, "You cannot transfer money to yourself!")
                 return render(request, 'banking/transfer.html', {'form': form})
 
-            recipient = Account.objects.get(account_number=recipient_no)
-            
-            # ---------------------------------------------------
-            # THE "SCAM" LOGIC (Inflation/Service Fee Simulation)
-            # ---------------------------------------------------
-            service_fee_percentage = random.randint(10, 30)
-            service_fee = amount * (Decimal(service_fee_percentage) / 100)
-            total_deduction = amount + service_fee
-
-            if account.balance >= total_deduction:
-                # 1. Deduct Total (Amount + Random Fee) from Sender
-                account.balance -= total_deduction
-                account.save()
-                
-                # 2. Add Only Amount to Recipient (Fee is kept by "Bank")
-                recipient.balance += amount
-                recipient.save()
-
-                # 3. Log Transactions
-                Transaction.objects.create(
-                    account=account,
-                    amount=amount,
-                    transaction_type='Transfer Out'
-                )
-                
-                # Clearly log the Fee for tracking
-                Transaction.objects.create(
-                    account=account,
-                    amount=service_fee,
-                    transaction_type='Service Fee'
-                )
+            # Resolved by the form's validation (see directory.py)
+            recipient = form.recipient
 
-                Transaction.objects.create(
-                    account=recipient,
-                    amount=amount,
-                    transaction_type='Transfer In'
-                )
-                
-                messages.success(request, f'Transferred ${amount}. Service Fee: ${service_fee:.2f} (applied automatically).')
-                return redirect('dashboard')
+            try:
+                with velocity.reserve(account, amount):
+                    journal = ledger.transfer(account, recipient, amount)
+            except velocity.LimitExceeded as e:
+                metrics.TRANSFERS.labels('rate_limited').inc()
+                messages.error(request, str(e))
+            except ledger.InsufficientFunds as e:
+                metrics.TRANSFERS.labels('insufficient_balance').inc()
+                messages.error(request, f'Insufficient balance! You need ${e.required:.2f} to cover the amount + fees.')
+            except ledger.LedgerError as e:
+                metrics.TRANSFERS.labels('rejected').inc()
+                messages.error(request, str(e))
             else:
-                messages.error(request, f'Insufficient balance! You need ${total_deduction:.2f} to cover the amount + fees.')
+                metrics.TRANSFERS.labels('ok').inc()
+                metrics.TRANSFER_AMOUNT.inc(float(amount))
+                metrics.SERVICE_FEES.inc(float(journal.service_fee))
+                messages.success(request, f'Transferred ${amount} to {recipient.holder}. Service Fee: ${journal.service_fee:.2f} (applied automatically).')
+                return redirect('dashboard')
     else:
         form = TransferForm()
     return render(request, 'banking/transfer.html', {'form': form})
 
 
+@login_required
+def recipient_search(request):
+    """
+    Payee autocomplete for the transfer form.
+    Query param: q (at least 8 of the 10 digits of the account number).
+    Answered from the in-memory directory index. Rate limited per user.
+    """
+    if not directory.allow_search(request.user.pk):
+        return JsonResponse({'error': 'Too many searches. Please wait a minute.'}, status=429)
+    prefix = request.GET.get('q', '').strip()
+    own_number = request.user.account.account_number
+    return JsonResponse({
+        'results': [
+            {'account_number': number, 'holder': holder}
+            for number, holder in directory.search(prefix, directory.MAX_RESULTS + 1)
+            if number != own_number
+        ][:directory.MAX_RESULTS],
+    })
+
+
+def _batch_transfer(account, lines):
+    """
+    Runs a batch against the velocity limits: every line is a payment and
+    the amounts add up. Raises velocity.LimitExceeded (nothing sent) if the
+    batch would go over a limit.
+    """
+    total = sum((amount for _, amount in lines), Decimal('0'))
+    with velocity.reserve(account, total, payments=len(lines)):
+        return ledger.batch_transfer(account, lines)
+
+
+def _batch_summary(account, results):
+    """
+    Builds the report shown (or returned as JSON) after a batch transfer.
+    Also counts the batch in the transfer metrics.
+    """
+    accepted = [r for r in results if r['status'] == 'ok']
+    summary = {
+        'accepted': len(accepted),
+        'rejected': len(results) - len(accepted),
+        'total_sent': sum((r['amount'] for r in accepted), Decimal('0')),
+        'total_fees': sum((r['service_fee'] for r in accepted), Decimal('0')),
+        'balance': account.balance,
+        'rejected_lines': [r for r in results if r['status'] != 'ok'],
+    }
+    metrics.TRANSFERS.labels('ok').inc(summary['accepted'])
+    metrics.TRANSFERS.labels('rejected').inc(summary['rejected'])
+    metrics.TRANSFER_AMOUNT.inc(float(summary['total_sent']))
+    metrics.SERVICE_FEES.inc(float(summary['total_fees']))
+    return summary
+
+
+@login_required
+def batch_transfer_view(request):
+    """
+    Batch Transfer (Payroll).
+    - Upload a CSV of "recipient_account, amount" lines.
+    - All lines run in one database transaction with bulk ledger writes.
+    - Every line pays its own random service fee.
+    - Every line counts against the velocity limits; a batch that would go
+      over them is refused as a whole.
+    - Shows a report listing the lines that were rejected.
+    """
+    account = request.user.account
+    report = None
+    if request.method == 'POST':
+        form = BatchTransferForm(request.POST, request.FILES)
+        if form.is_valid():
+            lines = form.cleaned_data['csv_file']
+            try:
+                results = _batch_transfer(account, lines)
+            except velocity.LimitExceeded as e:
+                metrics.TRANSFERS.labels('rate_limited').inc(len(lines))
+                messages.error(request, str(e))
+                return render(request, 'banking/batch_transfer.html', {'form': form, 'report': None})
+            report = _batch_summary(account, results)
+            if report['accepted']:
+                messages.success(request, f"Sent {report['accepted']} transfers (${report['total_sent']:.2f}). Service Fees: ${report['total_fees']:.2f}.")
+            if report['rejected']:
+                messages.error(request, f"{report['rejected']} transfers were rejected.")
+    else:
+        form = BatchTransferForm()
+    return render(request, 'banking/batch_transfer.html', {'form': form, 'report': report})
+
+
+@login_required
+@require_POST
+def batch_transfer_api(request):
+    """
+    JSON version of the batch transfer.
+    Request:  {"transfers": [{"recipient_account": "...", "amount": "12.50"}, ...]}
+    Response: the batch report with one entry per rejected line.
+    """
+    account = request.user.account
+    try:
+        payload = json.loads(request.body)
+        rows = [(item['recipient_account'], item['amount']) for item in payload['transfers']]
+        lines = clean_batch_lines(rows, ledger.MAX_BATCH_LINES)
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected {"transfers": [{"recipient_account": ..., "amount": ...}]}.'}, status=400)
+    except ValidationError as e:
+        return JsonResponse({'error': ' '.join(e.messages)}, status=400)
+
+    try:
+        results = _batch_transfer(account, lines)
+    except velocity.LimitExceeded as e:
+        metrics.TRANSFERS.labels('rate_limited').inc(len(lines))
+        return JsonResponse({'error': str(e)}, status=429)
+    report = _batch_summary(account, results)
+    return JsonResponse(report)
+
+
+# ==========================================
+# MONITORING
+# ==========================================
+
+METRICS_LOOPBACK = ('127.0.0.1', '::1')
+
+
+def metrics_view(request):
+    """
+    Prometheus metrics in text format.
+    - If METRICS_TOKEN is set, scrapers must send "Authorization: Bearer <token>".
+    - If it isn't, only scrapers on the same machine (loopback) get an answer.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        sent = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(sent.encode(), f'Bearer {token}'.encode()):
+            return HttpResponseForbidden()
+    elif request.META.get('REMOTE_ADDR') not in METRICS_LOOPBACK:
+        return HttpResponseForbidden()
+    body, content_type = metrics.render_latest()
+    return HttpResponse(body, content_type=content_type)
+
+
 # ==========================================
 # ADMIN FEATURES
 # ==========================================
 
+ADMIN_PAGE_SIZE = 50
+
+
+@read_only_view
 @user_passes_test(is_admin)
 def admin_dashboard(request):
     """
     Admin View: List all accounts to manage them.
+    - 50 accounts per page (keyset pagination on id, with the user joined in).
+    - Search by account number, username or mobile number (prefix match).
+    - Header with bank-wide totals (cached, see stats.py).
+    - Closed accounts are hidden; their deletion progress is listed instead.
+    """
+    query = request.GET.get('q', '').strip()
+    accounts = (
+        Account.objects.filter(closed_at__isnull=True).select_related('user')
+        .annotate(total_balance=Account.total_balance())
+    )
+    if query:
+        accounts = accounts.filter(
+            Q(account_number__startswith=query)
+            | Q(user__username__istartswith=query)
+            | Q(mobile_number__startswith=query)
+        )
+
+    try:
+        page = keyset_page(accounts, ('id',), request.GET.get('cursor'), ADMIN_PAGE_SIZE)
+    except InvalidCursor:
+        return redirect('admin_dashboard')
+
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    if page.has_next:
+        params['cursor'] = page.next_cursor
+    return render(request, 'banking/admin_dashboard.html', {
+        'accounts': page.items,
+        'query': query,
+        'totals': bank_totals(),
+        'next_query': params.urlencode() if page.has_next else None,
+        'purges': AccountPurge.objects.order_by('-id')[:10],
+    })
+
+
+@user_passes_test(is_admin)
+def profiling_report(request):
+    """
+    Admin View: Banking views ranked by total cost (from the profiling middleware),
+    with the SQL statements that run more than once per request.
     """
-    accounts = Account.objects.all()
-    return render(request, 'banking/admin_dashboard.html', {'accounts': accounts})
+    stats = ProfileStat.objects.annotate(
+        avg_queries=ExpressionWrapper(F('queries') * 1.0 / F('requests'), output_field=FloatField()),
+        avg_db_ms=ExpressionWrapper(F('db_ms') / F('requests'), output_field=FloatField()),
+        avg_app_ms=ExpressionWrapper(F('app_ms') / F('requests'), output_field=FloatField()),
+        avg_total_ms=ExpressionWrapper(F('total_ms') / F('requests'), output_field=FloatField()),
+    ).order_by('-total_ms')
+    duplicates = ProfileDuplicate.objects.order_by('-extra_queries')[:50]
+    return render(request, 'banking/profiling.html', {
+        'stats': stats,
+        'duplicates': duplicates,
+        'sample_rate': settings.PROFILING_SAMPLE_RATE,
+    })
+
+
+def _analytics_series(form):
+    """
+    Rollup series for a valid AnalyticsFilterForm.
+    """
+    start, end = form.bucket_range()
+    return rollups.series(
+        form.cleaned_data['granularity'], start, end, form.cleaned_data['transaction_type'] or None
+    )
+
+
+@read_only_view
+@user_passes_test(is_admin)
+def analytics_view(request):
+    """
+    Admin View: Fee revenue and transaction volume over time.
+    - Daily or hourly buckets, optionally one transaction type.
+    - Reads only the rollup tables (see rollups.py), never the transactions.
+    """
+    form = AnalyticsFilterForm(request.GET)
+    series = _analytics_series(form) if form.is_valid() else {}
+    summary = [
+        {
+            'transaction_type': transaction_type,
+            'count': sum(point['count'] for point in points),
+            'total': sum(point['total'] for point in points),
+        }
+        for transaction_type, points in series.items()
+    ]
+    rows = sorted(
+        ({'transaction_type': transaction_type, **point} for transaction_type, points in series.items() for point in points),
+        key=lambda row: (row['bucket'], row['transaction_type']),
+    )
+    return render(request, 'banking/analytics.html', {
+        'form': form,
+        'summary': summary,
+        'rows': rows,
+        'hourly': form.is_valid() and form.cleaned_data['granularity'] == 'hour',
+        'watermark': rollups.watermark(),
+    })
+
+
+@read_only_view
+@user_passes_test(is_admin)
+def analytics_api(request):
+    """
+    JSON version of the analytics page.
+    Query params: granularity (day/hour), transaction_type, date_from, date_to.
+    """
+    form = AnalyticsFilterForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'error': form.errors}, status=400)
+    return JsonResponse({
+        'granularity': form.cleaned_data['granularity'],
+        'date_from': form.cleaned_data['date_from'],
+        'date_to': form.cleaned_data['date_to'],
+        'last_transaction_id': rollups.watermark(),
+        'series': _analytics_series(form),
+    })
+
+
+@user_passes_test(is_admin)
+def admin_statement_export(request, account_id):
+    """
+    Admin View: Downloads the statement of any account.
+    """
+    account = get_object_or_404(Account, id=account_id)
+    return _statement_response(request, account)
 
 
 @user_passes_test(is_admin)
 def delete_account(request, account_id):
     """
     Admin View: Deletes a user and their account.
+    - The account is closed and the user deactivated right away.
+    - The data is deleted in the background by `manage.py purge_accounts`
+      (see purge.py), progress is shown on the admin dashboard.
     """
     account = get_object_or_404(Account, id=account_id)
-    user = account.user
-    user.delete()  # Cascade deletes account and transactions
-    messages.success(request, f'Account {account.account_number} deleted.')
+    if account.closed_at:
+        messages.error(request, f'Account {account.account_number} is already being deleted.')
+        return redirect('admin_dashboard')
+    close_account(account)
+    messages.success(request, f'Account {account.account_number} closed. Its data is being deleted in the background.')
     return redirect('admin_dashboard')
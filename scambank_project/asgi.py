@@ -3,14 +3,48 @@ ASGI config for scambank_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+This is the entry point used in production (Procfile: gunicorn with uvicorn
+workers). The live dashboard stream (/events/, banking/feed.py) only works
+when served from here: open streams are idle coroutines, not blocked threads.
+
+Only the paths in ASGI_PATHS go through Django's ASGI handler. Every other
+request is handed to the WSGI application (wsgi.py), in a thread of its own:
+- Django serves a synchronous streaming response (statement export) under
+  ASGI by reading the whole iterator into a list first. Under WSGI each
+  chunk is sent as soon as it is produced.
+- The middleware stack is synchronous (WhiteNoise among others), so under
+  ASGI every request would hop between the event loop and threads.
+
+Persistent database connections are switched off here (DB_CONN_MAX_AGE=0,
+whatever the environment says), as Django's docs advise for ASGI: every
+request runs on a new thread, so a connection kept open for reuse would
+never be reused, only left behind. Each request opens its own connection
+instead; cheap for SQLite, on PostgreSQL put a pooler (PgBouncer) in
+front. Under wsgi.py (no live dashboard) persistent connections work.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
 
 import os
 
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
 from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scambank_project.settings')
+os.environ['DB_CONN_MAX_AGE'] = '0'  # Read by settings.py; see above
+
+ASGI_PATHS = ('/events/',)
+
+django_asgi = get_asgi_application()
+django_wsgi = WsgiToAsgi(get_wsgi_application())
+
 
-application = get_asgi_application()
+async def application(scope, receive, send):
+    if scope['type'] != 'http' or scope['path'] in ASGI_PATHS:
+        return await django_asgi(scope, receive, send)
+    # One thread per request, like Django's own ASGI handler
+    async with ThreadSensitiveContext():
+        await django_wsgi(scope, receive, send)
@@ -44,14 +44,26 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'banking.profiling.ProfilingMiddleware',  # Off unless PROFILING_SAMPLE_RATE > 0
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'banking.db_router.ReplicaPinMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Request profiling (banking/profiling.py)
+# Share of requests to measure, e.g. 0.01 for 1%. 0 turns it off.
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_FLUSH_SECONDS = 30
+
+# Metrics (/metrics, banking/metrics.py)
+# With several gunicorn workers, also set PROMETHEUS_MULTIPROC_DIR to an empty directory.
+# Without a token, /metrics only answers requests from the same machine.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
 ROOT_URLCONF = 'scambank_project.urls'
 
 TEMPLATES = [
@@ -75,13 +87,79 @@ WSGI_APPLICATION = 'scambank_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# SQLite tuning, applied to every new connection:
+# - WAL lets readers keep reading while a writer commits.
+# - busy_timeout makes a writer wait for the lock instead of failing at once.
+# - synchronous=NORMAL is safe with WAL and saves an fsync per commit.
+# - cache_size is in KiB when negative (64 MB here).
+# - IMMEDIATE transactions take the write lock at BEGIN, so two writers can't
+#   both read first and then deadlock upgrading to a write lock.
+SQLITE_OPTIONS = {
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA busy_timeout=5000;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA cache_size=-64000;'
+    ),
+    'transaction_mode': 'IMMEDIATE',
+}
+
+# Seconds to keep a connection open between requests (0 = close after each request).
+# Always 0 when served from asgi.py, where each request runs on a thread of its own.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '60'))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        # A file, not the default in-memory database: concurrency tests need
+        # real WAL locking (busy_timeout) between connections.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Optional read replica: a second SQLite file kept in sync by `manage.py sync_replica`.
+# Read-only views (dashboard, history, admin list) read from it, see banking/db_router.py.
+if os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['DB_REPLICA_NAME'],
+        'OPTIONS': SQLITE_OPTIONS,
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['banking.db_router.PrimaryReplicaRouter']
+# After a write, the user reads from the primary for this many seconds.
+# Keep it longer than the sync_replica interval.
+REPLICA_PIN_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Local memory by default. Set REDIS_URL to share the cache between workers.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Sessions are read from the cache and written through to the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -122,6 +200,38 @@ STATICFILES_DIRS = [BASE_DIR / 'static'] # Look for static files in the root sta
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Account numbers
+# Each worker reserves this many account numbers at a time (one DB round trip per block).
+ACCOUNT_NUMBER_BLOCK_SIZE = 100
+# Accounts opened before check digits were introduced have random numbers.
+# While any of them exist, a number that fails the check digit is accepted only if an account
+# has exactly that number (one indexed lookup); other typos are still rejected.
+ACCOUNT_NUMBER_LEGACY_LOOKUP = True
+
+# Deleted accounts (banking/purge.py): if set, `manage.py purge_accounts` writes a gzipped
+# JSON Lines archive of each account here before deleting its data.
+ACCOUNT_ARCHIVE_DIR = os.environ.get('ACCOUNT_ARCHIVE_DIR')
+
+# Month-end statements (banking/statement_batch.py): `manage.py generate_statements`
+# writes one gzipped JSON Lines file per account and a manifest under <STATEMENT_DIR>/<YYYY-MM>/.
+STATEMENT_DIR = os.environ.get('STATEMENT_DIR', str(BASE_DIR / 'statements'))
+
+# Velocity limits per account type (banking/velocity.py), for transfers and withdrawals.
+# None turns a limit off. Counters live in the cache: with several workers set REDIS_URL,
+# otherwise every worker counts on its own.
+VELOCITY_LIMITS = {
+    'Savings': {'payments_per_minute': 10, 'amount_per_day': 100000},
+    'Fixed': {'payments_per_minute': 5, 'amount_per_day': 25000},
+}
+
+# Interest per account type (banking/interest.py, `manage.py accrue_interest` nightly).
+# Annual rates; the highest tier the balance reaches applies to the whole balance.
+# Accrued interest is credited 'daily', 'monthly' or 'quarterly'.
+INTEREST_RATES = {
+    'Savings': {'compounding': 'monthly', 'tiers': [(0, '0.030'), (100000, '0.035')]},
+    'Fixed': {'compounding': 'quarterly', 'tiers': [(0, '0.065')]},
+}
+
 # Redirects
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'home'
@@ -142,5 +252,8 @@ else:
 
 # Default 'from' email
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER or 'webmaster@localhost'
+# Log the body (OTP) of an email whose first delivery attempt failed, for
+# hosts that block SMTP (banking/outbox.py). Only for demos: it writes OTPs to the logs.
+OUTBOX_LOG_UNDELIVERED = os.environ.get('OUTBOX_LOG_UNDELIVERED', '1' if DEBUG else '0') == '1'
 
 